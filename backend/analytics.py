@@ -0,0 +1,165 @@
+"""Sales analytics over orders, served from a daily summary collection.
+
+Each summary document covers one UTC day (its ``_id`` is "YYYY-MM-DD")
+with that day's order count, revenue and per-product quantities. A refresh
+re-aggregates only from the most recent summarized day onwards, so
+historical orders are scanned once.
+"""
+import asyncio
+import logging
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from periodic import run_periodically
+
+logger = logging.getLogger(__name__)
+
+# created_at is a UTC ISO string, so its first ten characters are the day
+ORDER_DAY = {"$substrCP": ["$created_at", 0, 10]}
+
+
+def day_range(start: Optional[str] = None, end: Optional[str] = None) -> dict:
+    """Summary filter for an inclusive range of days"""
+    bounds = {}
+    if start:
+        bounds["$gte"] = start
+    if end:
+        bounds["$lte"] = end
+    return {"_id": bounds} if bounds else {}
+
+
+def order_totals_pipeline(match: dict, into: str) -> List[dict]:
+    return [
+        {"$match": match},
+        {"$group": {"_id": ORDER_DAY, "orders": {"$sum": 1}, "revenue": {"$sum": "$total"}}},
+        {"$merge": {"into": into, "on": "_id", "whenMatched": "merge", "whenNotMatched": "insert"}},
+    ]
+
+
+def product_totals_pipeline(match: dict, into: str) -> List[dict]:
+    return [
+        {"$match": match},
+        {"$project": {"_id": 0, "day": ORDER_DAY, "items": 1}},
+        {"$unwind": "$items"},
+        {"$group": {
+            "_id": {"day": "$day", "product_id": "$items.product_id"},
+            "quantity": {"$sum": "$items.quantity"},
+            "revenue": {"$sum": {"$multiply": ["$items.price", "$items.quantity"]}},
+        }},
+        {"$group": {
+            "_id": "$_id.day",
+            "items": {"$sum": "$quantity"},
+            "products": {"$push": {"product_id": "$_id.product_id", "quantity": "$quantity", "revenue": "$revenue"}},
+        }},
+        {"$merge": {"into": into, "on": "_id", "whenMatched": "merge", "whenNotMatched": "insert"}},
+    ]
+
+
+class SalesAnalytics:
+    """Maintains the daily summaries and answers dashboard queries from them
+
+    With a positive ``refresh_interval`` the summaries are brought up to
+    date in the background every that many seconds.
+    """
+
+    def __init__(self, orders, summaries, refresh_interval: float = 0):
+        self.orders = orders
+        self.summaries = summaries
+        self.refresh_interval = refresh_interval
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    async def start(self):
+        if self.refresh_interval > 0:
+            self._task = asyncio.create_task(
+                run_periodically(self.refresh_interval, self.refresh, "Sales summary refresh")
+            )
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def refresh(self) -> Optional[str]:
+        """Re-aggregate orders from the latest summarized day on; returns that day
+
+        The latest day is rebuilt because it may have been partial when it
+        was last summarized. Orders are indexed on created_at, so earlier
+        days are never read.
+        """
+        async with self._lock:
+            latest = await self.summaries.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+            since = latest["_id"] if latest else None
+            match = {"created_at": {"$gte": since}} if since else {}
+            name = self.summaries.name
+            # The product pass replaces each day's product list wholesale
+            await self.orders.aggregate(order_totals_pipeline(match, name)).to_list(None)
+            await self.orders.aggregate(product_totals_pipeline(match, name)).to_list(None)
+            return since
+
+    async def daily(self, start: Optional[str] = None, end: Optional[str] = None) -> pd.DataFrame:
+        docs = await self.summaries.find(
+            day_range(start, end), {"orders": 1, "revenue": 1, "items": 1}
+        ).sort("_id", 1).to_list(None)
+        frame = pd.DataFrame.from_records(docs, columns=["_id", "orders", "revenue", "items"])
+        frame = frame.rename(columns={"_id": "day"}).fillna({"orders": 0, "revenue": 0.0, "items": 0})
+        frame["average_order_value"] = np.divide(
+            frame["revenue"].to_numpy(dtype=float), frame["orders"].to_numpy(dtype=float),
+            out=np.zeros(len(frame)), where=frame["orders"].to_numpy() > 0,
+        )
+        return frame
+
+    async def products(self, start: Optional[str] = None, end: Optional[str] = None,
+                       limit: Optional[int] = None) -> pd.DataFrame:
+        """Quantity and revenue per product over the range, best sellers first"""
+        pipeline = [
+            {"$match": day_range(start, end)},
+            {"$unwind": "$products"},
+            {"$group": {
+                "_id": "$products.product_id",
+                "quantity": {"$sum": "$products.quantity"},
+                "revenue": {"$sum": "$products.revenue"},
+            }},
+            {"$sort": {"revenue": -1, "_id": 1}},
+        ]
+        if limit:
+            pipeline.append({"$limit": limit})
+        docs = await self.summaries.aggregate(pipeline).to_list(None)
+        frame = pd.DataFrame.from_records(docs, columns=["_id", "quantity", "revenue"])
+        return frame.rename(columns={"_id": "product_id"})
+
+    async def by_category(self, categories: pd.Series, start: Optional[str] = None,
+                          end: Optional[str] = None) -> pd.DataFrame:
+        """Revenue per category; ``categories`` maps product id to category
+
+        Orders only record product ids, so the join to categories happens
+        here rather than in the pipeline.
+        """
+        frame = await self.products(start, end)
+        frame["category"] = frame["product_id"].map(categories).fillna("unknown")
+        grouped = frame.groupby("category", sort=False)[["quantity", "revenue"]].sum()
+        return grouped.sort_values("revenue", ascending=False).reset_index()
+
+    async def overview(self, start: Optional[str] = None, end: Optional[str] = None) -> dict:
+        frame = await self.daily(start, end)
+        orders = int(frame["orders"].sum())
+        revenue = float(frame["revenue"].sum())
+        return {
+            "orders": orders,
+            "revenue": round(revenue, 2),
+            "items": int(frame["items"].sum()),
+            "average_order_value": round(revenue / orders, 2) if orders else 0.0,
+        }
+
+
+def frame_records(frame: pd.DataFrame) -> List[dict]:
+    """JSON-ready rows with money rounded to paise"""
+    for column in ("revenue", "average_order_value"):
+        if column in frame:
+            frame[column] = frame[column].astype(float).round(2)
+    for column in ("orders", "items", "quantity"):
+        if column in frame:
+            frame[column] = frame[column].astype(np.int64)
+    return frame.to_dict(orient="records")
@@ -0,0 +1,84 @@
+"""Compare CatalogIndex filtering with the list comprehension chain.
+
+Run from backend/: python -m benchmarks.bench_catalog
+"""
+import argparse
+import timeit
+
+from benchmarks.fixtures import make_products
+from catalog import CatalogIndex
+
+QUERIES = {
+    "no filters": {},
+    "category": {"category": "office"},
+    "price range": {"min_price": 50000, "max_price": 60000},
+    "featured": {"featured": True},
+    "category+price+featured": {"category": "bedroom", "min_price": 100000, "max_price": 200000, "featured": True},
+}
+
+# Sorted first pages: full filter + sort versus walking a presorted ordering
+PAGE_QUERIES = {
+    "page price asc": {"sort": "price", "limit": 50},
+    "page name desc, category": {"sort": "-name", "category": "office", "limit": 50},
+    "page price, range": {"sort": "price", "min_price": 50000, "max_price": 150000, "limit": 50},
+}
+
+
+def comprehension_filter(products, category=None, min_price=None, max_price=None, search=None, featured=None):
+    """The original get_products filter chain"""
+    products = products.copy()
+    if category:
+        products = [p for p in products if p["category"] == category]
+    if min_price is not None:
+        products = [p for p in products if p["price"] >= min_price]
+    if max_price is not None:
+        products = [p for p in products if p["price"] <= max_price]
+    if search:
+        search_lower = search.lower()
+        products = [p for p in products if search_lower in p["name"].lower() or search_lower in p["description"].lower()]
+    if featured is not None:
+        products = [p for p in products if p["featured"] == featured]
+    return products
+
+
+def sorted_page(products, sort, limit, **query):
+    """Filter, sort everything, then slice"""
+    field = sort.lstrip("-")
+    key = (lambda p: p["name"].lower()) if field == "name" else (lambda p: p["price"])
+    matches = sorted(comprehension_filter(products, **query), key=key, reverse=sort.startswith("-"))
+    return matches[:limit]
+
+
+def best_of(fn, repeat: int) -> float:
+    """Best per-call time in microseconds"""
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'size':>8}  {'query':<26} {'chain us':>12} {'index us':>12} {'speedup':>8}")
+    for size in args.sizes:
+        products = make_products(size)
+        build = best_of(lambda: CatalogIndex(products), 1)
+        index = CatalogIndex(products)
+        print(f"{size:>8}  {'(index build)':<26} {'':>12} {build:>12.1f}")
+        for name, query in QUERIES.items():
+            expected = comprehension_filter(products, **query)
+            assert index.filter(**query) == expected, name
+            chain = best_of(lambda: comprehension_filter(products, **query), args.repeat)
+            indexed = best_of(lambda: index.filter(**query), args.repeat)
+            print(f"{size:>8}  {name:<26} {chain:>12.1f} {indexed:>12.1f} {chain / indexed:>7.1f}x")
+        for name, query in PAGE_QUERIES.items():
+            chain = best_of(lambda: sorted_page(products, **query), args.repeat)
+            indexed = best_of(lambda: index.page(**query), args.repeat)
+            print(f"{size:>8}  {name:<26} {chain:>12.1f} {indexed:>12.1f} {chain / indexed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
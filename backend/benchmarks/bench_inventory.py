@@ -0,0 +1,127 @@
+"""Checkouts racing for one hot product: read-then-write versus Inventory.
+
+Run from backend/: python -m benchmarks.bench_inventory [--mongo-url mongodb://...]
+
+Thousands of carts each reserve 1-3 units of a product and check out at
+the same moment. The read-then-write baseline reads the stock and writes
+back the difference, the way a naive fix would; Inventory uses
+conditional $inc on sharded counters. Each run checks the units sold
+against the starting stock and reports any overselling.
+
+Without --mongo-url the collections are MemoryCollections, which simulate
+round trips and per-document write serialization in process.
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from benchmarks.bench_orders import percentile
+from benchmarks.fixtures import MemoryCollection
+from inventory import InsufficientStock, Inventory, ReservationConflict
+
+PRODUCT = "prod-hot"
+
+
+async def run_checkouts(checkout, carts: int, rng: random.Random) -> dict:
+    """Start every checkout at once; returns units sold and latency"""
+    quantities = [rng.randint(1, 3) for _ in range(carts)]
+    latencies = []
+
+    async def one(i: int, quantity: int) -> int:
+        start = time.perf_counter()
+        try:
+            sold = await checkout(f"cart-{i}", quantity)
+        finally:
+            latencies.append(time.perf_counter() - start)
+        return sold
+
+    start = time.perf_counter()
+    sold = await asyncio.gather(*(one(i, q) for i, q in enumerate(quantities)))
+    elapsed = time.perf_counter() - start
+    return {
+        "sold": sum(sold),
+        "orders": sum(1 for s in sold if s),
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "checkouts_per_s": carts / elapsed,
+    }
+
+
+async def naive(stock, stock_units: int, carts: int, rng: random.Random) -> dict:
+    await stock.delete_many({})
+    await stock.insert_one({"_id": PRODUCT, "product_id": PRODUCT, "available": stock_units})
+
+    async def checkout(cart_id: str, quantity: int) -> int:
+        doc = await stock.find_one({"_id": PRODUCT})
+        if doc["available"] < quantity:
+            return 0
+        await stock.update_one({"_id": PRODUCT}, {"$set": {"available": doc["available"] - quantity}})
+        return quantity
+
+    result = await run_checkouts(checkout, carts, rng)
+    result["remaining"] = (await stock.find_one({"_id": PRODUCT}))["available"]
+    return result
+
+
+async def reserved(stock, reservations, shards: int, stock_units: int, carts: int, rng: random.Random) -> dict:
+    await stock.delete_many({})
+    await reservations.delete_many({})
+    inventory = Inventory(stock, reservations, shards=shards, sweep_interval=0)
+    await inventory.restock(PRODUCT, stock_units)
+
+    async def checkout(cart_id: str, quantity: int) -> int:
+        try:
+            await inventory.reserve(cart_id, PRODUCT, quantity)
+            await inventory.commit(cart_id, [(PRODUCT, quantity)], f"order-{cart_id}")
+        except (InsufficientStock, ReservationConflict):
+            return 0
+        return quantity
+
+    result = await run_checkouts(checkout, carts, rng)
+    result["remaining"] = await inventory.available(PRODUCT)
+    held = await reservations.find({}).to_list(None)
+    result["held"] = sum(doc["quantity"] for doc in held)
+    return result
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--carts", type=int, default=5000)
+    parser.add_argument("--stock", type=int, default=2000)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--mongo-url")
+    parser.add_argument("--rtt-ms", type=float, default=1.0, help="simulated round trip without --mongo-url")
+    args = parser.parse_args()
+
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        database = AsyncIOMotorClient(args.mongo_url)["bench_inventory"]
+        stock, reservations = database.inventory, database.reservations
+    else:
+        stock = MemoryCollection(rtt=args.rtt_ms / 1000)
+        reservations = MemoryCollection(rtt=args.rtt_ms / 1000)
+
+    rng = random.Random(11)
+    failures = 0
+    print(f"{'mode':<12} {'orders':>7} {'sold':>6} {'left':>6} {'oversold':>9} {'drift':>6} {'p99 ms':>9} {'checkouts/s':>12}")
+
+    def report(mode: str, result: dict, checked: bool = True):
+        nonlocal failures
+        oversold = max(0, result["sold"] - args.stock)
+        # Every unit must be sold, still available or still held by a cart
+        drift = result["sold"] + result["remaining"] + result.get("held", 0) - args.stock
+        if checked and (oversold or drift):
+            failures += 1
+        print(f"{mode:<12} {result['orders']:>7} {result['sold']:>6} {result['remaining']:>6} "
+              f"{oversold:>9} {drift:>6} {result['p99_ms']:>9.1f} {result['checkouts_per_s']:>12.0f}")
+
+    report("read-write", await naive(stock, args.stock, args.carts, rng), checked=False)
+    for shards in args.shards:
+        report(f"shards={shards}", await reserved(stock, reservations, shards, args.stock, args.carts, rng))
+
+    if failures:
+        raise SystemExit(f"{failures} inventory runs oversold or lost track of stock")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+"""Checkout insert latency: one insert_one per order versus OrderIngestQueue.
+
+Run from backend/: python -m benchmarks.bench_orders [--mongo-url mongodb://...]
+
+Without --mongo-url the inserts go to a LatencyCollection that simulates
+the round trip, connection pool and server write path, so the comparison
+runs anywhere.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+
+from benchmarks.fixtures import LatencyCollection, make_order, make_products
+from order_ingest import OrderIngestQueue
+
+
+def percentile(samples, q: float) -> float:
+    return statistics.quantiles(samples, n=100, method="inclusive")[int(q) - 1]
+
+
+async def drive(save, orders, concurrency: int) -> dict:
+    """Run the orders through save with a fixed number of concurrent clients"""
+    latencies = []
+    it = iter(orders)
+
+    async def client():
+        for order in it:
+            start = time.perf_counter()
+            await save(order)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "orders_per_s": len(latencies) / elapsed,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 128, 512])
+    parser.add_argument("--mongo-url")
+    parser.add_argument("--rtt-ms", type=float, default=1.0, help="simulated round trip without --mongo-url")
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--delay-ms", type=float, default=0.0)
+    args = parser.parse_args()
+
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        database = AsyncIOMotorClient(args.mongo_url)["bench_orders"]
+
+        def collection():
+            return database.orders
+        await database.orders.drop()
+    else:
+        def collection():
+            return LatencyCollection(rtt=args.rtt_ms / 1000)
+
+    rng = random.Random(7)
+    products = make_products(1000)
+
+    print(f"{'mode':<8} {'clients':>8} {'p50 ms':>9} {'p99 ms':>9} {'orders/s':>10}")
+    for concurrency in args.concurrency:
+        # Fresh documents per run: insert_* adds _id to the dicts it writes
+        orders = [make_order(i, products, rng) for i in range(args.orders)]
+        direct = collection()
+        result = await drive(direct.insert_one, orders, concurrency)
+        print(f"{'direct':<8} {concurrency:>8} {result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['orders_per_s']:>10.0f}")
+
+        orders = [make_order(i, products, rng) for i in range(args.orders)]
+        queue = OrderIngestQueue(collection(), max_batch=args.batch, max_delay=args.delay_ms / 1000)
+        await queue.start()
+        result = await drive(queue.submit, orders, concurrency)
+        await queue.close()
+        print(f"{'batched':<8} {concurrency:>8} {result['p50_ms']:>9.2f} {result['p99_ms']:>9.2f} {result['orders_per_s']:>10.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
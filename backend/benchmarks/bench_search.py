@@ -0,0 +1,44 @@
+"""Compare inverted index search with the substring scan.
+
+Run from backend/: python -m benchmarks.bench_search
+"""
+import argparse
+
+from benchmarks.bench_catalog import best_of
+from benchmarks.fixtures import make_products
+from search import SearchIndex
+
+QUERIES = ["velvet", "vel", "oak", "modern sofa", "grand chand", "premium leather chair", "zzz"]
+
+
+def substring_search(products, search):
+    """The original get_products search filter"""
+    search_lower = search.lower()
+    return [p for p in products if search_lower in p["name"].lower() or search_lower in p["description"].lower()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=20, help="Page size for the top-k column")
+    args = parser.parse_args()
+
+    print(f"{'size':>8}  {'query':<24} {'hits':>7} {'scan us':>12} {'index us':>12} {'top-k us':>12}")
+    for size in args.sizes:
+        products = make_products(size)
+        index = SearchIndex()
+        build = best_of(lambda: SearchIndex().add_many(enumerate(products)), 1)
+        index.add_many(enumerate(products))
+        print(f"{size:>8}  {'(index build)':<24} {'':>7} {'':>12} {build:>12.1f}")
+        for query in QUERIES:
+            hits = len(index.search(query))
+            scan = best_of(lambda: substring_search(products, query), args.repeat)
+            indexed = best_of(lambda: index.search(query), args.repeat)
+            # A page of results, as get_products asks for: limit + 1 to know if more remain
+            top = best_of(lambda: index.search(query, limit=args.limit + 1), args.repeat)
+            print(f"{size:>8}  {query:<24} {hits:>7} {scan:>12.1f} {indexed:>12.1f} {top:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Response encoding per endpoint: FastAPI's response_model path against FastJSONResponse.
+
+Run from backend/: python -m benchmarks.bench_serialization [--catalog-size 10000] [--output serialization.json]
+                                                            [--compare baseline.json]
+
+``before`` is how each endpoint built its body before the serialization
+layer: FastAPI's serialize_response (validate against the route's
+response_model, or jsonable_encoder without one) followed by JSONResponse,
+and for the catalog routes the TypeAdapter/model round trip they used.
+``after`` is what the handlers do now. Both sides produce equivalent JSON,
+which is checked before timing. Times cover encoding only, not routing or
+the store.
+"""
+import argparse
+import json
+import random
+import sys
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from pydantic import TypeAdapter
+
+from benchmarks.bench_catalog import best_of
+from benchmarks.fixtures import import_server, make_products
+from benchmarks.micro import CUSTOMER
+from benchmarks.report import check_regressions, make_report, write_report
+from cart_store import CartState
+from catalog import ProductRegistry
+
+
+def route_field(server, method: str, path: str):
+    for route in server.app.routes:
+        if getattr(route, "path", None) == path and method in route.methods:
+            return route.response_field
+    raise LookupError(f"No route {method} {path}")
+
+
+def fastapi_body(field, content) -> bytes:
+    """What FastAPI sends for a handler returning content"""
+    coro = serialize_response(field=field, response_content=content)
+    # It never suspends when the handler is a coroutine
+    try:
+        coro.send(None)
+    except StopIteration as done:
+        return JSONResponse(done.value).body
+    raise RuntimeError("serialize_response suspended")
+
+
+def endpoint_cases(server, registry: ProductRegistry, rng: random.Random):
+    """(endpoint, before, after) for each response the API encodes per request"""
+    index = registry.index
+    product_list = TypeAdapter(List[server.Product])
+    page, _ = index.page(limit=50)
+    yield (
+        "GET /products?limit=50",
+        lambda: product_list.dump_json(product_list.validate_python(page)),
+        lambda: server.encode(page),
+    )
+    fields = {"id", "name", "price", "image"}
+    yield (
+        "GET /products?limit=50&fields=id,name,price,image",
+        lambda: product_list.dump_json(product_list.validate_python(page), include={"__all__": fields}),
+        lambda: server.encode(server.project_products(page, fields)),
+    )
+    product = page[0]
+    yield (
+        "GET /products/{id}",
+        lambda: server.Product.model_validate(product).model_dump_json().encode(),
+        lambda: server.encode_as(product, server.Product),
+    )
+    yield (
+        "GET /categories",
+        lambda: json.dumps(index.categories, separators=(",", ":")).encode(),
+        lambda: server.encode(index.categories),
+    )
+
+    cart = CartState("bench-cart")
+    for item in rng.sample(index.products, 10):
+        cart.add(item, rng.randint(1, 3))
+    cart = cart.to_dict()
+    cart_field = route_field(server, "GET", "/api/cart/{cart_id}")
+    yield (
+        "GET /cart/{id} (10 lines)",
+        lambda: fastapi_body(cart_field, cart),
+        lambda: server.FastJSONResponse(cart, server.Cart).body,
+    )
+    # add/remove/update had no response_model: jsonable_encoder only
+    yield (
+        "POST /cart/{id}/add (10 lines)",
+        lambda: fastapi_body(None, cart),
+        lambda: server.FastJSONResponse(cart, server.Cart).body,
+    )
+    batch = {
+        "cart": cart,
+        "results": [{"op": "add", "product_id": line["product_id"], "ok": True, "detail": None}
+                    for line in cart["items"]],
+    }
+    batch_field = route_field(server, "POST", "/api/cart/{cart_id}/batch")
+    yield (
+        "POST /cart/{id}/batch (10 ops)",
+        lambda: fastapi_body(batch_field, batch),
+        lambda: server.FastJSONResponse(batch, server.CartBatchResult).body,
+    )
+
+    order = server.Order(customer=server.CustomerDetails(**CUSTOMER), items=cart["items"], total=cart["total"])
+    order_field = route_field(server, "POST", "/api/orders")
+    yield (
+        "POST /orders (10 lines)",
+        lambda: fastapi_body(order_field, order),
+        lambda: server.FastJSONResponse(order, server.Order).body,
+    )
+    orders = [order.model_dump() for _ in range(50)]
+    yield (
+        "GET /orders (50 orders)",
+        lambda: json.dumps(orders, separators=(",", ":")).encode(),
+        lambda: server.encode(orders),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--catalog-size", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="baseline report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed slowdown as a fraction")
+    args = parser.parse_args()
+
+    server = import_server()
+    registry = ProductRegistry(server.validate_products(make_products(args.catalog_size)))
+    results = []
+    print(f"{'endpoint':<50} {'before us':>10} {'after us':>10} {'speedup':>8}", file=sys.stderr)
+    for endpoint, before, after in endpoint_cases(server, registry, random.Random(args.catalog_size)):
+        if json.loads(before()) != json.loads(after()):
+            raise SystemExit(f"{endpoint}: before and after bodies differ")
+        timings = {}
+        for side, fn in (("before", before), ("after", after)):
+            per_call = best_of(fn, args.repeat)
+            timings[side] = per_call
+            results.append({
+                "name": f"{endpoint} [{side}]",
+                "endpoint": endpoint,
+                "side": side,
+                "per_call_us": round(per_call, 3),
+                "ops_per_s": round(1e6 / per_call, 1),
+            })
+        print(f"{endpoint:<50} {timings['before']:>10.2f} {timings['after']:>10.2f} "
+              f"{timings['before'] / timings['after']:>7.1f}x", file=sys.stderr)
+
+    report = make_report("serialization", {"catalog_size": args.catalog_size, "repeat": args.repeat}, results)
+    write_report(report, args.output)
+    check_regressions(args.compare, report, args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
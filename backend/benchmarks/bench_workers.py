@@ -0,0 +1,225 @@
+"""Memory per worker and throughput as the number of worker processes grows.
+
+Run from backend/: python -m benchmarks.bench_workers [--workers 1,2,4] [--catalog-size 20000]
+                                                      [--duration 10] [--output workers.json]
+
+Each configuration is a real server on a local port, started two ways:
+``snapshot`` is serve.py, whose workers map one shared catalog snapshot;
+``per-worker`` is plain ``uvicorn --workers N``, where every worker parses
+and indexes the catalog itself. Both read the same generated NDJSON feed.
+Client processes (one per worker by default) send catalog reads, so no
+Mongo is needed. Memory comes from /proc/<pid>/smaps_rollup (Linux only):
+RSS counts shared pages in every worker, PSS splits them between the
+workers sharing them and USS is what a worker alone holds. On a machine
+with fewer cores than workers plus clients, throughput cannot scale.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import re
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import httpx
+
+from benchmarks.fixtures import make_products
+from benchmarks.report import check_regressions, latency_summary, make_report, write_report
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+MODES = {
+    "snapshot": lambda workers, port: [sys.executable, "-m", "serve", "--workers", str(workers),
+                                       "--host", "127.0.0.1", "--port", str(port)],
+    "per-worker": lambda workers, port: [sys.executable, "-m", "uvicorn", "server:app", "--workers", str(workers),
+                                         "--host", "127.0.0.1", "--port", str(port)],
+}
+# Log line each worker writes once its catalog is in place
+READY_LINE = re.compile(r"Catalog version \d+ (mapped|loaded) from")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def child_pids(pid: int) -> List[int]:
+    try:
+        return [int(c) for c in Path(f"/proc/{pid}/task/{pid}/children").read_text().split()]
+    except OSError:
+        return []
+
+
+def worker_pids(launcher: int) -> List[int]:
+    """uvicorn's worker processes, or the launcher itself when it serves in-process"""
+    workers = [pid for pid in child_pids(launcher)
+               if b"spawn_main" in Path(f"/proc/{pid}/cmdline").read_bytes()]
+    return workers or [launcher]
+
+
+def memory_kb(pid: int) -> Dict[str, int]:
+    fields = {}
+    for line in Path(f"/proc/{pid}/smaps_rollup").read_text().splitlines()[1:]:
+        name, value = line.split(":", 1)
+        fields[name] = int(value.split()[0])
+    return {
+        "rss": fields["Rss"],
+        "pss": fields["Pss"],
+        "uss": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def wait_until_ready(process: subprocess.Popen, log: Path, expected: int, timeout: float = 120.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited early, see {log}")
+        if len(READY_LINE.findall(log.read_text(errors="replace"))) >= expected:
+            return
+        time.sleep(0.2)
+    raise RuntimeError(f"Workers not ready after {timeout:.0f}s, see {log}")
+
+
+def client_process(base_url: str, product_ids: List[str], concurrency: int, warmup: float,
+                   duration: float, seed: int) -> Tuple[List[float], int]:
+    """Hammer the server with catalog reads; returns measured latencies and error count"""
+    rng = random.Random(seed)
+
+    def request() -> Tuple[str, dict]:
+        roll = rng.random()
+        if roll < 0.5:
+            return f"/api/products/{rng.choice(product_ids)}", {}
+        if roll < 0.85:
+            low = rng.randrange(5000, 300000, 1000)
+            return "/api/products", {"min_price": low, "max_price": low + 50000, "limit": 24}
+        return "/api/products", {"search": rng.choice(["velvet", "oak", "royal", "desk", "lamp"]), "limit": 24}
+
+    async def run():
+        latencies: List[float] = []
+        errors = 0
+        start = time.perf_counter()
+        record_from, stop = start + warmup, start + warmup + duration
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+            async def loop():
+                nonlocal errors
+                while True:
+                    began = time.perf_counter()
+                    if began >= stop:
+                        return
+                    path, params = request()
+                    response = await client.get(path, params=params)
+                    if began >= record_from:
+                        latencies.append(time.perf_counter() - began)
+                        errors += response.status_code >= 400
+
+            await asyncio.gather(*(loop() for _ in range(concurrency)))
+        return latencies, errors
+
+    return asyncio.run(run())
+
+
+def measure(mode: str, workers: int, args, catalog: Path, product_ids: List[str], scratch: Path) -> dict:
+    port = free_port()
+    log = scratch / f"{mode}-{workers}.log"
+    env = {
+        **os.environ,
+        "CATALOG_SOURCE": "file",
+        "CATALOG_FILE": str(catalog),
+        "CART_STORE": "memory",
+        "ENSURE_INDEXES": "0",
+        "ANALYTICS_REFRESH_INTERVAL": "0",
+        "MONGO_URL": os.environ.get("MONGO_URL", "mongodb://127.0.0.1:27017"),
+        "DB_NAME": os.environ.get("DB_NAME", "bench_workers"),
+    }
+    with open(log, "w") as out:
+        process = subprocess.Popen(MODES[mode](workers, port), cwd=BACKEND_DIR, env=env,
+                                   stdout=out, stderr=subprocess.STDOUT)
+    try:
+        # The snapshot launcher also logs loading the feed itself
+        wait_until_ready(process, log, workers + (mode == "snapshot"))
+        clients = args.clients or workers
+        with multiprocessing.get_context("spawn").Pool(clients) as pool:
+            runs = pool.starmap(client_process, [
+                (f"http://127.0.0.1:{port}", product_ids, args.concurrency, args.warmup, args.duration, seed)
+                for seed in range(clients)
+            ])
+        memory = [memory_kb(pid) for pid in worker_pids(process.pid)]
+    finally:
+        process.send_signal(signal.SIGINT)
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+    latencies = [s for samples, _ in runs for s in samples]
+    per_worker = {key: sum(m[key] for m in memory) / len(memory) / 1024 for key in ("rss", "pss", "uss")}
+    return {
+        "name": f"{mode} x{workers}",
+        "mode": mode,
+        "workers": workers,
+        **latency_summary(latencies),
+        "requests_per_s": round(len(latencies) / args.duration, 1),
+        "errors": sum(errors for _, errors in runs),
+        "rss_mb": round(per_worker["rss"], 1),
+        "pss_mb": round(per_worker["pss"], 1),
+        "uss_mb": round(per_worker["uss"], 1),
+        "total_pss_mb": round(per_worker["pss"] * len(memory), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default=None, help="comma-separated worker counts (default: 1 up to the CPU count)")
+    parser.add_argument("--modes", default="snapshot,per-worker")
+    parser.add_argument("--catalog-size", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=16, help="connections per client process")
+    parser.add_argument("--clients", type=int, default=0, help="client processes (default: one per worker)")
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds first")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="baseline report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed slowdown as a fraction")
+    args = parser.parse_args()
+
+    if args.workers:
+        counts = [int(n) for n in args.workers.split(",")]
+    else:
+        cpus = os.cpu_count() or 1
+        counts = sorted({1, *(n for n in (2, 4, 8, 16) if n <= cpus), cpus})
+    modes = args.modes.split(",")
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="bench-workers-") as scratch:
+        scratch = Path(scratch)
+        products = make_products(args.catalog_size)
+        catalog = scratch / "catalog.ndjson"
+        catalog.write_text("\n".join(json.dumps(p) for p in products) + "\n")
+        product_ids = [p["id"] for p in products]
+        for mode in modes:
+            for workers in counts:
+                result = measure(mode, workers, args, catalog, product_ids, scratch)
+                results.append(result)
+                print(f"{result['name']:<16} {result['requests_per_s']:>9.1f} req/s  "
+                      f"p99 {result.get('p99_ms', 0):>7.2f} ms  per worker: rss {result['rss_mb']:>6.1f}  "
+                      f"pss {result['pss_mb']:>6.1f}  uss {result['uss_mb']:>6.1f} MB  "
+                      f"total pss {result['total_pss_mb']:>7.1f} MB  errors {result['errors']}", file=sys.stderr)
+
+    config = {k: v for k, v in vars(args).items() if k not in ("output", "compare", "tolerance")}
+    config["workers"] = counts
+    report = make_report("workers", config, results)
+    write_report(report, args.output)
+    check_regressions(args.compare, report, args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""Synthetic data and collection stand-ins for benchmarks."""
+import asyncio
+import random
+from typing import Any, Dict, List
+
+from pymongo.errors import DuplicateKeyError
+
+CATEGORIES = ["living-room", "bedroom", "office", "dining"]
+NOUNS = ["Sofa", "Table", "Chair", "Lamp", "Bed", "Nightstand", "Wardrobe", "Desk",
+         "Bookshelf", "Cabinet", "Dresser", "Chandelier", "Stool", "Bench", "Mirror"]
+ADJECTIVES = ["Velvet", "Noir", "Royal", "Crystal", "Ebony", "Grand", "Milano", "Executive",
+              "Modern", "Classic", "Rustic", "Art Deco", "Nordic", "Ivory", "Golden"]
+MATERIALS = ["Italian Velvet", "Solid Teak Wood", "Black Marble", "Brass", "Premium Leather",
+             "Walnut Wood", "Crystal", "Solid Oak", "Mahogany", "Tempered Glass", "Steel"]
+WORDS = ["elegant", "luxurious", "handcrafted", "statement", "piece", "modern", "living",
+         "finish", "premium", "frame", "gold", "soft-close", "drawers", "upholstery",
+         "perfect", "centerpiece", "interiors", "storage", "comfort", "design"]
+
+
+def make_products(n: int, seed: int = 42) -> List[dict]:
+    """Generate n products shaped like DUMMY_PRODUCTS"""
+    rng = random.Random(seed)
+    products = []
+    for i in range(n):
+        name = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {i}"
+        image = f"https://images.example.com/{i}.jpg"
+        products.append({
+            "id": f"prod-{i + 1}",
+            "name": name,
+            "description": " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 20))).capitalize() + ".",
+            "price": rng.randrange(5000, 400000, 1000) - 1,
+            "category": rng.choice(CATEGORIES),
+            "image": image,
+            "images": [image],
+            "dimensions": f"{rng.randint(40, 250)}cm x {rng.randint(30, 120)}cm",
+            "material": ", ".join(rng.sample(MATERIALS, 2)),
+            "in_stock": True,
+            "featured": rng.random() < 0.1,
+        })
+    return products
+
+
+class LatencyCollection:
+    """Stand-in for a Motor collection that simulates a remote mongod
+
+    Every call holds one of ``pool_size`` connections for a network round
+    trip of ``rtt`` seconds, and the server spends ``op_cost`` seconds per
+    operation plus ``per_doc`` per document on work it serializes (journal
+    commit). That is enough to compare request patterns without a mongod;
+    absolute numbers mean nothing.
+    """
+
+    def __init__(self, rtt: float = 0.001, op_cost: float = 0.0002, per_doc: float = 0.00002,
+                 pool_size: int = 100):
+        self.rtt = rtt
+        self.op_cost = op_cost
+        self.per_doc = per_doc
+        self.docs = []
+        self.calls = 0
+        self._pool = asyncio.Semaphore(pool_size)
+        self._server = asyncio.Lock()
+
+    async def _round_trip(self, n_docs: int):
+        self.calls += 1
+        async with self._pool:
+            await asyncio.sleep(self.rtt / 2)
+            async with self._server:
+                await asyncio.sleep(self.op_cost + self.per_doc * n_docs)
+            await asyncio.sleep(self.rtt / 2)
+
+    async def insert_one(self, doc):
+        await self._round_trip(1)
+        self.docs.append(doc)
+
+    async def insert_many(self, docs, ordered=True):
+        await self._round_trip(len(docs))
+        self.docs.extend(docs)
+
+
+def make_order(i: int, products: List[dict], rng: random.Random) -> dict:
+    """An order document shaped like Order.model_dump()"""
+    items = [
+        {"product_id": p["id"], "name": p["name"], "price": p["price"], "image": p["image"],
+         "quantity": rng.randint(1, 3)}
+        for p in rng.sample(products, rng.randint(1, 4))
+    ]
+    return {
+        "id": f"order-{i}",
+        "customer": {
+            "full_name": f"Customer {i}", "email": f"customer{i % 5000}@example.com",
+            "phone": "9999999999", "address": "1 Example Road", "city": "Mumbai",
+            "state": "MH", "pincode": "400001",
+        },
+        "items": items,
+        "total": float(sum(item["price"] * item["quantity"] for item in items)),
+        "status": "pending",
+        "payment_status": "unpaid",
+        "created_at": f"2026-01-01T00:00:{i % 60:02d}+00:00",
+    }
+
+
+class Result:
+    def __init__(self, matched: int = 0, modified: int = 0, deleted: int = 0):
+        self.matched_count = matched
+        self.modified_count = modified
+        self.deleted_count = deleted
+
+
+class ListCursor:
+    def __init__(self, docs: List[dict]):
+        self.docs = docs
+
+    async def to_list(self, length):
+        return self.docs if length is None else self.docs[:length]
+
+
+def matches(doc: dict, query: dict) -> bool:
+    for field, condition in query.items():
+        value = doc.get(field)
+        if isinstance(condition, dict):
+            for op, operand in condition.items():
+                if op == "$gte" and not (value is not None and value >= operand):
+                    return False
+                if op == "$lt" and not (value is not None and value < operand):
+                    return False
+                if op == "$in" and value not in operand:
+                    return False
+        elif value != condition:
+            return False
+    return True
+
+
+class MemoryCollection:
+    """In-process stand-in for the slice of a Motor collection the inventory uses
+
+    Supports equality, $gte, $lt and $in filters and $inc/$set/$setOnInsert
+    updates. Each call pays a simulated round trip, and writes to the same
+    document queue behind a per-document lock for ``op_cost`` seconds, the
+    way mongod serializes writers of one document; reads and multi-document
+    writes do not queue. Match-and-modify happens without yielding, so
+    conditional updates are atomic as on a real server.
+    """
+
+    def __init__(self, rtt: float = 0.001, op_cost: float = 0.0001, pool_size: int = 100):
+        self.rtt = rtt
+        self.op_cost = op_cost
+        self.docs: Dict[Any, dict] = {}
+        self.calls = 0
+        self._pool = asyncio.Semaphore(pool_size)
+        self._locks: Dict[Any, asyncio.Lock] = {}
+
+    async def _round_trip(self, key, apply, write: bool = True):
+        self.calls += 1
+        async with self._pool:
+            await asyncio.sleep(self.rtt / 2)
+            if write and key is not None:
+                async with self._locks.setdefault(key, asyncio.Lock()):
+                    await asyncio.sleep(self.op_cost)
+                    result = apply()
+            else:
+                result = apply()
+            await asyncio.sleep(self.rtt / 2)
+        return result
+
+    def _select(self, query: dict) -> List[dict]:
+        key = query.get("_id")
+        if key is None:
+            candidates = self.docs.values()
+        elif isinstance(key, dict) and "$in" in key:
+            candidates = [self.docs[k] for k in key["$in"] if k in self.docs]
+        else:
+            candidates = [self.docs[key]] if key in self.docs else []
+        return [doc for doc in candidates if matches(doc, query)]
+
+    @staticmethod
+    def _key(query: dict):
+        key = query.get("_id")
+        return key if key is not None and not isinstance(key, dict) else None
+
+    @staticmethod
+    def _update(doc: dict, update: dict):
+        for field, amount in update.get("$inc", {}).items():
+            doc[field] = doc.get(field, 0) + amount
+        doc.update(update.get("$set", {}))
+
+    async def find_one(self, query: dict, projection=None, sort=None):
+        def apply():
+            found = self._select(query)
+            return dict(found[0]) if found else None
+        return await self._round_trip(None, apply, write=False)
+
+    def find(self, query: dict, projection=None):
+        return ListCursor([dict(doc) for doc in self._select(query)])
+
+    async def insert_one(self, doc: dict):
+        def apply():
+            if doc["_id"] in self.docs:
+                raise DuplicateKeyError("duplicate key")
+            self.docs[doc["_id"]] = dict(doc)
+        return await self._round_trip(doc["_id"], apply)
+
+    async def update_one(self, query: dict, update: dict, upsert: bool = False):
+        def apply():
+            found = self._select(query)
+            if found:
+                self._update(found[0], update)
+                return Result(1, 1)
+            if upsert:
+                doc = {k: v for k, v in query.items() if not isinstance(v, dict)}
+                doc.update(update.get("$setOnInsert", {}))
+                self._update(doc, update)
+                self.docs[doc["_id"]] = doc
+            return Result()
+        return await self._round_trip(self._key(query), apply)
+
+    async def update_many(self, query: dict, update: dict):
+        def apply():
+            found = self._select(query)
+            for doc in found:
+                self._update(doc, update)
+            return Result(len(found), len(found))
+        return await self._round_trip(None, apply, write=False)
+
+    async def delete_one(self, query: dict):
+        def apply():
+            found = self._select(query)
+            if found:
+                del self.docs[found[0]["_id"]]
+            return Result(deleted=len(found[:1]))
+        return await self._round_trip(self._key(query), apply)
+
+    async def delete_many(self, query: dict):
+        def apply():
+            found = self._select(query)
+            for doc in found:
+                del self.docs[doc["_id"]]
+            return Result(deleted=len(found))
+        return await self._round_trip(None, apply, write=False)
+
+    async def find_one_and_delete(self, query: dict):
+        def apply():
+            found = self._select(query)
+            if not found:
+                return None
+            return self.docs.pop(found[0]["_id"])
+        return await self._round_trip(self._key(query), apply)
+
+
+def import_server():
+    """Import the FastAPI app module with settings suited to in-process benchmarks
+
+    The Motor client connects lazily, so a placeholder MONGO_URL is enough
+    until something replaces ``server.db``. Existing environment settings win.
+    """
+    import os
+    for name, value in {
+        "MONGO_URL": "mongodb://localhost:27017",
+        "DB_NAME": "bench",
+        "ENSURE_INDEXES": "0",
+        "ANALYTICS_REFRESH_INTERVAL": "0",
+    }.items():
+        os.environ.setdefault(name, value)
+    import server
+    return server
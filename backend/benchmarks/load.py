@@ -0,0 +1,202 @@
+"""End-to-end load harness driving the FastAPI app in process.
+
+Run from backend/: python -m benchmarks.load [--concurrency 32] [--duration 10]
+                                             [--mongo-url mongodb://...] [--output load.json]
+
+Simulated shoppers browse, open products, fill carts and check out
+through an httpx ASGI client, so requests run the full middleware and
+routing stack without sockets. Mongo is a mongomock-motor database unless
+--mongo-url points at a real (ideally local) mongod. Latency percentiles
+and throughput per request type are reported as JSON; with --compare the
+run fails on regressions beyond --tolerance.
+"""
+import argparse
+import asyncio
+import logging
+import random
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.fixtures import import_server, make_products
+from benchmarks.micro import CUSTOMER
+from benchmarks.report import check_regressions, latency_summary, make_report, write_report
+
+BROWSE_QUERIES = [
+    {},
+    {"category": "office"},
+    {"category": "bedroom", "sort": "price", "limit": 24},
+    {"min_price": 50000, "max_price": 150000, "limit": 24},
+    {"featured": "true"},
+    {"search": "velvet", "limit": 24},
+    {"search": "royal be", "limit": 24},
+    {"sort": "-name", "limit": 48, "fields": "id,name,price,image"},
+]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        # Requests started before this perf_counter time are warmup
+        self.record_from = float("inf")
+
+    async def request(self, client: httpx.AsyncClient, name: str, method: str, url: str, **kwargs) -> httpx.Response:
+        start = time.perf_counter()
+        response = await client.request(method, url, **kwargs)
+        elapsed = time.perf_counter() - start
+        if start >= self.record_from:
+            self.latencies[name].append(elapsed)
+            if response.status_code >= 400:
+                self.errors[name] += 1
+        return response
+
+
+class Shopper:
+    """One simulated user; each step is a weighted choice of behaviour"""
+
+    def __init__(self, client: httpx.AsyncClient, recorder: Recorder, product_ids: List[str], rng: random.Random):
+        self.client = client
+        self.recorder = recorder
+        self.product_ids = product_ids
+        self.rng = rng
+        self.cart_id = None
+        self.order_ids: List[str] = []
+
+    async def browse(self):
+        params = self.rng.choice(BROWSE_QUERIES)
+        await self.recorder.request(self.client, "list products", "GET", "/api/products", params=params)
+
+    async def view(self):
+        product_id = self.rng.choice(self.product_ids)
+        await self.recorder.request(self.client, "product detail", "GET", f"/api/products/{product_id}")
+
+    async def categories(self):
+        await self.recorder.request(self.client, "categories", "GET", "/api/categories")
+
+    async def add_to_cart(self):
+        if self.cart_id is None:
+            response = await self.recorder.request(self.client, "create cart", "POST", "/api/cart/create")
+            self.cart_id = response.json()["id"]
+        await self.recorder.request(
+            self.client, "add to cart", "POST", f"/api/cart/{self.cart_id}/add",
+            json={"product_id": self.rng.choice(self.product_ids), "quantity": self.rng.randint(1, 2)},
+        )
+
+    async def checkout(self):
+        if self.cart_id is None:
+            await self.add_to_cart()
+        response = await self.recorder.request(
+            self.client, "checkout", "POST", "/api/orders",
+            json={"customer": CUSTOMER, "cart_id": self.cart_id},
+        )
+        if response.status_code == 200:
+            self.order_ids.append(response.json()["id"])
+        self.cart_id = None
+
+    async def view_order(self):
+        if not self.order_ids:
+            return await self.browse()
+        order_id = self.rng.choice(self.order_ids)
+        await self.recorder.request(self.client, "order detail", "GET", f"/api/orders/{order_id}")
+
+    async def step(self):
+        behaviour = self.rng.choices(
+            [self.browse, self.view, self.categories, self.add_to_cart, self.checkout, self.view_order],
+            weights=[40, 30, 5, 15, 5, 5],
+        )[0]
+        await behaviour()
+
+
+async def run(args) -> dict:
+    server = import_server()
+    if args.mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        database = AsyncIOMotorClient(args.mongo_url)["bench_load"]
+        await database.client.drop_database("bench_load")
+    else:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("Install mongomock-motor or pass --mongo-url")
+        database = AsyncMongoMockClient()["bench_load"]
+    server.db.bind(database)
+    server.registry.reload(server.validate_products(make_products(args.catalog_size)))
+    if args.no_response_cache:
+        server.response_cache.max_bytes = 0
+
+    product_ids = [p["id"] for p in server.registry.index.products]
+    recorder = Recorder()
+    transport = httpx.ASGITransport(app=server.app)
+    async with server.app.router.lifespan_context(server.app), \
+            httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Only measure a warm app, as a load balancer would
+        while (await client.get("/api/health/ready")).status_code != 200:
+            await asyncio.sleep(0.05)
+        recorder.record_from = time.perf_counter() + args.warmup
+        deadline = recorder.record_from + args.duration
+
+        async def shopper(seed: int):
+            user = Shopper(client, recorder, product_ids, random.Random(seed))
+            while time.perf_counter() < deadline:
+                await user.step()
+                # In-memory stores never suspend; let the other shoppers in
+                await asyncio.sleep(0)
+
+        await asyncio.gather(*(shopper(args.seed + i) for i in range(args.concurrency)))
+        measured = time.perf_counter() - recorder.record_from
+
+    results = []
+    total = 0
+    for name in sorted(recorder.latencies):
+        samples = recorder.latencies[name]
+        total += len(samples)
+        results.append({
+            "name": name,
+            **latency_summary(samples),
+            "requests_per_s": round(len(samples) / measured, 1),
+            "errors": recorder.errors[name],
+        })
+    every = [s for samples in recorder.latencies.values() for s in samples]
+    results.insert(0, {
+        "name": "all requests",
+        **latency_summary(every),
+        "requests_per_s": round(total / measured, 1),
+        "errors": sum(recorder.errors.values()),
+    })
+    config = {k: v for k, v in vars(args).items() if k not in ("output", "compare", "tolerance")}
+    config["mongo"] = "mongod" if args.mongo_url else "mongomock"
+    config.pop("mongo_url")
+    return make_report("load", config, results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds first")
+    parser.add_argument("--catalog-size", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-response-cache", action="store_true", help="render every product response")
+    parser.add_argument("--mongo-url")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="baseline report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed slowdown as a fraction")
+    args = parser.parse_args()
+
+    # httpx logs every request at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    report = asyncio.run(run(args))
+    for result in report["results"]:
+        print(f"{result['name']:<16} {result.get('requests_per_s', 0):>9.1f} req/s  "
+              f"p50 {result.get('p50_ms', 0):>7.2f}  p95 {result.get('p95_ms', 0):>7.2f}  "
+              f"p99 {result.get('p99_ms', 0):>7.2f} ms  errors {result['errors']}", file=sys.stderr)
+    write_report(report, args.output)
+    check_regressions(args.compare, report, args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""Micro-benchmarks of the API's hot functions over generated catalogs.
+
+Run from backend/: python -m benchmarks.micro [--sizes 1000 100000] [--output micro.json]
+                                              [--compare baseline.json]
+
+Covers the get_products filter/sort/serialize path, product lookup, cart
+mutations and Order construction. Results are printed (or written) as a
+JSON report; with --compare the run fails when any case is slower than
+the baseline by more than --tolerance.
+"""
+import argparse
+import itertools
+import random
+import sys
+
+from benchmarks.bench_catalog import PAGE_QUERIES, QUERIES, best_of
+from benchmarks.fixtures import import_server, make_products
+from benchmarks.report import check_regressions, make_report, write_report
+from cart_store import CartState
+from catalog import ProductRegistry
+
+SEARCH_QUERIES = {
+    "search one word": {"search": "velvet"},
+    "search two words, page": {"search": "royal bed", "limit": 50},
+}
+
+CUSTOMER = {
+    "full_name": "Bench Customer", "email": "bench@example.com", "phone": "9999999999",
+    "address": "1 Example Road", "city": "Mumbai", "state": "MH", "pincode": "400001",
+}
+
+
+def catalog_cases(server, registry: ProductRegistry, rng: random.Random):
+    index = registry.index
+    for name, query in {**QUERIES, **PAGE_QUERIES, **SEARCH_QUERIES}.items():
+        yield f"page: {name}", lambda query=query: index.page(**query)
+
+    for name, query in {"first page of 50": {"limit": 50}, "category page": {"category": "office", "limit": 50}}.items():
+        def render(query=query):
+            products, _ = index.page(**query)
+            return server.encode(products)
+        yield f"render: {name}", render
+
+    ids = [p["id"] for p in index.products]
+    sample = [rng.choice(ids) for _ in range(1024)]
+    positions = itertools.count()
+    yield "lookup: get", lambda: registry.get(sample[next(positions) & 1023])
+    batch = sample[:20]
+    yield "lookup: get_many x20", lambda: registry.get_many(batch)
+
+
+def cart_cases(registry: ProductRegistry, rng: random.Random):
+    products = rng.sample(registry.index.products, 10)
+
+    def fresh_cart() -> CartState:
+        cart = CartState("bench-cart")
+        for product in products:
+            cart.add(product, 2)
+        return cart
+
+    cart = fresh_cart()
+    yield "cart: add existing line", lambda: cart.add(products[3], 1)
+    yield "cart: set quantity", lambda: cart.set_quantity(products[5]["id"], rng.randint(1, 5))
+
+    def remove_and_readd():
+        cart.remove(products[7]["id"])
+        cart.add(products[7], 1)
+    yield "cart: remove + add", remove_and_readd
+    yield "cart: to_dict (10 lines)", cart.to_dict
+    yield "cart: build 10 lines", fresh_cart
+
+
+def order_cases(server, registry: ProductRegistry, rng: random.Random):
+    cart = CartState("bench-order")
+    for product in rng.sample(registry.index.products, 10):
+        cart.add(product, rng.randint(1, 3))
+    snapshot = cart.to_dict()
+    customer = server.CustomerDetails(**CUSTOMER)
+
+    def build():
+        return server.Order(customer=customer, items=snapshot["items"], total=snapshot["total"])
+    yield "order: construct (10 lines)", build
+    order = build()
+    yield "order: model_dump", order.model_dump
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="baseline report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed slowdown as a fraction")
+    args = parser.parse_args()
+
+    server = import_server()
+    results = []
+    for size in args.sizes:
+        rng = random.Random(size)
+        registry = ProductRegistry(server.validate_products(make_products(size)))
+        cases = [
+            *catalog_cases(server, registry, rng),
+            *cart_cases(registry, rng),
+            *order_cases(server, registry, rng),
+        ]
+        for name, fn in cases:
+            per_call = best_of(fn, args.repeat)
+            results.append({
+                "name": f"{name} [{size}]",
+                "catalog_size": size,
+                "per_call_us": round(per_call, 3),
+                "ops_per_s": round(1e6 / per_call, 1),
+            })
+            print(f"{size:>8}  {name:<32} {per_call:>12.2f} us", file=sys.stderr)
+
+    report = make_report("micro", {"sizes": args.sizes, "repeat": args.repeat}, results)
+    write_report(report, args.output)
+    check_regressions(args.compare, report, args.tolerance)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""JSON reports shared by the micro-benchmarks and the load harness.
+
+A report is ``{"benchmark": ..., "environment": {...}, "config": {...},
+"results": [{"name": ..., <metrics>}, ...]}``. Two reports of the same
+benchmark can be compared with ``python -m benchmarks.report old.json new.json``.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+# Metric names by the direction that counts as better
+LOWER_IS_BETTER = {"per_call_us", "p50_ms", "p95_ms", "p99_ms", "mean_ms", "rss_mb", "pss_mb", "uss_mb", "total_pss_mb"}
+HIGHER_IS_BETTER = {"ops_per_s", "requests_per_s"}
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+            cwd=Path(__file__).parent, timeout=5,
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "commit": commit,
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def latency_summary(samples: Sequence[float]) -> dict:
+    """Percentiles of latencies given in seconds, reported in milliseconds"""
+    if not samples:
+        return {"count": 0}
+    ms = sorted(s * 1000 for s in samples)
+    if len(ms) > 1:
+        cuts = statistics.quantiles(ms, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = ms[0]
+    return {
+        "count": len(ms),
+        "mean_ms": round(statistics.fmean(ms), 3),
+        "p50_ms": round(p50, 3),
+        "p95_ms": round(p95, 3),
+        "p99_ms": round(p99, 3),
+        "max_ms": round(ms[-1], 3),
+    }
+
+
+def make_report(benchmark: str, config: dict, results: List[dict]) -> dict:
+    return {"benchmark": benchmark, "environment": environment(), "config": config, "results": results}
+
+
+def write_report(report: dict, path: Optional[str] = None):
+    text = json.dumps(report, indent=2)
+    if path:
+        Path(path).write_text(text + "\n")
+    else:
+        print(text)
+
+
+def compare(baseline: dict, current: dict, tolerance: float = 0.10) -> List[str]:
+    """Describe every metric that got worse by more than tolerance (a fraction)"""
+    previous = {r["name"]: r for r in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        before = previous.get(result["name"])
+        if before is None:
+            continue
+        for metric, value in result.items():
+            old = before.get(metric)
+            if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+                continue
+            if metric in LOWER_IS_BETTER:
+                change = value / old - 1
+            elif metric in HIGHER_IS_BETTER:
+                change = old / value - 1 if value else float("inf")
+            else:
+                continue
+            if change > tolerance:
+                regressions.append(f"{result['name']}: {metric} {old} -> {value} ({change:+.0%} worse)")
+    return regressions
+
+
+def check_regressions(baseline_path: Optional[str], report: dict, tolerance: float):
+    """Exit non-zero when report regressed against the baseline file"""
+    if not baseline_path:
+        return
+    baseline = json.loads(Path(baseline_path).read_text())
+    if baseline.get("config") != report.get("config"):
+        print("warning: baseline was run with a different config", file=sys.stderr)
+    regressions = compare(baseline, report, tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}", file=sys.stderr)
+    if regressions:
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed slowdown as a fraction")
+    args = parser.parse_args()
+    check_regressions(args.baseline, json.loads(Path(args.current).read_text()), args.tolerance)
+    print("no regressions")
+
+
+if __name__ == "__main__":
+    main()
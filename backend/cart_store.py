@@ -0,0 +1,676 @@
+"""Cart persistence: in-memory, MongoDB and write-behind cached stores."""
+import asyncio
+import logging
+import sys
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from pymongo import ReplaceOne, ReturnDocument
+
+from metrics import work_seconds
+from periodic import run_periodically
+
+logger = logging.getLogger(__name__)
+
+
+class CartConsistencyError(AssertionError):
+    """An incrementally maintained total disagrees with a full recompute"""
+
+
+class CartConflictError(Exception):
+    """Concurrent writers kept changing a cart until an update gave up"""
+
+
+def to_paise(price: float) -> int:
+    return int(round(price * 100))
+
+
+def cart_line(product: dict, quantity: int) -> dict:
+    return {
+        "product_id": product["id"],
+        "name": product["name"],
+        "price": product["price"],
+        "image": product["image"],
+        "quantity": quantity,
+    }
+
+
+def recompute_paise(items) -> int:
+    return sum(to_paise(i["price"]) * i["quantity"] for i in items)
+
+
+def public_cart(doc: dict) -> dict:
+    """API shape of a stored cart document"""
+    return {"id": doc["id"], "items": doc["items"], "total": doc["total_paise"] / 100}
+
+
+def verify_total(cart_id: str, expected_paise: int, total_paise: int):
+    if expected_paise != total_paise:
+        logger.error("Cart %s total drifted: stored %d paise, recomputed %d", cart_id, total_paise, expected_paise)
+        raise CartConsistencyError(f"Cart {cart_id} total is {total_paise} paise, expected {expected_paise}")
+
+
+class CartLine:
+    __slots__ = ("product_id", "name", "price", "image", "quantity")
+
+    def __init__(self, product_id: str, name: str, price: float, image: str, quantity: int):
+        self.product_id = product_id
+        self.name = name
+        self.price = price
+        self.image = image
+        self.quantity = quantity
+
+    @classmethod
+    def from_product(cls, product: dict, quantity: int) -> "CartLine":
+        return cls(product["id"], product["name"], product["price"], product["image"], quantity)
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "CartLine":
+        return cls(doc["product_id"], doc["name"], doc["price"], doc["image"], doc["quantity"])
+
+    def to_dict(self) -> dict:
+        return {
+            "product_id": self.product_id,
+            "name": self.name,
+            "price": self.price,
+            "image": self.image,
+            "quantity": self.quantity,
+        }
+
+
+class CartState:
+    """A cart held in process memory
+
+    Lines are indexed by product_id and the total is kept in integer
+    paise, adjusted by each mutation's delta, so every operation is O(1)
+    in the number of lines. ``touched`` is the monotonic time of the last
+    access, used for expiry.
+    """
+
+    __slots__ = ("id", "lines", "total_paise", "touched")
+
+    def __init__(self, cart_id: Optional[str] = None):
+        self.id = cart_id or str(uuid.uuid4())
+        self.lines: Dict[str, CartLine] = {}
+        self.total_paise = 0
+        self.touched = time.monotonic()
+
+    @classmethod
+    def from_doc(cls, doc: dict) -> "CartState":
+        cart = cls(doc["id"])
+        cart.lines = {i["product_id"]: CartLine.from_doc(i) for i in doc["items"]}
+        cart.total_paise = doc["total_paise"]
+        return cart
+
+    def to_doc(self) -> dict:
+        return {
+            "id": self.id,
+            "items": [line.to_dict() for line in self.lines.values()],
+            "total_paise": self.total_paise,
+            "updated_at": datetime.now(timezone.utc),
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "items": [line.to_dict() for line in self.lines.values()],
+            "total": self.total_paise / 100,
+        }
+
+    def add(self, product: dict, quantity: int):
+        line = self.lines.get(product["id"])
+        if line is None:
+            line = self.lines[product["id"]] = CartLine.from_product(product, 0)
+        # An existing line keeps the price it was added at, even if the catalog changed since
+        line.quantity += quantity
+        self.total_paise += to_paise(line.price) * quantity
+
+    def set_quantity(self, product_id: str, quantity: int):
+        """Set a line's quantity, removing the line when quantity <= 0"""
+        line = self.lines.get(product_id)
+        if line is None:
+            return
+        if quantity <= 0:
+            self.remove(product_id)
+            return
+        self.total_paise += to_paise(line.price) * (quantity - line.quantity)
+        line.quantity = quantity
+
+    def remove(self, product_id: str):
+        line = self.lines.pop(product_id, None)
+        if line is not None:
+            self.total_paise -= to_paise(line.price) * line.quantity
+
+    def clear(self):
+        self.lines.clear()
+        self.total_paise = 0
+
+    def verify(self):
+        """Compare the running total against a full recompute"""
+        expected = sum(to_paise(line.price) * line.quantity for line in self.lines.values())
+        verify_total(self.id, expected, self.total_paise)
+
+    def approx_size(self) -> int:
+        """Bytes held by this cart, not counting strings shared with the catalog"""
+        size = sys.getsizeof(self) + sys.getsizeof(self.lines)
+        if self.lines:
+            size += len(self.lines) * (sys.getsizeof(next(iter(self.lines.values()))) + 2 * sys.getsizeof(0))
+        return size
+
+
+class CartLru:
+    """Carts ordered by last access, bounded by count and idle time
+
+    Because access moves a cart to the end, the idle carts are always at
+    the front, so sweeping costs O(expired) rather than O(carts).
+    """
+
+    def __init__(self, capacity: int, ttl: Optional[float] = None):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.carts: "OrderedDict[str, CartState]" = OrderedDict()
+        self.evicted = 0
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self.carts)
+
+    def _is_expired(self, cart: CartState, now: float) -> bool:
+        return self.ttl is not None and now - cart.touched > self.ttl
+
+    def get(self, cart_id: str) -> Optional[CartState]:
+        cart = self.carts.get(cart_id)
+        if cart is None:
+            return None
+        now = time.monotonic()
+        if self._is_expired(cart, now):
+            del self.carts[cart_id]
+            self.expired += 1
+            return None
+        cart.touched = now
+        self.carts.move_to_end(cart_id)
+        return cart
+
+    def put(self, cart: CartState):
+        cart.touched = time.monotonic()
+        self.carts[cart.id] = cart
+        self.carts.move_to_end(cart.id)
+        while len(self.carts) > self.capacity:
+            self.carts.popitem(last=False)
+            self.evicted += 1
+
+    def sweep(self) -> int:
+        """Drop idle carts and return how many were removed"""
+        now = time.monotonic()
+        removed = 0
+        while self.carts:
+            cart = next(iter(self.carts.values()))
+            if not self._is_expired(cart, now):
+                break
+            self.carts.popitem(last=False)
+            removed += 1
+        self.expired += removed
+        return removed
+
+    def stats(self) -> dict:
+        return {
+            "carts": len(self.carts),
+            "lines": sum(len(cart.lines) for cart in self.carts.values()),
+            "approx_bytes": sum(cart.approx_size() for cart in self.carts.values()),
+            "capacity": self.capacity,
+            "ttl_seconds": self.ttl,
+            "evicted_total": self.evicted,
+            "expired_total": self.expired,
+        }
+
+
+# (op, product_id, quantity, resolved product or None)
+CartOperation = Tuple[str, str, int, Optional[dict]]
+
+
+def apply_operations(cart: CartState, operations: Sequence[CartOperation]) -> List[Optional[str]]:
+    """Apply add/update/remove operations in order; returns an error per op, None on success"""
+    errors: List[Optional[str]] = []
+    for op, product_id, quantity, product in operations:
+        if op == "add":
+            if product is None:
+                errors.append("Product not found")
+                continue
+            if quantity <= 0:
+                errors.append("Quantity must be positive")
+                continue
+            cart.add(product, quantity)
+        elif product_id not in cart.lines:
+            errors.append("Item not in cart")
+            continue
+        elif op == "update":
+            cart.set_quantity(product_id, quantity)
+        elif op == "remove":
+            cart.remove(product_id)
+        else:
+            errors.append(f"Unknown operation: {op}")
+            continue
+        errors.append(None)
+    return errors
+
+
+class CartStore(ABC):
+    """Storage backend for carts
+
+    Mutations return the updated cart, or None if the cart does not exist.
+    With ``check_consistency`` set, every mutation re-derives the cart total
+    from its lines and raises CartConsistencyError on a mismatch.
+    """
+
+    check_consistency = False
+
+    async def start(self):
+        """Start background work; called once on app startup, must not need the database"""
+
+    async def ensure_indexes(self):
+        """Create the indexes the store relies on; retried until Mongo is reachable"""
+
+    async def close(self):
+        """Flush pending state; called once on app shutdown"""
+
+    async def stats(self) -> dict:
+        """Cart count and memory figures for monitoring"""
+        return {}
+
+    @abstractmethod
+    async def create(self) -> dict:
+        ...
+
+    @abstractmethod
+    async def get(self, cart_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def add_item(self, cart_id: str, product: dict, quantity: int) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def set_quantity(self, cart_id: str, product_id: str, quantity: int) -> Optional[dict]:
+        """Set a line's quantity, removing the line when quantity <= 0"""
+
+    @abstractmethod
+    async def remove_item(self, cart_id: str, product_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def clear(self, cart_id: str) -> Optional[dict]:
+        ...
+
+    @abstractmethod
+    async def apply_batch(
+        self, cart_id: str, operations: Sequence[CartOperation]
+    ) -> Optional[Tuple[dict, List[Optional[str]]]]:
+        """Apply operations in one pass; returns the cart and per-operation errors"""
+
+
+class InMemoryCartStore(CartStore):
+    """Per-process carts; lost on restart
+
+    Carts idle for longer than ``ttl`` seconds expire, a background task
+    sweeps them every ``sweep_interval`` seconds, and past ``max_carts``
+    the least recently used cart is evicted.
+    """
+
+    def __init__(self, max_carts: int = 100_000, ttl: Optional[float] = None,
+                 sweep_interval: float = 60.0, check_consistency: bool = False):
+        self.carts = CartLru(max_carts, ttl)
+        self.sweep_interval = sweep_interval
+        self.check_consistency = check_consistency
+        self._sweeper: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self.carts.ttl is not None:
+            self._sweeper = asyncio.create_task(
+                run_periodically(self.sweep_interval, self.carts.sweep, "Cart expiry sweep")
+            )
+
+    async def close(self):
+        if self._sweeper:
+            self._sweeper.cancel()
+            self._sweeper = None
+
+    async def stats(self) -> dict:
+        return self.carts.stats()
+
+    async def create(self) -> dict:
+        cart = CartState()
+        self.carts.put(cart)
+        return cart.to_dict()
+
+    async def get(self, cart_id: str) -> Optional[dict]:
+        cart = self.carts.get(cart_id)
+        return cart.to_dict() if cart is not None else None
+
+    def _mutate(self, cart_id: str, mutation, *args) -> Optional[dict]:
+        cart = self.carts.get(cart_id)
+        if cart is None:
+            return None
+        with work_seconds.time("cart_update"):
+            mutation(cart, *args)
+            if self.check_consistency:
+                cart.verify()
+            return cart.to_dict()
+
+    async def add_item(self, cart_id: str, product: dict, quantity: int) -> Optional[dict]:
+        return self._mutate(cart_id, CartState.add, product, quantity)
+
+    async def set_quantity(self, cart_id: str, product_id: str, quantity: int) -> Optional[dict]:
+        return self._mutate(cart_id, CartState.set_quantity, product_id, quantity)
+
+    async def remove_item(self, cart_id: str, product_id: str) -> Optional[dict]:
+        return self._mutate(cart_id, CartState.remove, product_id)
+
+    async def clear(self, cart_id: str) -> Optional[dict]:
+        return self._mutate(cart_id, CartState.clear)
+
+    async def apply_batch(self, cart_id: str, operations: Sequence[CartOperation]):
+        cart = self.carts.get(cart_id)
+        if cart is None:
+            return None
+        with work_seconds.time("cart_batch"):
+            errors = apply_operations(cart, operations)
+            if self.check_consistency:
+                cart.verify()
+            return cart.to_dict(), errors
+
+
+# Server-side recompute of the cart total, appended to pipeline updates
+RECOMPUTE_TOTAL = {"$set": {
+    "total_paise": {"$sum": {"$map": {"input": "$items", "in": {"$multiply": [
+        {"$toLong": {"$round": [{"$multiply": ["$$this.price", 100]}, 0]}}, "$$this.quantity",
+    ]}}}},
+    "rev": {"$add": [{"$ifNull": ["$rev", 0]}, 1]},
+    "updated_at": "$$NOW",
+}}
+
+# Attempts at a batch's optimistic replace before giving up
+BATCH_RETRIES = 5
+
+
+class MongoCartStore(CartStore):
+    """Carts stored one document each in MongoDB
+
+    Every mutation is a single atomic update on the server, so any number
+    of workers can share the collection without read-modify-write races.
+    Each update bumps a ``rev`` counter that batches use for optimistic
+    concurrency and stamps ``updated_at``, which a TTL index uses to expire
+    idle carts.
+    """
+
+    def __init__(self, collection, ttl: Optional[float] = None, check_consistency: bool = False):
+        self.collection = collection
+        self.ttl = ttl
+        self.check_consistency = check_consistency
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("id", unique=True)
+        if self.ttl is not None:
+            await self.collection.create_index("updated_at", expireAfterSeconds=int(self.ttl))
+
+    async def stats(self) -> dict:
+        return {"carts": await self.collection.estimated_document_count(), "ttl_seconds": self.ttl}
+
+    async def create(self) -> dict:
+        cart = CartState()
+        await self.collection.insert_one({**cart.to_doc(), "rev": 0})
+        return cart.to_dict()
+
+    async def find_doc(self, cart_id: str) -> Optional[dict]:
+        return await self.collection.find_one({"id": cart_id}, {"_id": 0})
+
+    async def get(self, cart_id: str) -> Optional[dict]:
+        doc = await self.find_doc(cart_id)
+        return public_cart(doc) if doc is not None else None
+
+    async def _update(self, query: dict, update) -> Optional[dict]:
+        doc = await self.collection.find_one_and_update(
+            query, update, projection={"_id": 0}, return_document=ReturnDocument.AFTER
+        )
+        if doc is None:
+            return None
+        if self.check_consistency:
+            verify_total(doc["id"], recompute_paise(doc["items"]), doc["total_paise"])
+        return public_cart(doc)
+
+    async def add_item(self, cart_id: str, product: dict, quantity: int) -> Optional[dict]:
+        # An existing line keeps the price it was added at, so the increment
+        # only applies where the line has the price the amount was computed
+        # from; on a miss we read the stored price and try again. Extra
+        # attempts also cover a concurrent request pushing the same line first
+        price = product["price"]
+        for _ in range(3):
+            cart = await self._update(
+                {"id": cart_id, "items": {"$elemMatch": {"product_id": product["id"], "price": price}}},
+                {"$inc": {"items.$.quantity": quantity, "total_paise": to_paise(price) * quantity, "rev": 1},
+                 "$currentDate": {"updated_at": True}},
+            )
+            if cart is not None:
+                return cart
+            cart = await self._update(
+                {"id": cart_id, "items.product_id": {"$ne": product["id"]}},
+                {"$push": {"items": cart_line(product, quantity)},
+                 "$inc": {"total_paise": to_paise(product["price"]) * quantity, "rev": 1},
+                 "$currentDate": {"updated_at": True}},
+            )
+            if cart is not None:
+                return cart
+            doc = await self.find_doc(cart_id)
+            if doc is None:
+                return None
+            line = next((i for i in doc["items"] if i["product_id"] == product["id"]), None)
+            if line is not None:
+                price = line["price"]
+        raise CartConflictError(f"Cart {cart_id} kept changing while adding {product['id']}")
+
+    async def set_quantity(self, cart_id: str, product_id: str, quantity: int) -> Optional[dict]:
+        if quantity <= 0:
+            return await self.remove_item(cart_id, product_id)
+        # Pipeline update so the total is recomputed in the same atomic write
+        return await self._update({"id": cart_id}, [
+            {"$set": {"items": {"$map": {"input": "$items", "in": {"$cond": [
+                {"$eq": ["$$this.product_id", product_id]},
+                {"$mergeObjects": ["$$this", {"quantity": quantity}]},
+                "$$this",
+            ]}}}}},
+            RECOMPUTE_TOTAL,
+        ])
+
+    async def remove_item(self, cart_id: str, product_id: str) -> Optional[dict]:
+        # $pull can't adjust the total without knowing the removed line, so
+        # filter and recompute server-side in one pipeline update instead
+        return await self._update({"id": cart_id}, [
+            {"$set": {"items": {"$filter": {
+                "input": "$items", "cond": {"$ne": ["$$this.product_id", product_id]},
+            }}}},
+            RECOMPUTE_TOTAL,
+        ])
+
+    async def clear(self, cart_id: str) -> Optional[dict]:
+        return await self._update({"id": cart_id}, {
+            "$set": {"items": [], "total_paise": 0},
+            "$inc": {"rev": 1},
+            "$currentDate": {"updated_at": True},
+        })
+
+    async def apply_batch(self, cart_id: str, operations: Sequence[CartOperation]):
+        # One read, then one replace guarded by the revision we read
+        for _ in range(BATCH_RETRIES):
+            doc = await self.find_doc(cart_id)
+            if doc is None:
+                return None
+            cart = CartState.from_doc(doc)
+            errors = apply_operations(cart, operations)
+            if self.check_consistency:
+                cart.verify()
+            rev = doc.get("rev")
+            result = await self.collection.replace_one(
+                {"id": cart_id, "rev": rev if rev is not None else {"$exists": False}},
+                {**cart.to_doc(), "rev": (rev or 0) + 1},
+            )
+            if result.matched_count:
+                return cart.to_dict(), errors
+        raise CartConflictError(f"Cart {cart_id} kept changing during a batch update")
+
+
+class CachedCartStore(CartStore):
+    """Hot carts in a per-process LRU, written back to Mongo in batches
+
+    Mutations only touch memory; dirty carts are flushed with one
+    bulk_write every ``flush_interval`` seconds or once ``batch_size``
+    carts are dirty. Each process owns its cached carts, so route a cart's
+    requests to the same worker (sticky sessions) when running several.
+    Carts leaving the LRU by eviction or expiry stay in ``pending`` until
+    written, so no change is lost; the Mongo TTL index expires them there.
+    """
+
+    def __init__(self, backing: MongoCartStore, capacity: int = 10_000,
+                 flush_interval: float = 1.0, batch_size: int = 500,
+                 sweep_interval: float = 60.0, check_consistency: bool = False):
+        self.backing = backing
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.sweep_interval = sweep_interval
+        self.check_consistency = check_consistency
+        self.cache = CartLru(capacity, backing.ttl)
+        # Dirty carts awaiting write-back, including ones evicted from the LRU
+        self.pending: Dict[str, CartState] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._flushes: Set[asyncio.Task] = set()
+        self._flush_lock = asyncio.Lock()
+
+    async def ensure_indexes(self):
+        await self.backing.ensure_indexes()
+
+    async def start(self):
+        self._tasks.append(asyncio.create_task(
+            run_periodically(self.flush_interval, self.flush, "Cart write-back")
+        ))
+        if self.cache.ttl is not None:
+            self._tasks.append(asyncio.create_task(
+                run_periodically(self.sweep_interval, self.cache.sweep, "Cart expiry sweep")
+            ))
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+        await self.flush()
+
+    async def stats(self) -> dict:
+        return {**self.cache.stats(), "pending": len(self.pending)}
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self.pending:
+                return
+            batch, self.pending = self.pending, {}
+            # Snapshot the documents; encoding happens off the event loop
+            requests = [
+                ReplaceOne({"id": cart_id}, cart.to_doc(), upsert=True)
+                for cart_id, cart in batch.items()
+            ]
+            try:
+                await self.backing.collection.bulk_write(requests, ordered=False)
+            except Exception:
+                # Keep the carts for the next attempt unless they changed since
+                for cart_id, cart in batch.items():
+                    self.pending.setdefault(cart_id, cart)
+                raise
+
+    def _mark_dirty(self, cart: CartState):
+        self.pending[cart.id] = cart
+        if len(self.pending) >= self.batch_size:
+            task = asyncio.ensure_future(self.flush())
+            self._flushes.add(task)
+            task.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task: asyncio.Task):
+        self._flushes.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            # The carts are back in pending, so the periodic flush retries them
+            logger.error("Cart write-back failed", exc_info=task.exception())
+
+    async def _load(self, cart_id: str) -> Optional[CartState]:
+        cart = self.cache.get(cart_id) or self.pending.get(cart_id)
+        if cart is None:
+            doc = await self.backing.find_doc(cart_id)
+            if doc is None:
+                return None
+            # Another request may have loaded it while we awaited
+            cart = self.cache.get(cart_id) or CartState.from_doc(doc)
+        self.cache.put(cart)
+        return cart
+
+    async def create(self) -> dict:
+        cart = CartState()
+        self.cache.put(cart)
+        self._mark_dirty(cart)
+        return cart.to_dict()
+
+    async def get(self, cart_id: str) -> Optional[dict]:
+        cart = await self._load(cart_id)
+        return cart.to_dict() if cart is not None else None
+
+    async def _mutate(self, cart_id: str, mutation, *args) -> Optional[dict]:
+        cart = await self._load(cart_id)
+        if cart is None:
+            return None
+        with work_seconds.time("cart_update"):
+            mutation(cart, *args)
+            if self.check_consistency:
+                cart.verify()
+            self._mark_dirty(cart)
+            return cart.to_dict()
+
+    async def add_item(self, cart_id: str, product: dict, quantity: int) -> Optional[dict]:
+        return await self._mutate(cart_id, CartState.add, product, quantity)
+
+    async def set_quantity(self, cart_id: str, product_id: str, quantity: int) -> Optional[dict]:
+        return await self._mutate(cart_id, CartState.set_quantity, product_id, quantity)
+
+    async def remove_item(self, cart_id: str, product_id: str) -> Optional[dict]:
+        return await self._mutate(cart_id, CartState.remove, product_id)
+
+    async def clear(self, cart_id: str) -> Optional[dict]:
+        return await self._mutate(cart_id, CartState.clear)
+
+    async def apply_batch(self, cart_id: str, operations: Sequence[CartOperation]):
+        cart = await self._load(cart_id)
+        if cart is None:
+            return None
+        with work_seconds.time("cart_batch"):
+            errors = apply_operations(cart, operations)
+            if self.check_consistency:
+                cart.verify()
+            self._mark_dirty(cart)
+            return cart.to_dict(), errors
+
+
+def create_cart_store(kind: str, db, capacity: int = 10_000, max_carts: int = 100_000,
+                      ttl: Optional[float] = None, sweep_interval: float = 60.0,
+                      flush_interval: float = 1.0, batch_size: int = 500,
+                      check_consistency: bool = False) -> CartStore:
+    """Build the store named by CART_STORE: memory, mongo or cached
+
+    ``max_carts`` bounds the memory store, ``capacity`` the cached store's
+    LRU, and the flush options only apply to the cached store.
+    """
+    if kind == "memory":
+        return InMemoryCartStore(max_carts, ttl, sweep_interval, check_consistency)
+    if kind == "mongo":
+        return MongoCartStore(db.carts, ttl, check_consistency)
+    if kind == "cached":
+        return CachedCartStore(MongoCartStore(db.carts, ttl), capacity, flush_interval,
+                               batch_size, sweep_interval, check_consistency)
+    raise ValueError(f"Unknown cart store: {kind}")
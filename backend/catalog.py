@@ -0,0 +1,338 @@
+"""In-memory product catalog with precomputed filter indexes."""
+import base64
+import binascii
+import threading
+from bisect import bisect_left, bisect_right
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from search import SearchIndex
+
+SORT_OPTIONS = ("price", "-price", "name", "-name")
+
+
+def encode_cursor(version: int, sort: Optional[str], offset: int) -> str:
+    raw = f"{version}:{sort or ''}:{offset}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, str, int]:
+    """Return (version, sort, offset), raising ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        version, sort, offset = raw.split(":")
+        return int(version), sort, int(offset)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def derive_categories(products: Iterable[dict]) -> List[dict]:
+    """Category entries for a catalog that does not list them, in order of first use"""
+    categories: Dict[str, dict] = {}
+    for p in products:
+        category = p["category"]
+        if category not in categories:
+            name = category.replace("-", " ").replace("_", " ").title()
+            categories[category] = {"id": category, "name": name, "image": p.get("image", "")}
+    return list(categories.values())
+
+
+class CatalogIndex:
+    """Indexes a product list once so filters never rescan the catalog
+
+    Products are addressed by their position in the source list, so every
+    result can be returned in catalog order. An index is a snapshot: nothing
+    changes it after construction, a new catalog gets a new index.
+    """
+
+    def __init__(self, products: List[dict], version: int = 1, categories: Optional[List[dict]] = None):
+        self.products = list(products)
+        self.version = version
+        self.categories: List[dict] = list(categories) if categories is not None else derive_categories(self.products)
+        n = len(self.products)
+
+        # Primary key index
+        self.by_id: Dict[str, dict] = {p["id"]: p for p in self.products}
+
+        # Hash index: category -> ascending positions
+        self.by_category: Dict[str, List[int]] = {}
+        for pos, p in enumerate(self.products):
+            self.by_category.setdefault(p["category"], []).append(pos)
+
+        # Price index: prices sorted ascending, with the position of each entry
+        self.price_order: List[int] = sorted(range(n), key=lambda pos: self.products[pos]["price"])
+        self.sorted_prices: List[float] = [self.products[pos]["price"] for pos in self.price_order]
+
+        # Presorted orderings for paginated sorts
+        self.name_order: List[int] = sorted(range(n), key=lambda pos: self.products[pos]["name"].lower())
+        self.orderings: Dict[str, List[int]] = {"price": self.price_order, "name": self.name_order}
+
+        # Featured bitmap, one bit per position
+        self.featured_bits = bytearray((n + 7) // 8)
+        self.featured_positions: List[int] = []
+        for pos, p in enumerate(self.products):
+            if p.get("featured"):
+                self.featured_bits[pos >> 3] |= 1 << (pos & 7)
+                self.featured_positions.append(pos)
+        featured = set(self.featured_positions)
+        self.unfeatured_positions: List[int] = [pos for pos in range(n) if pos not in featured]
+
+        # Full-text index over name, description and material
+        self.search_index = SearchIndex()
+        self.search_index.add_many(enumerate(self.products))
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def get(self, product_id: str) -> Optional[dict]:
+        return self.by_id.get(product_id)
+
+    def get_many(self, product_ids: Iterable[str]) -> List[Optional[dict]]:
+        """Resolve ids in one call, None for any that are missing"""
+        by_id = self.by_id
+        return [by_id.get(product_id) for product_id in product_ids]
+
+    def is_featured(self, pos: int) -> bool:
+        return bool(self.featured_bits[pos >> 3] & (1 << (pos & 7)))
+
+    def price_bounds(self, min_price: Optional[float], max_price: Optional[float]) -> tuple:
+        """Return the [lo, hi) slice of price_order matching the range"""
+        lo = 0 if min_price is None else bisect_left(self.sorted_prices, min_price)
+        hi = len(self.sorted_prices) if max_price is None else bisect_right(self.sorted_prices, max_price)
+        return lo, max(lo, hi)
+
+    def filter_positions(
+        self,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        featured: Optional[bool] = None,
+    ) -> List[int]:
+        """Return matching positions in catalog order
+
+        The smallest candidate set among the active indexes drives the scan;
+        the remaining filters are O(1) checks per candidate.
+        """
+        has_price = min_price is not None or max_price is not None
+        if not category and not has_price and featured is None:
+            return list(range(len(self.products)))
+
+        # (size, kind) of each active index, smallest first
+        candidates = []
+        if category:
+            candidates.append((len(self.by_category.get(category, ())), "category"))
+        if has_price:
+            lo, hi = self.price_bounds(min_price, max_price)
+            candidates.append((hi - lo, "price"))
+        if featured is not None:
+            flagged = self.featured_positions if featured else self.unfeatured_positions
+            candidates.append((len(flagged), "featured"))
+        size, driver = min(candidates)
+        if size == 0:
+            return []
+
+        if driver == "category":
+            positions = self.by_category[category]
+        elif driver == "price":
+            positions = sorted(self.price_order[lo:hi])
+        else:
+            positions = flagged
+
+        products = self.products
+        check_category = category and driver != "category"
+        check_price = has_price and driver != "price"
+        check_featured = featured is not None and driver != "featured"
+        if not (check_category or check_price or check_featured):
+            return list(positions)
+
+        result = []
+        for pos in positions:
+            p = products[pos]
+            if check_category and p["category"] != category:
+                continue
+            if check_price:
+                if min_price is not None and p["price"] < min_price:
+                    continue
+                if max_price is not None and p["price"] > max_price:
+                    continue
+            if check_featured and self.is_featured(pos) != featured:
+                continue
+            result.append(pos)
+        return result
+
+    def filter(
+        self,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        search: Optional[str] = None,
+        featured: Optional[bool] = None,
+    ) -> List[dict]:
+        """Return matching products, by relevance when searching and in catalog order otherwise"""
+        has_filters = category or min_price is not None or max_price is not None or featured is not None
+        if not has_filters and not search:
+            return list(self.products)
+        products = self.products
+        if search:
+            restrict = set(self.filter_positions(category, min_price, max_price, featured)) if has_filters else None
+            return [products[pos] for pos in self.search_index.search(search, restrict)]
+        return [products[pos] for pos in self.filter_positions(category, min_price, max_price, featured)]
+
+    def page(
+        self,
+        category: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        search: Optional[str] = None,
+        featured: Optional[bool] = None,
+        sort: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> Tuple[List[dict], Optional[int]]:
+        """Return one page of matches and the offset the next page starts at
+
+        ``sort`` is "price" or "name", prefixed with "-" for descending.
+        The meaning of ``offset`` depends on the ordering: a position in the
+        presorted ordering when sorting, a hit count for relevance-ranked
+        search, and a catalog position otherwise. Callers should treat it as
+        opaque and only pass back what a previous page returned.
+        """
+        if sort:
+            return self._sorted_page(category, min_price, max_price, search, featured, sort, offset, limit)
+        if limit is None and not offset:
+            return self.filter(category, min_price, max_price, search, featured), None
+
+        products = self.products
+        if search:
+            has_filters = category or min_price is not None or max_price is not None or featured is not None
+            restrict = set(self.filter_positions(category, min_price, max_price, featured)) if has_filters else None
+            wanted = None if limit is None else offset + limit + 1
+            ranked = self.search_index.search(search, restrict, limit=wanted)
+            end = len(ranked) if limit is None else offset + limit
+            next_offset = end if end < len(ranked) else None
+            return [products[pos] for pos in ranked[offset:end]], next_offset
+
+        if not category and min_price is None and max_price is None and featured is None:
+            positions = range(len(products))
+        else:
+            positions = self.filter_positions(category, min_price, max_price, featured)
+        start = bisect_left(positions, offset)
+        end = len(positions) if limit is None else start + limit
+        selected = positions[start:end]
+        next_offset = selected[-1] + 1 if end < len(positions) else None
+        return [products[pos] for pos in selected], next_offset
+
+    def _sorted_page(self, category, min_price, max_price, search, featured, sort, offset, limit):
+        """Walk a presorted ordering, so a page costs O(limit / selectivity)"""
+        field = sort.lstrip("-")
+        order = self.orderings[field]
+        lo, hi = 0, len(order)
+        if field == "price" and (min_price is not None or max_price is not None):
+            # The price range is a contiguous slice of the price ordering
+            lo, hi = self.price_bounds(min_price, max_price)
+            min_price = max_price = None
+        restrict = set(self.search_index.search(search)) if search else None
+        matches = self._matcher(category, min_price, max_price, featured, restrict)
+
+        if sort.startswith("-"):
+            indices = range(hi - 1 - offset, lo - 1, -1)
+        else:
+            indices = range(lo + offset, hi)
+        products = self.products
+        result = []
+        consumed = offset
+        for i in indices:
+            consumed += 1
+            pos = order[i]
+            if matches is None or matches(pos):
+                result.append(products[pos])
+                if len(result) == limit:
+                    break
+        next_offset = consumed if len(result) == limit and consumed < hi - lo else None
+        return result, next_offset
+
+    def _matcher(self, category, min_price, max_price, featured, restrict) -> Optional[Callable[[int], bool]]:
+        """Per-position predicate for the active filters, or None if there are none"""
+        if not category and min_price is None and max_price is None and featured is None and restrict is None:
+            return None
+        products = self.products
+
+        def matches(pos: int) -> bool:
+            if restrict is not None and pos not in restrict:
+                return False
+            p = products[pos]
+            if category and p["category"] != category:
+                return False
+            if min_price is not None and p["price"] < min_price:
+                return False
+            if max_price is not None and p["price"] > max_price:
+                return False
+            if featured is not None and self.is_featured(pos) != featured:
+                return False
+            return True
+
+        return matches
+
+
+class ProductRegistry:
+    """Process-wide handle on the current catalog snapshot
+
+    A reload builds a complete new CatalogIndex before swapping the
+    reference, so readers never wait on a lock and never observe a
+    half-built catalog. Handlers should read ``registry.index`` once and use
+    that snapshot for the rest of the request.
+    """
+
+    def __init__(self, products: List[dict], lazy: bool = False, categories: Optional[List[dict]] = None):
+        self._pending: Optional[Tuple[List[dict], Optional[List[dict]]]] = (products, categories) if lazy else None
+        self._index: Optional[CatalogIndex] = None if lazy else CatalogIndex(products, categories=categories)
+        self._build_lock = threading.Lock()
+
+    @property
+    def index(self) -> CatalogIndex:
+        index = self._index
+        if index is None:
+            index = self.warm()
+        return index
+
+    @property
+    def warmed(self) -> bool:
+        return self._index is not None
+
+    def warm(self) -> CatalogIndex:
+        """Build a lazily supplied catalog now; cheap once built
+
+        Safe to call from a worker thread so the build stays off the event
+        loop; a request arriving first builds it itself.
+        """
+        with self._build_lock:
+            if self._index is None:
+                products, categories = self._pending
+                self._index = CatalogIndex(products, categories=categories)
+                self._pending = None
+            return self._index
+
+    @property
+    def version(self) -> int:
+        return self.index.version
+
+    def get(self, product_id: str) -> Optional[dict]:
+        return self.index.get(product_id)
+
+    def get_many(self, product_ids: Iterable[str]) -> List[Optional[dict]]:
+        return self.index.get_many(product_ids)
+
+    @property
+    def categories(self) -> List[dict]:
+        return self.index.categories
+
+    def reload(self, products: List[dict], categories: Optional[List[dict]] = None) -> CatalogIndex:
+        """Build a new snapshot and swap it in; categories default to those the products use"""
+        current = self._index
+        return self.swap(CatalogIndex(products, version=(current.version if current else 1) + 1, categories=categories))
+
+    def swap(self, index: CatalogIndex) -> CatalogIndex:
+        """Make an index built elsewhere, e.g. from a shared snapshot, the current one"""
+        with self._build_lock:
+            self._index = index
+            self._pending = None
+        return index
@@ -0,0 +1,371 @@
+"""Read-only catalog snapshots in a flat file that worker processes map into memory.
+
+serve.py writes one snapshot and every worker maps the same file, so the
+catalog's pages sit once in the page cache however many workers attach.
+A snapshot holds fixed-width columns (price, category code, flags), the
+precomputed orderings and position lists a CatalogIndex needs, each
+product's strings in one UTF-8 blob addressed by an offsets array, and
+the search vocabulary with every term's postings and BM25 impacts.
+Products are decoded into dicts only when a request touches them.
+
+Layout: ``MAGIC``, a little-endian u32 header length, a JSON header, then
+8-byte aligned sections located by the header's ``sections`` table
+(name -> [offset from the data start, byte length, array typecode]).
+"""
+import asyncio
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from array import array
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from catalog import CatalogIndex, ProductRegistry
+from periodic import run_periodically
+from search import FrozenSearchIndex
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CATSNAP1"
+ALIGN = 8
+
+# Strings stored per product, in blob order; images is a JSON list
+STRING_FIELDS = ("id", "name", "description", "image", "images", "dimensions", "material")
+ID = 0
+
+# Bits of the flags column
+IN_STOCK = 1
+FEATURED = 2
+HAS_DIMENSIONS = 4
+HAS_MATERIAL = 8
+
+
+class SnapshotError(ValueError):
+    """The file is not a catalog snapshot this code can read"""
+
+
+def _positions(values) -> array:
+    return array("I", values)
+
+
+def write_snapshot(path: Path, index: CatalogIndex) -> Path:
+    """Serialize a built CatalogIndex, replacing path atomically"""
+    products = index.products
+    n = len(products)
+    category_names = list(index.by_category)
+    codes = {name: code for code, name in enumerate(category_names)}
+    if len(category_names) > 0xFFFF:
+        raise SnapshotError("Too many categories for a snapshot")
+
+    flags = array("B")
+    offsets = array("Q", [0])
+    blob = bytearray()
+    for p in products:
+        flags.append(
+            (IN_STOCK if p.get("in_stock", True) else 0)
+            | (FEATURED if p.get("featured") else 0)
+            | (HAS_DIMENSIONS if p.get("dimensions") is not None else 0)
+            | (HAS_MATERIAL if p.get("material") is not None else 0)
+        )
+        for field in STRING_FIELDS:
+            value = p.get(field)
+            if field == "images":
+                value = json.dumps(value or [], separators=(",", ":"))
+            blob += (value or "").encode()
+            offsets.append(len(blob))
+
+    category_positions = array("I")
+    category_bounds = array("I", [0])
+    for name in category_names:
+        category_positions.extend(index.by_category[name])
+        category_bounds.append(len(category_positions))
+
+    sections: Dict[str, array] = {
+        "price": array("d", (float(p["price"]) for p in products)),
+        "category": array("H", (codes[p["category"]] for p in products)),
+        "flags": flags,
+        "offsets": offsets,
+        "strings": array("B", blob),
+        "id_order": _positions(sorted(range(n), key=lambda pos: products[pos]["id"])),
+        "price_order": _positions(index.price_order),
+        "sorted_prices": array("d", index.sorted_prices),
+        "name_order": _positions(index.name_order),
+        "category_positions": category_positions,
+        "category_bounds": category_bounds,
+        "featured_bits": array("B", index.featured_bits),
+        "featured_positions": _positions(index.featured_positions),
+        "unfeatured_positions": _positions(index.unfeatured_positions),
+    }
+    search = index.search_index
+    vocab = array("B")
+    vocab_offsets = array("Q", [0])
+    term_bounds = array("I", [0])
+    posting_docs = array("I")
+    posting_impacts = array("d")
+    for term in search.vocab:
+        vocab.frombytes(term.encode())
+        vocab_offsets.append(len(vocab))
+        impacts = search.impacts(term)
+        for doc in sorted(impacts):
+            posting_docs.append(doc)
+            posting_impacts.append(impacts[doc])
+        term_bounds.append(len(posting_docs))
+    sections.update({
+        "vocab": vocab,
+        "vocab_offsets": vocab_offsets,
+        "term_bounds": term_bounds,
+        "posting_docs": posting_docs,
+        "posting_impacts": posting_impacts,
+    })
+
+    table = {}
+    offset = 0
+    for name, values in sections.items():
+        size = len(values) * values.itemsize
+        table[name] = [offset, size, values.typecode]
+        offset += -(-size // ALIGN) * ALIGN
+    header = json.dumps({
+        "version": index.version,
+        "count": n,
+        "categories": index.categories,
+        "category_names": category_names,
+        "sections": table,
+    }).encode()
+
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as out:
+        out.write(MAGIC + struct.pack("<I", len(header)) + header)
+        out.write(b"\0" * (-out.tell() % ALIGN))
+        for values in sections.values():
+            out.write(values.tobytes())
+            out.write(b"\0" * (-out.tell() % ALIGN))
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+class CatalogSnapshot:
+    """A mapped snapshot file; columns are memoryviews straight into the mapping"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        if bytes(view[:len(MAGIC)]) != MAGIC:
+            raise SnapshotError(f"{self.path} is not a catalog snapshot")
+        (header_len,) = struct.unpack_from("<I", view, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(bytes(view[start:start + header_len]))
+        data = start + header_len + (-(start + header_len) % ALIGN)
+
+        self.version: int = header["version"]
+        self.count: int = header["count"]
+        self.categories: List[dict] = header["categories"]
+        self.category_names: List[str] = header["category_names"]
+        self.columns: Dict[str, memoryview] = {
+            name: view[data + offset:data + offset + size].cast(typecode)
+            for name, (offset, size, typecode) in header["sections"].items()
+        }
+        self.products = SnapshotProducts(self)
+
+    def string(self, pos: int, field: int) -> str:
+        offsets = self.columns["offsets"]
+        i = pos * len(STRING_FIELDS) + field
+        return str(self.columns["strings"][offsets[i]:offsets[i + 1]], "utf-8")
+
+    def product(self, pos: int) -> dict:
+        columns = self.columns
+        offsets = columns["offsets"]
+        base = pos * len(STRING_FIELDS)
+        start = offsets[base]
+        raw = bytes(columns["strings"][start:offsets[base + len(STRING_FIELDS)]])
+        id_, name, description, image, images, dimensions, material = (
+            raw[offsets[base + i] - start:offsets[base + i + 1] - start].decode()
+            for i in range(len(STRING_FIELDS))
+        )
+        flags = columns["flags"][pos]
+        return {
+            "id": id_,
+            "name": name,
+            "description": description,
+            "price": columns["price"][pos],
+            "category": self.category_names[columns["category"][pos]],
+            "image": image,
+            "images": json.loads(images),
+            "dimensions": dimensions if flags & HAS_DIMENSIONS else None,
+            "material": material if flags & HAS_MATERIAL else None,
+            "in_stock": bool(flags & IN_STOCK),
+            "featured": bool(flags & FEATURED),
+        }
+
+
+class SnapshotProducts(Sequence):
+    """The snapshot's products as a sequence of dicts decoded on access"""
+
+    def __init__(self, snapshot: CatalogSnapshot):
+        self.snapshot = snapshot
+
+    def __len__(self) -> int:
+        return self.snapshot.count
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            return [self.snapshot.product(i) for i in range(*pos.indices(self.snapshot.count))]
+        if pos < 0:
+            pos += self.snapshot.count
+        if not 0 <= pos < self.snapshot.count:
+            raise IndexError(pos)
+        return self.snapshot.product(pos)
+
+
+class StringTable(Sequence):
+    """Strings stored back to back in a UTF-8 blob, located by an offsets array"""
+
+    def __init__(self, blob: memoryview, offsets: memoryview):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if not 0 <= i < len(self.offsets) - 1:
+            raise IndexError(i)
+        return str(self.blob[self.offsets[i]:self.offsets[i + 1]], "utf-8")
+
+
+class SnapshotIds:
+    """Product id lookups by binary search over the snapshot's id ordering"""
+
+    def __init__(self, snapshot: CatalogSnapshot):
+        self.snapshot = snapshot
+        self.order = snapshot.columns["id_order"]
+
+    def position(self, product_id: str) -> Optional[int]:
+        order, string = self.order, self.snapshot.string
+        lo, hi = 0, len(order)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if string(order[mid], ID) < product_id:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(order) and string(order[lo], ID) == product_id:
+            return order[lo]
+        return None
+
+    def get(self, product_id: str) -> Optional[dict]:
+        pos = self.position(product_id)
+        return None if pos is None else self.snapshot.product(pos)
+
+
+class SnapshotCatalogIndex(CatalogIndex):
+    """CatalogIndex whose indexes are views into a mapped CatalogSnapshot
+
+    Nothing is rebuilt; attaching costs the same for any catalog size.
+    """
+
+    def __init__(self, snapshot: CatalogSnapshot):
+        columns = snapshot.columns
+        self.snapshot = snapshot
+        self.products = snapshot.products
+        self.version = snapshot.version
+        self.categories = snapshot.categories
+        self.by_id = SnapshotIds(snapshot)
+
+        bounds, positions = columns["category_bounds"], columns["category_positions"]
+        self.by_category: Dict[str, memoryview] = {
+            name: positions[bounds[code]:bounds[code + 1]] for code, name in enumerate(snapshot.category_names)
+        }
+        self.price_order = columns["price_order"]
+        self.sorted_prices = columns["sorted_prices"]
+        self.name_order = columns["name_order"]
+        self.orderings = {"price": self.price_order, "name": self.name_order}
+        self.featured_bits = columns["featured_bits"]
+        self.featured_positions = columns["featured_positions"]
+        self.unfeatured_positions = columns["unfeatured_positions"]
+
+        self.search_index = FrozenSearchIndex(
+            StringTable(columns["vocab"], columns["vocab_offsets"]),
+            columns["term_bounds"],
+            columns["posting_docs"],
+            columns["posting_impacts"],
+            snapshot.count,
+        )
+
+
+class SnapshotWriter:
+    """Registry stand-in for the launcher: every reload writes a new snapshot file
+
+    Lets a CatalogReloader publish catalogs to workers instead of indexing
+    them in-process.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def reload(self, products: List[dict], categories: Optional[List[dict]] = None) -> CatalogIndex:
+        with self._lock:
+            index = CatalogIndex(products, version=self.version + 1, categories=categories)
+            write_snapshot(self.path, index)
+            self.version = index.version
+        return index
+
+
+class SnapshotFollower:
+    """Keeps a worker's registry on the latest snapshot file
+
+    Polls the file's stat and maps a new snapshot when it is replaced. Has
+    the reload/start/close interface of CatalogReloader.
+    """
+
+    def __init__(self, registry: ProductRegistry, path: Path, poll_interval: float = 1.0):
+        self.registry = registry
+        self.path = Path(path)
+        self.poll_interval = poll_interval
+        self.reloads = 0
+        self._loaded: Optional[Tuple[int, int, int]] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __str__(self) -> str:
+        return f"snapshot {self.path}"
+
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    async def reload(self) -> bool:
+        """Map the snapshot if it changed since the last load"""
+        stat = self._stat()
+        if stat is None:
+            raise FileNotFoundError(f"No catalog snapshot at {self.path}")
+        if stat == self._loaded:
+            return False
+        index = await asyncio.to_thread(lambda: SnapshotCatalogIndex(CatalogSnapshot(self.path)))
+        self.registry.swap(index)
+        self._loaded = stat
+        self.reloads += 1
+        logger.info("Catalog version %d mapped from %s: %d products", index.version, self.path, len(index))
+        return True
+
+    async def start(self):
+        self._task = asyncio.create_task(
+            run_periodically(self.poll_interval, self.reload, "Catalog snapshot reload")
+        )
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
@@ -0,0 +1,352 @@
+"""Catalog sources and hot reload: the products collection or a JSON/NDJSON feed.
+
+CatalogReloader loads a source into a ProductRegistry and keeps it current.
+Mongo sources follow a change stream, or poll where change streams are
+unavailable (a standalone server); file sources poll the file's stat. Every
+reload builds a complete CatalogIndex off the event loop and swaps it in,
+so a request keeps the snapshot it started with and the read path takes no
+lock.
+
+Files are memory-mapped and parsed one record at a time, so a large feed is
+never held both as text and as parsed products. A JSON file is either an
+array of products or ``{"products": [...], "categories": [...]}``. An NDJSON
+file has one product per line; lines with ``"type": "category"`` are
+categories. Without categories they are derived from the products.
+"""
+import asyncio
+import codecs
+import hashlib
+import json
+import logging
+import mmap
+import os
+from pathlib import Path
+from typing import AsyncIterator, Callable, Iterator, List, NamedTuple, Optional, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from catalog import ProductRegistry
+
+logger = logging.getLogger(__name__)
+
+# Server error codes meaning change streams cannot be used at all, e.g.
+# "The $changeStream stage is only supported on replica sets"
+CHANGE_STREAM_UNSUPPORTED = {40573, 40324}
+
+NDJSON_SUFFIXES = (".ndjson", ".jsonl")
+
+
+class Catalog(NamedTuple):
+    products: List[dict]
+    # None when the source does not list categories
+    categories: Optional[List[dict]]
+
+
+class CatalogFileError(ValueError):
+    """The catalog file is not valid JSON or NDJSON"""
+
+
+class JSONStream:
+    """Decodes JSON values one at a time from a sliding window over a buffer
+
+    Only the undecoded tail of the current window is held as text, so
+    memory stays proportional to ``chunk_size`` plus the largest record.
+    """
+
+    def __init__(self, data, chunk_size: int = 1 << 20):
+        self.data = data
+        self.chunk_size = chunk_size
+        self.offset = 0
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+        self._utf8 = codecs.getincrementaldecoder("utf-8")()
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.data[self.offset:self.offset + self.chunk_size]
+        self.offset += len(chunk)
+        self.eof = self.offset >= len(self.data)
+        self.text = self.text[self.pos:] + self._utf8.decode(chunk, final=self.eof)
+        self.pos = 0
+        return True
+
+    def peek(self) -> str:
+        """Next non-whitespace character without consuming it, "" at the end"""
+        while True:
+            text, pos = self.text, self.pos
+            while pos < len(text) and text[pos] in " \t\r\n":
+                pos += 1
+            self.pos = pos
+            if pos < len(text):
+                return text[pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, *chars: str) -> str:
+        char = self.peek()
+        if char not in chars:
+            found = repr(char) if char else "end of file"
+            raise CatalogFileError(f"Expected {' or '.join(map(repr, chars))} near byte {self.offset}, found {found}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError as e:
+                if self._fill():
+                    continue
+                raise CatalogFileError(f"Invalid JSON near byte {self.offset}: {e.msg}") from None
+            if end == len(self.text) and self._fill():
+                # A number may continue in the next chunk
+                continue
+            self.pos = end
+            return value
+
+    def array(self) -> Iterator:
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            if self.expect(",", "]") == "]":
+                return
+
+
+def read_json(data) -> Catalog:
+    stream = JSONStream(data)
+    if stream.peek() == "[":
+        return Catalog(list(stream.array()), None)
+    stream.expect("{")
+    products: List[dict] = []
+    categories = None
+    if stream.peek() == "}":
+        return Catalog(products, categories)
+    while True:
+        key = stream.value()
+        stream.expect(":")
+        if key == "products":
+            products = list(stream.array())
+        elif key == "categories":
+            categories = list(stream.array())
+        else:
+            stream.value()
+        if stream.expect(",", "}") == "}":
+            return Catalog(products, categories)
+
+
+def read_ndjson(data) -> Catalog:
+    products: List[dict] = []
+    categories: List[dict] = []
+    for number, line in enumerate(iter(data.readline, b""), 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise CatalogFileError(f"Line {number}: {e}") from None
+        if record.pop("type", None) == "category":
+            categories.append(record)
+        else:
+            products.append(record)
+    return Catalog(products, categories or None)
+
+
+def read_catalog_file(path: Path) -> Catalog:
+    """Parse a JSON or NDJSON catalog, chosen by suffix (.ndjson/.jsonl or anything else)"""
+    path = Path(path)
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise CatalogFileError(f"{path} is empty")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                data.madvise(mmap.MADV_SEQUENTIAL)
+            if path.suffix.lower() in NDJSON_SUFFIXES:
+                return read_ndjson(data)
+            return read_json(data)
+
+
+class FileCatalogSource:
+    """A JSON or NDJSON catalog file, reloaded when its stat changes
+
+    Replace the file atomically (write elsewhere, then rename) so a poll
+    never sees it half written; a file that fails to parse is logged and
+    the current catalog kept.
+    """
+
+    def __init__(self, path: Path, poll_interval: float = 5.0):
+        self.path = Path(path)
+        self.poll_interval = poll_interval
+        self._loaded: Optional[Tuple[int, int, int]] = None
+
+    def __str__(self) -> str:
+        return str(self.path)
+
+    def _stat(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size, st.st_ino
+
+    async def load(self) -> Catalog:
+        # Stat first, so a write landing mid-read is seen as a later change
+        self._loaded = self._stat()
+        return await asyncio.to_thread(read_catalog_file, self.path)
+
+    async def changes(self) -> AsyncIterator[None]:
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            stat = self._stat()
+            if stat is not None and stat != self._loaded:
+                self._loaded = stat
+                yield
+
+
+class MongoCatalogSource:
+    """The products and categories collections, in _id order
+
+    Follows a change stream on both collections. On a server without
+    change streams it polls every ``poll_interval`` seconds instead; the
+    reloader skips catalogs identical to the current one.
+    """
+
+    def __init__(self, db, products: str = "products", categories: str = "categories",
+                 poll_interval: float = 30.0):
+        self.db = db
+        self.products = products
+        self.categories = categories
+        self.poll_interval = poll_interval
+
+    def __str__(self) -> str:
+        return f"mongo collections {self.products}/{self.categories}"
+
+    async def load(self) -> Catalog:
+        products = await self.db[self.products].find({}, {"_id": 0}).sort("_id", 1).to_list(None)
+        categories = await self.db[self.categories].find({}, {"_id": 0}).sort("_id", 1).to_list(None)
+        return Catalog(products, categories or None)
+
+    async def changes(self) -> AsyncIterator[None]:
+        pipeline = [{"$match": {"ns.coll": {"$in": [self.products, self.categories]}}}]
+        delay = 1.0
+        while True:
+            try:
+                async with self.db.watch(pipeline) as stream:
+                    delay = 1.0
+                    async for _ in stream:
+                        yield
+            except PyMongoError as e:
+                if isinstance(e, OperationFailure) and e.code in CHANGE_STREAM_UNSUPPORTED:
+                    logger.info("Change streams unavailable (%s); polling the catalog every %.0fs",
+                                e, self.poll_interval)
+                    break
+                logger.warning("Catalog change stream interrupted (%s); reopening in %.0fs", e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+                # Changes made while the stream was down were missed
+                yield
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            yield
+
+
+def create_catalog_source(kind: str, db, path: Optional[str] = None, poll_interval: float = 30.0):
+    """Build the source named by CATALOG_SOURCE: builtin (None), mongo or file"""
+    if kind == "builtin":
+        return None
+    if kind == "mongo":
+        return MongoCatalogSource(db, poll_interval=poll_interval)
+    if kind == "file":
+        if not path:
+            raise ValueError("CATALOG_SOURCE=file needs CATALOG_FILE")
+        return FileCatalogSource(Path(path), poll_interval=poll_interval)
+    raise ValueError(f"Unknown catalog source: {kind}")
+
+
+class CatalogReloader:
+    """Keeps a ProductRegistry in step with a catalog source
+
+    Changes are coalesced: a burst of updates within ``settle`` seconds
+    causes a single reload. ``validate`` normalizes the product list and
+    raises to reject it, leaving the current snapshot in place.
+    """
+
+    def __init__(self, registry: ProductRegistry, source, validate: Callable[[List[dict]], List[dict]] = list,
+                 settle: float = 0.5):
+        self.registry = registry
+        self.source = source
+        self.validate = validate
+        self.settle = settle
+        self.fingerprint: Optional[str] = None
+        self.reloads = 0
+        self._changed = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._tasks: List[asyncio.Task] = []
+
+    def __str__(self) -> str:
+        return str(self.source)
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._watch()), asyncio.create_task(self._apply_changes())]
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    def _prepare(self, catalog: Catalog) -> Tuple[List[dict], str]:
+        seen = set()
+        for product in catalog.products:
+            product_id = product.get("id")
+            if not product_id:
+                raise ValueError(f"Product without an id: {product.get('name', product)}")
+            if product_id in seen:
+                raise ValueError(f"Duplicate product id {product_id}")
+            seen.add(product_id)
+        products = self.validate(catalog.products)
+        digest = hashlib.blake2b(digest_size=16)
+        for record in products + (catalog.categories or []):
+            digest.update(json.dumps(record, sort_keys=True, default=str).encode())
+        digest.update(b"derived" if catalog.categories is None else b"listed")
+        return products, digest.hexdigest()
+
+    async def reload(self) -> bool:
+        """Load the source and swap in a new snapshot; False if nothing changed"""
+        async with self._lock:
+            catalog = await self.source.load()
+            products, fingerprint = await asyncio.to_thread(self._prepare, catalog)
+            if fingerprint == self.fingerprint:
+                return False
+            index = await asyncio.to_thread(self.registry.reload, products, catalog.categories)
+            self.fingerprint = fingerprint
+            self.reloads += 1
+            logger.info("Catalog version %d loaded from %s: %d products, %d categories",
+                        index.version, self.source, len(index), len(index.categories))
+            return True
+
+    async def _watch(self):
+        while True:
+            try:
+                async for _ in self.source.changes():
+                    self._changed.set()
+            except Exception:
+                logger.exception("Watching %s for catalog changes failed", self.source)
+            await asyncio.sleep(self.settle or 1.0)
+
+    async def _apply_changes(self):
+        while True:
+            await self._changed.wait()
+            await asyncio.sleep(self.settle)
+            self._changed.clear()
+            try:
+                await self.reload()
+            except Exception:
+                logger.exception("Reloading the catalog from %s failed; keeping version %d",
+                                 self.source, self.registry.version)
@@ -0,0 +1,162 @@
+"""Index declarations for the app's collections and query plan checks.
+
+Usable as a CLI from backend/:
+    python -m db_indexes ensure
+    python -m db_indexes explain
+    python -m db_indexes migrate
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+
+from order_queries import ORDER_SORT
+
+logger = logging.getLogger(__name__)
+
+# Indexes each collection needs; create_indexes is a no-op for existing ones
+INDEXES: Dict[str, List[IndexModel]] = {
+    "orders": [
+        IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+        # Order listings filter on one of these, then page on (created_at, id)
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+        IndexModel(
+            [("customer.email", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+            name="customer_email_created_at_id",
+        ),
+        IndexModel(
+            [("status", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)],
+            name="status_created_at_id",
+        ),
+    ],
+    "inventory": [
+        IndexModel([("product_id", ASCENDING)], name="product_id"),
+    ],
+    "reservations": [
+        IndexModel([("expires_at", ASCENDING)], name="expires_at"),
+    ],
+    "idempotency_keys": [
+        # Keys are claimed through the unique _id index; records are dropped once expired
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0, name="expires_at_ttl"),
+    ],
+    "status_checks": [
+        # Serves timestamp ranges and the (timestamp, id) keyset order
+        IndexModel([("timestamp", ASCENDING), ("id", ASCENDING)], name="timestamp_id"),
+    ],
+}
+
+
+class AppQuery(NamedTuple):
+    """A query shape the app issues, with placeholder values"""
+    name: str
+    collection: str
+    filter: dict
+    sort: Optional[list] = None
+    limit: int = 0
+
+
+APP_QUERIES: List[AppQuery] = [
+    AppQuery("get_order", "orders", {"id": "order-id"}, limit=1),
+    AppQuery("lookup_orders", "orders", {"id": {"$in": ["order-1", "order-2"]}}),
+    AppQuery("list_orders", "orders", {}, sort=ORDER_SORT, limit=51),
+    AppQuery(
+        "list_customer_orders", "orders", {"customer.email": "customer@example.com"},
+        sort=ORDER_SORT, limit=51,
+    ),
+    AppQuery("refresh_sales_summary", "orders", {"created_at": {"$gte": "2026-01-01"}}),
+    AppQuery("list_orders_by_status", "orders", {"status": "pending"}, sort=ORDER_SORT, limit=51),
+    AppQuery(
+        "get_status_checks", "status_checks",
+        {"timestamp": {"$gt": datetime(2024, 1, 1, tzinfo=timezone.utc)}},
+        sort=[("timestamp", ASCENDING), ("id", ASCENDING)], limit=1000,
+    ),
+]
+
+
+async def ensure_indexes(db):
+    """Create every declared index; safe to run on each startup"""
+    for collection, models in INDEXES.items():
+        names = await db[collection].create_indexes(models)
+        logger.info("Indexes on %s: %s", collection, ", ".join(names))
+
+
+async def migrate_status_timestamps(db) -> int:
+    """Convert status_checks timestamps stored as ISO strings into BSON dates"""
+    result = await db.status_checks.update_many(
+        {"timestamp": {"$type": "string"}},
+        [{"$set": {"timestamp": {"$dateFromString": {"dateString": "$timestamp"}}}}],
+    )
+    if result.modified_count:
+        logger.info("Converted %d status_checks timestamps to dates", result.modified_count)
+    return result.modified_count
+
+
+def plan_stages(plan: dict) -> List[str]:
+    """Flatten a winning plan tree into its stage names, root first"""
+    stages = [plan.get("stage", "?")]
+    children = list(plan.get("inputStages", []))
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            children.insert(0, plan[key])
+    for child in children:
+        stages.extend(plan_stages(child))
+    return stages
+
+
+async def explain_query(db, query: AppQuery) -> dict:
+    command = {"find": query.collection, "filter": query.filter}
+    if query.sort:
+        command["sort"] = dict(query.sort)
+    if query.limit:
+        command["limit"] = query.limit
+    result = await db.command({"explain": command, "verbosity": "queryPlanner"})
+    stages = plan_stages(result["queryPlanner"]["winningPlan"])
+    return {
+        "query": query.name,
+        "collection": query.collection,
+        "filter": query.filter,
+        "sort": query.sort,
+        "stages": stages,
+        "collscan": "COLLSCAN" in stages,
+    }
+
+
+async def explain_app_queries(db) -> List[dict]:
+    """Explain every registered app query and flag collection scans"""
+    return [await explain_query(db, query) for query in APP_QUERIES]
+
+
+def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Manage indexes and check query plans")
+    parser.add_argument("command", choices=["ensure", "explain", "migrate"])
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    db = AsyncIOMotorClient(os.environ['MONGO_URL'])[os.environ['DB_NAME']]
+
+    async def run() -> int:
+        if args.command == "ensure":
+            await ensure_indexes(db)
+            return 0
+        if args.command == "migrate":
+            await migrate_status_timestamps(db)
+            return 0
+        report = await explain_app_queries(db)
+        print(json.dumps(report, indent=2, default=str))
+        return 1 if any(r["collscan"] for r in report) else 0
+
+    logging.basicConfig(level=logging.INFO)
+    raise SystemExit(asyncio.run(run()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,193 @@
+"""Idempotency keys: run a request once and replay its response to retries.
+
+Keys are claimed by inserting a document whose ``_id`` is the key, so the
+collection's unique ``_id`` index decides which of several workers runs
+the request. Within a process, duplicates that arrive while the first is
+still running await the same task instead of going to Mongo at all.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+class StoredResponse(NamedTuple):
+    status: int
+    body: bytes
+    media_type: str = "application/json"
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a different request"""
+
+
+class RequestInProgress(Exception):
+    """Another worker is still running the request for this key"""
+
+
+class ResponseNotStored(Exception):
+    """The request for this key ran, but its response could not be stored for replay"""
+
+
+def request_fingerprint(payload) -> str:
+    """Stable digest of a JSON-compatible request body"""
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str).encode()
+    return hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+class IdempotencyStore:
+    """Runs each (scope, key) once and stores the response bytes for replay
+
+    ``run`` returns ``(response, replayed)``. Only responses returned by the
+    handler are stored; if it raises, the claim is dropped so a retry runs
+    it again. While the handler runs its claim is renewed every third of
+    ``lock_seconds``, so only a claim left behind by a worker that died is
+    taken over. Storing the response is retried ``store_attempts`` times;
+    if that still fails the key is marked failed, and retries get
+    ResponseNotStored rather than running the handler again. Records expire
+    after ``ttl`` seconds, via the TTL index on ``expires_at`` or when a
+    later request finds them expired.
+    """
+
+    def __init__(self, keys, ttl: float = 24 * 3600, lock_seconds: float = 30,
+                 wait_seconds: float = 10, poll_interval: float = 0.1, store_attempts: int = 5):
+        self.keys = keys
+        self.ttl = ttl
+        self.lock_seconds = lock_seconds
+        self.wait_seconds = wait_seconds
+        self.poll_interval = poll_interval
+        self.store_attempts = store_attempts
+        # record id -> (fingerprint, task producing the response)
+        self._inflight: Dict[str, Tuple[str, "asyncio.Task[Tuple[StoredResponse, bool]]"]] = {}
+        self.replayed = 0
+        self.coalesced = 0
+
+    async def run(self, scope: str, key: str, fingerprint: str,
+                  handler: Callable[[], Awaitable[StoredResponse]]) -> Tuple[StoredResponse, bool]:
+        record_id = f"{scope}:{key}"
+        inflight = self._inflight.get(record_id)
+        if inflight is not None:
+            if inflight[0] != fingerprint:
+                raise IdempotencyConflict(f"Idempotency key {key} was used for a different request")
+            self.coalesced += 1
+            response, _ = await asyncio.shield(inflight[1])
+            return response, True
+
+        # A task of its own, so a client disconnecting mid-request neither
+        # aborts the work nor leaves the duplicates waiting on it stranded
+        task = asyncio.ensure_future(self._execute(record_id, key, fingerprint, handler))
+        self._inflight[record_id] = (fingerprint, task)
+        task.add_done_callback(lambda _: self._inflight.pop(record_id, None))
+        return await asyncio.shield(task)
+
+    async def _execute(self, record_id: str, key: str, fingerprint: str,
+                       handler: Callable[[], Awaitable[StoredResponse]]) -> Tuple[StoredResponse, bool]:
+        token = uuid.uuid4().hex
+        stored = await self._claim(record_id, key, fingerprint, token)
+        if stored is not None:
+            self.replayed += 1
+            return StoredResponse(stored["status"], stored["body"], stored["media_type"]), True
+
+        heartbeat = asyncio.create_task(self._renew_claim(record_id, key, token))
+        try:
+            try:
+                response = await handler()
+            except BaseException:
+                await self.keys.delete_one({"_id": record_id, "token": token})
+                raise
+            # The claim stays renewed until the outcome is recorded
+            await self._store(record_id, key, token, response)
+        finally:
+            heartbeat.cancel()
+        return response, False
+
+    async def _renew_claim(self, record_id: str, key: str, token: str):
+        """Push the claim's lock forward until cancelled"""
+        while True:
+            await asyncio.sleep(self.lock_seconds / 3)
+            now = datetime.now(timezone.utc)
+            try:
+                result = await self.keys.update_one(
+                    {"_id": record_id, "token": token, "state": "pending"},
+                    {"$set": {"locked_until": now + timedelta(seconds=self.lock_seconds)}},
+                )
+            except Exception as e:
+                logger.warning("Could not renew the claim on idempotency key %s (%s)", key, e)
+                continue
+            if not result.matched_count:
+                logger.error("Lost the claim on idempotency key %s while running it", key)
+                return
+
+    async def _store(self, record_id: str, key: str, token: str, response: StoredResponse):
+        """Record the response for replay, or failing that mark the key as not replayable"""
+        delay = self.poll_interval
+        for attempt in range(1, self.store_attempts + 1):
+            try:
+                await self.keys.update_one(
+                    {"_id": record_id, "token": token},
+                    {"$set": {"state": "completed", "status": response.status, "body": response.body,
+                              "media_type": response.media_type, "completed_at": datetime.now(timezone.utc)}},
+                )
+                return
+            except Exception as e:
+                logger.warning("Could not store the response for idempotency key %s (attempt %d: %s)",
+                               key, attempt, e)
+                if attempt < self.store_attempts:
+                    await asyncio.sleep(delay)
+                    delay *= 2
+        # Far smaller than the response, e.g. when the body is over the document size limit
+        try:
+            await self.keys.update_one(
+                {"_id": record_id, "token": token},
+                {"$set": {"state": "failed", "completed_at": datetime.now(timezone.utc)}},
+            )
+        except Exception:
+            logger.exception("Could not mark idempotency key %s as failed; it may run again "
+                             "once its claim expires", key)
+
+    async def _claim(self, record_id: str, key: str, fingerprint: str, token: str) -> Optional[dict]:
+        """Claim the key for this request; returns the stored record instead if it already ran"""
+        deadline = asyncio.get_running_loop().time() + self.wait_seconds
+        while True:
+            now = datetime.now(timezone.utc)
+            try:
+                await self.keys.insert_one({
+                    "_id": record_id, "fingerprint": fingerprint, "state": "pending", "token": token,
+                    "locked_until": now + timedelta(seconds=self.lock_seconds),
+                    "expires_at": now + timedelta(seconds=self.ttl),
+                })
+                return None
+            except DuplicateKeyError:
+                pass
+
+            existing = await self.keys.find_one({"_id": record_id, "expires_at": {"$gt": now}})
+            if existing is None:
+                # Expired but not yet removed by the TTL monitor, or just deleted
+                await self.keys.delete_one({"_id": record_id, "expires_at": {"$lte": now}})
+                continue
+            if existing["fingerprint"] != fingerprint:
+                raise IdempotencyConflict(f"Idempotency key {key} was used for a different request")
+            if existing["state"] == "completed":
+                return existing
+            if existing["state"] == "failed":
+                raise ResponseNotStored(f"The request with idempotency key {key} already ran, "
+                                        f"but its response is not available")
+
+            # Pending: another worker is running it, or died holding the claim
+            result = await self.keys.update_one(
+                {"_id": record_id, "state": "pending", "locked_until": {"$lt": now}},
+                {"$set": {"token": token, "locked_until": now + timedelta(seconds=self.lock_seconds)}},
+            )
+            if result.modified_count:
+                logger.warning("Took over the stale claim on idempotency key %s", key)
+                return None
+            if asyncio.get_running_loop().time() >= deadline:
+                raise RequestInProgress(f"A request with idempotency key {key} is still in progress")
+            await asyncio.sleep(self.poll_interval)
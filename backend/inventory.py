@@ -0,0 +1,234 @@
+"""Stock counters and cart reservations built on conditional $inc updates.
+
+Each tracked product's stock is split over a few counter documents
+("shards") so concurrent checkouts of a hot product update different
+documents. A counter is only ever decremented by an update whose filter
+requires enough stock, so no interleaving of requests can take it below
+zero. Products without counters are untracked and never run out.
+
+Adding to a cart holds stock in a reservation that expires after a TTL;
+expired reservations are swept and their stock returned. Checkout claims
+the cart's reservations for the order, which makes the hold permanent.
+"""
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+from periodic import run_periodically
+
+logger = logging.getLogger(__name__)
+
+# Attempts before a reservation that keeps losing races gives up
+RESERVE_RETRIES = 5
+
+
+class InsufficientStock(Exception):
+    def __init__(self, product_id: str, requested: int, available: int):
+        super().__init__(f"Only {available} of {product_id} left in stock")
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+
+
+class ReservationConflict(Exception):
+    """The reservation changed underneath us, e.g. the cart is already being checked out"""
+
+
+class Inventory:
+    """Sharded stock counters plus per-cart-line reservations
+
+    ``stock`` holds one document per (product, shard) with an ``available``
+    count. ``reservations`` holds one document per cart line with the
+    quantity held and when the hold expires.
+    """
+
+    def __init__(self, stock, reservations, shards: int = 4, hold_seconds: float = 900,
+                 sweep_interval: float = 30):
+        self.stock = stock
+        self.reservations = reservations
+        self.shards = shards
+        self.hold_seconds = hold_seconds
+        self.sweep_interval = sweep_interval
+        self._sweeper: Optional[asyncio.Task] = None
+        self.expired_total = 0
+
+    async def start(self):
+        if self.sweep_interval > 0:
+            self._sweeper = asyncio.create_task(
+                run_periodically(self.sweep_interval, self.sweep, "Reservation expiry sweep")
+            )
+
+    async def close(self):
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
+
+    def _shard_id(self, product_id: str, shard: int) -> str:
+        return f"{product_id}:{shard}"
+
+    async def restock(self, product_id: str, quantity: int):
+        """Add units, spread evenly over the shards; starts tracking an untracked product"""
+        share, extra = divmod(quantity, self.shards)
+        for shard in range(self.shards):
+            await self.stock.update_one(
+                {"_id": self._shard_id(product_id, shard)},
+                {"$inc": {"available": share + (shard < extra)},
+                 "$setOnInsert": {"product_id": product_id, "shard": shard}},
+                upsert=True,
+            )
+
+    async def available(self, product_id: str) -> Optional[int]:
+        """Units not held by any cart, or None if the product is untracked"""
+        docs = await self.stock.find({"product_id": product_id}, {"available": 1}).to_list(None)
+        if not docs:
+            return None
+        return sum(doc["available"] for doc in docs)
+
+    async def _take(self, product_id: str, quantity: int) -> bool:
+        """Remove units from the counters; False means the product is untracked"""
+        result = await self.stock.update_one(
+            {"_id": self._shard_id(product_id, random.randrange(self.shards)), "available": {"$gte": quantity}},
+            {"$inc": {"available": -quantity}},
+        )
+        if result.modified_count:
+            return True
+
+        # That shard was short; read them all and gather from the fullest first
+        docs = await self.stock.find({"product_id": product_id}, {"available": 1}).to_list(None)
+        if not docs:
+            return False
+        total = sum(doc["available"] for doc in docs)
+        if total < quantity:
+            raise InsufficientStock(product_id, quantity, total)
+        taken: List[Tuple[str, int]] = []
+        remaining = quantity
+        for doc in sorted(docs, key=lambda d: -d["available"]):
+            amount = min(remaining, doc["available"])
+            if amount <= 0:
+                break
+            result = await self.stock.update_one(
+                {"_id": doc["_id"], "available": {"$gte": amount}},
+                {"$inc": {"available": -amount}},
+            )
+            if result.modified_count:
+                taken.append((doc["_id"], amount))
+                remaining -= amount
+                if not remaining:
+                    return True
+        for shard_id, amount in taken:
+            await self.stock.update_one({"_id": shard_id}, {"$inc": {"available": amount}})
+        raise InsufficientStock(product_id, quantity, total - quantity + remaining)
+
+    async def _give_back(self, product_id: str, quantity: int):
+        result = await self.stock.update_one(
+            {"_id": self._shard_id(product_id, random.randrange(self.shards))},
+            {"$inc": {"available": quantity}},
+        )
+        if not result.modified_count:
+            # Shard count changed since the product was stocked
+            await self.stock.update_one({"product_id": product_id}, {"$inc": {"available": quantity}})
+
+    async def reserve(self, cart_id: str, product_id: str, quantity: int) -> bool:
+        """Make the cart line hold exactly quantity units and restart its expiry
+
+        Returns False for untracked products. Raises InsufficientStock when
+        the extra units are not available, leaving the existing hold as is.
+        """
+        reservation_id = f"{cart_id}:{product_id}"
+        for _ in range(RESERVE_RETRIES):
+            doc = await self.reservations.find_one({"_id": reservation_id})
+            if doc and doc.get("order_id"):
+                raise ReservationConflict(f"Cart {cart_id} is being checked out")
+            held = doc["quantity"] if doc else 0
+            delta = quantity - held
+
+            if quantity <= 0:
+                if doc is None:
+                    return False
+                result = await self.reservations.delete_one(
+                    {"_id": reservation_id, "quantity": held, "order_id": None}
+                )
+                if result.deleted_count:
+                    await self._give_back(product_id, held)
+                    return True
+                continue
+
+            if delta > 0 and not await self._take(product_id, delta):
+                return False
+
+            expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.hold_seconds)
+            if doc is None:
+                try:
+                    await self.reservations.insert_one({
+                        "_id": reservation_id, "cart_id": cart_id, "product_id": product_id,
+                        "quantity": quantity, "expires_at": expires_at, "order_id": None,
+                    })
+                    ok = True
+                except DuplicateKeyError:
+                    ok = False
+            else:
+                result = await self.reservations.update_one(
+                    {"_id": reservation_id, "quantity": held, "order_id": None},
+                    {"$set": {"quantity": quantity, "expires_at": expires_at}},
+                )
+                ok = result.matched_count == 1
+
+            if ok:
+                if delta < 0:
+                    await self._give_back(product_id, -delta)
+                return True
+            # Another request changed the line first; undo and retry
+            if delta > 0:
+                await self._give_back(product_id, delta)
+        raise ReservationConflict(f"Reservation for {product_id} in cart {cart_id} kept changing")
+
+    async def held(self, cart_id: str, product_id: str) -> int:
+        doc = await self.reservations.find_one({"_id": f"{cart_id}:{product_id}"}, {"quantity": 1})
+        return doc["quantity"] if doc else 0
+
+    async def commit(self, cart_id: str, lines: Iterable[Tuple[str, int]], order_id: str) -> List[Tuple[str, int]]:
+        """Turn the cart's holds for these lines into sold stock
+
+        Tops up or re-creates holds that expired, then claims them for the
+        order in one update so a concurrent checkout of the same cart cannot
+        claim them too. Returns the tracked lines, for ``restore`` if the
+        order cannot be saved.
+        """
+        lines = list(lines)
+        tracked = [(product_id, quantity) for product_id, quantity in lines
+                   if await self.reserve(cart_id, product_id, quantity)]
+        if not tracked:
+            return []
+        ids = [f"{cart_id}:{product_id}" for product_id, _ in tracked]
+        result = await self.reservations.update_many(
+            {"_id": {"$in": ids}, "order_id": None}, {"$set": {"order_id": order_id}}
+        )
+        claimed = {"_id": {"$in": ids}, "order_id": order_id}
+        if result.modified_count != len(ids):
+            await self.reservations.update_many(claimed, {"$set": {"order_id": None}})
+            raise ReservationConflict(f"Cart {cart_id} is being checked out")
+        await self.reservations.delete_many(claimed)
+        return tracked
+
+    async def restore(self, lines: Iterable[Tuple[str, int]]):
+        """Put back stock committed for an order that was not placed"""
+        for product_id, quantity in lines:
+            await self._give_back(product_id, quantity)
+
+    async def sweep(self, limit: int = 1000) -> int:
+        """Return the stock of expired holds; each hold is claimed by deleting it first"""
+        now = datetime.now(timezone.utc)
+        expired = {"expires_at": {"$lt": now}, "order_id": None}
+        docs = await self.reservations.find(expired, {"_id": 1}).to_list(limit)
+        released = 0
+        for doc in docs:
+            claimed = await self.reservations.find_one_and_delete({"_id": doc["_id"], **expired})
+            if claimed:
+                await self._give_back(claimed["product_id"], claimed["quantity"])
+                released += 1
+        self.expired_total += released
+        return released
@@ -0,0 +1,226 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Request metrics come from MetricsMiddleware, Mongo command timings from
+MongoCommandTimer (a pymongo command listener), and in-process work from
+``work_seconds.time(...)`` blocks.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from pymongo import monitoring
+
+if TYPE_CHECKING:
+    from profiler import SlowRequestProfiler
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+Labels = Tuple[str, ...]
+
+
+def format_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # Observations can come from Motor's worker threads
+        self._lock = threading.Lock()
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            snapshot = list(self.values.items())
+        for labels, value in sorted(snapshot):
+            yield f"{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (last is +Inf), sum]
+        self.series: Dict[Labels, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            snapshot = [(labels, list(counts), total[0]) for labels, (counts, total) in self.series.items()]
+        for labels, counts, total in sorted(snapshot):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="' + format_value(float(bound)) + '"'
+                yield f"{self.name}_bucket{format_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(total)}"
+            yield f"{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> bytes:
+        return ("\n".join(metric.render() for metric in self.metrics) + "\n").encode()
+
+
+REGISTRY = MetricsRegistry()
+
+request_seconds = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Time to produce a response", ("method", "route", "status"),
+))
+response_bytes = REGISTRY.register(Histogram(
+    "http_response_size_bytes", "Response body size", ("method", "route"), buckets=SIZE_BUCKETS,
+))
+requests_in_flight = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "Requests currently being handled",
+))
+mongo_seconds = REGISTRY.register(Histogram(
+    "mongo_command_duration_seconds", "Round trip of Mongo commands as seen by the driver",
+    ("command", "collection", "outcome"),
+))
+work_seconds = REGISTRY.register(Histogram(
+    "app_work_duration_seconds", "Time spent in in-process work", ("operation",),
+))
+
+
+class MongoCommandTimer(monitoring.CommandListener):
+    """Feeds every driver command into mongo_command_duration_seconds
+
+    Pass an instance to the client as ``event_listeners=[...]``. Cursor
+    continuations (getMore) are recorded under their own command name.
+    """
+
+    def __init__(self, histogram: Histogram = mongo_seconds):
+        self.histogram = histogram
+        self._collections: Dict[Tuple[object, int], str] = {}
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        self._collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ""
+
+    def _finish(self, event, outcome: str):
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        self.histogram.observe(event.duration_micros / 1e6, event.command_name, collection, outcome)
+
+    def succeeded(self, event):
+        self._finish(event, "ok")
+
+    def failed(self, event):
+        self._finish(event, "error")
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, size and concurrency per route template
+
+    Routes are labelled by their path template (``/api/products/{product_id}``)
+    so label cardinality stays bounded; unmatched paths share one label.
+    With a ``profiler``, requests slower than its threshold get their
+    stack samples dumped.
+    """
+
+    def __init__(self, app, profiler: Optional["SlowRequestProfiler"] = None):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            end = time.perf_counter()
+            requests_in_flight.dec()
+            route = scope.get("route")
+            template = getattr(route, "path", None) or "unmatched"
+            method = scope["method"]
+            request_seconds.observe(end - start, method, template, str(status))
+            response_bytes.observe(size, method, template)
+            if self.profiler is not None:
+                await self.profiler.finished(f"{method} {template}", start, end)
@@ -0,0 +1,117 @@
+"""Lazily created Motor client configured from the environment."""
+import os
+from typing import Callable, Dict, NamedTuple, Optional, Sequence
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+# Client options read from the environment when the client is created
+POOL_OPTIONS: Dict[str, str] = {
+    "maxPoolSize": "MONGO_MAX_POOL_SIZE",
+    "minPoolSize": "MONGO_MIN_POOL_SIZE",
+    "maxIdleTimeMS": "MONGO_MAX_IDLE_TIME_MS",
+    "connectTimeoutMS": "MONGO_CONNECT_TIMEOUT_MS",
+    "serverSelectionTimeoutMS": "MONGO_SERVER_SELECTION_TIMEOUT_MS",
+    "socketTimeoutMS": "MONGO_SOCKET_TIMEOUT_MS",
+    "waitQueueTimeoutMS": "MONGO_WAIT_QUEUE_TIMEOUT_MS",
+}
+
+
+class MongoSettings(NamedTuple):
+    url: str
+    db_name: str
+    options: dict
+
+    @classmethod
+    def from_env(cls) -> "MongoSettings":
+        options = {
+            option: int(os.environ[name])
+            for option, name in POOL_OPTIONS.items()
+            if os.environ.get(name)
+        }
+        return cls(os.environ['MONGO_URL'], os.environ['DB_NAME'], options)
+
+
+class LazyDatabase:
+    """Stands in for a Motor database until it is first used
+
+    Nothing is read from the environment and no client exists until the
+    first collection operation (or an explicit ``connect``), so importing
+    the app is cheap. ``db.orders`` and ``db["orders"]`` return collection
+    proxies that can be handed out at import time. ``bind`` points every
+    proxy at another database, e.g. a mongomock one in benchmarks.
+    """
+
+    def __init__(self, settings: Callable[[], MongoSettings] = MongoSettings.from_env,
+                 event_listeners: Sequence = ()):
+        self._settings = settings
+        self._event_listeners = list(event_listeners)
+        self._client: Optional[AsyncIOMotorClient] = None
+        self._database = None
+        self._collections: Dict[str, object] = {}
+
+    @property
+    def connected(self) -> bool:
+        return self._database is not None
+
+    @property
+    def client(self) -> AsyncIOMotorClient:
+        return self.database.client
+
+    @property
+    def database(self):
+        if self._database is None:
+            settings = self._settings()
+            self._client = AsyncIOMotorClient(
+                settings.url, event_listeners=self._event_listeners, **settings.options
+            )
+            self._database = self._client[settings.db_name]
+        return self._database
+
+    def bind(self, database):
+        """Use an existing database object instead of creating a client"""
+        self.close()
+        self._database = database
+
+    def collection(self, name: str):
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._collections[name] = self.database[name]
+        return collection
+
+    async def connect(self):
+        """Create the client if needed and wait for a server to answer"""
+        await self.database.command("ping")
+
+    def command(self, *args, **kwargs):
+        return self.database.command(*args, **kwargs)
+
+    def watch(self, *args, **kwargs):
+        return self.database.watch(*args, **kwargs)
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+        self._client = None
+        self._database = None
+        self._collections = {}
+
+    def __getitem__(self, name: str) -> "LazyCollection":
+        return LazyCollection(self, name)
+
+    def __getattr__(self, name: str) -> "LazyCollection":
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return LazyCollection(self, name)
+
+
+class LazyCollection:
+    """Collection proxy that resolves against its LazyDatabase on each use"""
+
+    __slots__ = ("_lazy", "name")
+
+    def __init__(self, lazy: LazyDatabase, name: str):
+        self._lazy = lazy
+        self.name = name
+
+    def __getattr__(self, attr: str):
+        return getattr(self._lazy.collection(self.name), attr)
@@ -0,0 +1,310 @@
+"""Streams orders out of Mongo as CSV, XLSX or Parquet, one row per order line.
+
+Usable as a CLI from backend/:
+    python -m order_export --format parquet --output orders.parquet
+    python -m order_export --format csv --created-from 2026-01-01 > orders.csv
+"""
+import argparse
+import asyncio
+import csv
+import importlib.util
+import io
+import logging
+import os
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+from typing import IO, AsyncIterator, Dict, List, Optional
+
+from pymongo import ASCENDING
+
+from order_queries import order_filter
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "xlsx": ("application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsx"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# Optional packages the binary formats need
+EXPORT_DEPENDENCIES = {"xlsx": "openpyxl", "parquet": "pyarrow"}
+
+# Column name -> Parquet type name
+EXPORT_COLUMNS: Dict[str, str] = {
+    "order_id": "string",
+    "created_at": "string",
+    "status": "string",
+    "payment_status": "string",
+    "order_total": "float64",
+    "customer_name": "string",
+    "customer_email": "string",
+    "customer_phone": "string",
+    "address": "string",
+    "city": "string",
+    "state": "string",
+    "pincode": "string",
+    "product_id": "string",
+    "product_name": "string",
+    "price": "float64",
+    "quantity": "int64",
+    "line_total": "float64",
+}
+
+# Only the fields the rows are built from
+EXPORT_PROJECTION = {
+    "_id": 0, "id": 1, "created_at": 1, "status": 1, "payment_status": 1,
+    "total": 1, "customer": 1, "items.product_id": 1, "items.name": 1,
+    "items.price": 1, "items.quantity": 1,
+}
+
+DEFAULT_CHUNK_SIZE = 1000
+
+# XLSX bodies spill from memory to disk beyond this size
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+STREAM_BLOCK_BYTES = 64 * 1024
+
+
+def missing_dependency(fmt: str) -> Optional[str]:
+    """Name of the package the format needs but that is not installed, if any"""
+    module = EXPORT_DEPENDENCIES.get(fmt)
+    if module and importlib.util.find_spec(module) is None:
+        return module
+    return None
+
+
+def order_rows(order: dict) -> List[dict]:
+    """Flatten an order into one row per item; an order with no items still gets a row"""
+    customer = order.get("customer") or {}
+    base = {
+        "order_id": order.get("id"),
+        "created_at": order.get("created_at"),
+        "status": order.get("status"),
+        "payment_status": order.get("payment_status"),
+        "order_total": order.get("total"),
+        "customer_name": customer.get("full_name"),
+        "customer_email": customer.get("email"),
+        "customer_phone": customer.get("phone"),
+        "address": customer.get("address"),
+        "city": customer.get("city"),
+        "state": customer.get("state"),
+        "pincode": customer.get("pincode"),
+    }
+    items = order.get("items") or [{}]
+    rows = []
+    for item in items:
+        price = item.get("price")
+        quantity = item.get("quantity")
+        row = dict(base)
+        row["product_id"] = item.get("product_id")
+        row["product_name"] = item.get("name")
+        row["price"] = price
+        row["quantity"] = quantity
+        row["line_total"] = price * quantity if price is not None and quantity is not None else None
+        rows.append(row)
+    return rows
+
+
+async def iter_row_chunks(collection, query: dict, chunk_size: int = DEFAULT_CHUNK_SIZE) -> AsyncIterator[List[dict]]:
+    """Yield flattened rows in chunks of about chunk_size orders, oldest order first"""
+    cursor = (
+        collection.find(query, EXPORT_PROJECTION)
+        .sort([("created_at", ASCENDING), ("id", ASCENDING)])
+        .batch_size(chunk_size)
+    )
+    rows: List[dict] = []
+    orders = 0
+    async for order in cursor:
+        rows.extend(order_rows(order))
+        orders += 1
+        if orders >= chunk_size:
+            yield rows
+            rows, orders = [], 0
+    if rows:
+        yield rows
+
+
+def csv_chunk(rows: List[dict], header: bool = False) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(EXPORT_COLUMNS), lineterminator="\n")
+    if header:
+        writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().encode()
+
+
+async def stream_csv(chunks: AsyncIterator[List[dict]]) -> AsyncIterator[bytes]:
+    """Encode row chunks as CSV as they arrive"""
+    yield csv_chunk([], header=True)
+    async for rows in chunks:
+        yield csv_chunk(rows)
+
+
+class XlsxWriter:
+    """Appends rows to a write-only workbook, which keeps only the current row in memory"""
+
+    def __init__(self, out: IO[bytes]):
+        try:
+            from openpyxl import Workbook
+        except ImportError:
+            raise RuntimeError("XLSX export requires openpyxl")
+        self.out = out
+        self.workbook = Workbook(write_only=True)
+        self.sheet = self.workbook.create_sheet("orders")
+        self.sheet.append(list(EXPORT_COLUMNS))
+
+    def write(self, rows: List[dict]):
+        for row in rows:
+            self.sheet.append([row[column] for column in EXPORT_COLUMNS])
+
+    def close(self):
+        self.workbook.save(self.out)
+
+
+class ParquetWriter:
+    """Writes each chunk of rows as its own Parquet row group"""
+
+    def __init__(self, out: IO[bytes]):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet export requires pyarrow")
+        self.pa = pa
+        self.schema = pa.schema([(name, pa.type_for_alias(kind)) for name, kind in EXPORT_COLUMNS.items()])
+        self.writer = pq.ParquetWriter(out, self.schema, compression="zstd")
+
+    def write(self, rows: List[dict]):
+        self.writer.write_table(self.pa.Table.from_pylist(rows, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+FILE_WRITERS = {"xlsx": XlsxWriter, "parquet": ParquetWriter}
+
+
+class ByteSink(io.RawIOBase):
+    """Write-only file that hands back what was written since the last drain"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        before = len(self.buffer)
+        self.buffer += data
+        written = len(self.buffer) - before
+        self.position += written
+        return written
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+async def write_export(chunks: AsyncIterator[List[dict]], fmt: str, out: IO[bytes]) -> int:
+    """Write every chunk to out in the given format, returning the row count"""
+    count = 0
+    if fmt == "csv":
+        out.write(csv_chunk([], header=True))
+        async for rows in chunks:
+            out.write(csv_chunk(rows))
+            count += len(rows)
+        return count
+    writer = FILE_WRITERS[fmt](out)
+    async for rows in chunks:
+        # Encoding a chunk is CPU work; keep it off the event loop
+        await asyncio.to_thread(writer.write, rows)
+        count += len(rows)
+    await asyncio.to_thread(writer.close)
+    return count
+
+
+async def stream_export(chunks: AsyncIterator[List[dict]], fmt: str) -> AsyncIterator[bytes]:
+    """Response body for an export
+
+    CSV goes out chunk by chunk, and Parquet one row group per chunk as
+    each is written, with the footer last. An XLSX file is a zip whose
+    directory is only known at the end, so it is built in a spooled
+    temporary file (kept in memory up to SPOOL_MAX_MEMORY, on disk beyond)
+    and then sent in blocks.
+    """
+    if fmt == "csv":
+        async for data in stream_csv(chunks):
+            yield data
+        return
+    if fmt == "parquet":
+        sink = ByteSink()
+        writer = ParquetWriter(sink)
+        async for rows in chunks:
+            await asyncio.to_thread(writer.write, rows)
+            data = sink.drain()
+            if data:
+                yield data
+        await asyncio.to_thread(writer.close)
+        yield sink.drain()
+        return
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+    try:
+        await write_export(chunks, fmt, spool)
+        spool.seek(0)
+        while True:
+            block = spool.read(STREAM_BLOCK_BYTES)
+            if not block:
+                break
+            yield block
+    finally:
+        spool.close()
+
+
+def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Export orders, one row per order line")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="csv")
+    parser.add_argument("--output", help="File to write; CSV goes to stdout when omitted")
+    parser.add_argument("--status")
+    parser.add_argument("--payment-status")
+    parser.add_argument("--customer-email")
+    parser.add_argument("--created-from", type=datetime.fromisoformat, help="Inclusive ISO date/time")
+    parser.add_argument("--created-to", type=datetime.fromisoformat, help="Exclusive ISO date/time")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args()
+    if args.output is None and args.format != "csv":
+        parser.error(f"--output is required for {args.format}")
+
+    load_dotenv(Path(__file__).parent / '.env')
+    db = AsyncIOMotorClient(os.environ['MONGO_URL'])[os.environ['DB_NAME']]
+    query = order_filter(
+        customer_email=args.customer_email,
+        status=args.status,
+        payment_status=args.payment_status,
+        created_from=args.created_from,
+        created_to=args.created_to,
+    )
+
+    async def run() -> int:
+        chunks = iter_row_chunks(db.orders, query, args.chunk_size)
+        if args.output is None:
+            return await write_export(chunks, args.format, sys.stdout.buffer)
+        with open(args.output, "wb") as out:
+            return await write_export(chunks, args.format, out)
+
+    logging.basicConfig(level=logging.INFO)
+    rows = asyncio.run(run())
+    logger.info("Exported %d rows", rows)
+
+
+if __name__ == "__main__":
+    main()
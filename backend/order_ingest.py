@@ -0,0 +1,101 @@
+"""Coalesces order inserts into insert_many batches."""
+import asyncio
+import logging
+from typing import List, Tuple
+
+from pymongo.errors import BulkWriteError
+
+logger = logging.getLogger(__name__)
+
+
+class OrderIngestQueue:
+    """Batches concurrent order inserts into single insert_many calls
+
+    ``submit`` resolves only after the batch holding the order has been
+    acknowledged by Mongo, so callers keep write-before-response semantics.
+
+    Each of ``workers`` writers takes whatever is queued, up to
+    ``max_batch`` orders, so an idle queue writes immediately and batches
+    grow while earlier writes are in flight. A positive ``max_delay`` makes
+    a writer wait up to that many seconds to fill a batch instead. At most
+    ``max_pending`` orders wait at once; further submitters block until
+    there is room.
+    """
+
+    def __init__(self, collection, max_batch: int = 100, max_delay: float = 0.0,
+                 max_pending: int = 10_000, workers: int = 2):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.workers = workers
+        self.queue: "asyncio.Queue[Tuple[dict, asyncio.Future]]" = asyncio.Queue(maxsize=max_pending)
+        self._tasks: List[asyncio.Task] = []
+        self.batches = 0
+        self.inserted = 0
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def close(self):
+        """Write out everything already submitted, then stop"""
+        if not self._tasks:
+            return
+        await self.queue.join()
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    async def submit(self, doc: dict):
+        """Queue an order and wait until it is written"""
+        if not self._tasks:
+            raise RuntimeError("Order ingest queue is not running")
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((doc, future))
+        await future
+
+    async def _collect(self) -> List[Tuple[dict, asyncio.Future]]:
+        batch = [await self.queue.get()]
+        deadline = asyncio.get_running_loop().time() + self.max_delay
+        while len(batch) < self.max_batch:
+            if self.queue.empty():
+                if self.max_delay <= 0:
+                    break
+                remaining = deadline - asyncio.get_running_loop().time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            else:
+                batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _write(self, batch: List[Tuple[dict, asyncio.Future]]):
+        failed = {}
+        try:
+            await self.collection.insert_many([doc for doc, _ in batch], ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                failed[error["index"]] = BulkWriteError({"writeErrors": [error]})
+        except Exception as e:
+            logger.exception("Order batch insert failed")
+            failed = dict.fromkeys(range(len(batch)), e)
+        self.batches += 1
+        self.inserted += len(batch) - len(failed)
+        for i, (_, future) in enumerate(batch):
+            if future.cancelled():
+                continue
+            if i in failed:
+                future.set_exception(failed[i])
+            else:
+                future.set_result(None)
@@ -0,0 +1,100 @@
+"""Filters, projections and keyset cursors for order listing."""
+import base64
+import binascii
+import json
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pymongo import DESCENDING
+
+# Newest first; id breaks ties between orders created in the same instant
+ORDER_SORT = [("created_at", DESCENDING), ("id", DESCENDING)]
+
+# Always projected so every page can produce the next cursor
+CURSOR_FIELDS = ("id", "created_at")
+
+
+def encode_order_cursor(created_at: str, order_id: str) -> str:
+    raw = json.dumps([created_at, order_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_order_cursor(cursor: str) -> Tuple[str, str]:
+    """Return (created_at, id), raising ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, order_id = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(created_at, str) or not isinstance(order_id, str):
+        raise ValueError("Invalid cursor")
+    return created_at, order_id
+
+
+def created_at_key(value: datetime) -> str:
+    """Render a bound the way created_at is stored, as a UTC ISO string
+
+    Stored timestamps share one format, so string order is time order.
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat()
+
+
+def order_filter(
+    customer_email: Optional[str] = None,
+    status: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    after: Optional[Tuple[str, str]] = None,
+) -> dict:
+    """Build the find filter for a page of orders
+
+    ``created_from`` is inclusive and ``created_to`` exclusive. ``after`` is
+    the (created_at, id) of the last order on the previous page.
+    """
+    query: dict = {}
+    if customer_email:
+        query["customer.email"] = customer_email
+    if status:
+        query["status"] = status
+    if payment_status:
+        query["payment_status"] = payment_status
+    created: Dict[str, str] = {}
+    if created_from is not None:
+        created["$gte"] = created_at_key(created_from)
+    if created_to is not None:
+        created["$lt"] = created_at_key(created_to)
+    if created:
+        query["created_at"] = created
+    if after is not None:
+        created_at, order_id = after
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": order_id}},
+        ]
+    return query
+
+
+def order_projection(fields: Optional[Iterable[str]] = None) -> dict:
+    """Mongo projection for the requested top-level order fields"""
+    if not fields:
+        return {"_id": 0}
+    projection = {field: 1 for field in fields}
+    projection.update({field: 1 for field in CURSOR_FIELDS})
+    projection["_id"] = 0
+    return projection
+
+
+def order_by_ids(ids: List[str], docs: Iterable[dict]) -> Tuple[List[dict], List[str]]:
+    """Arrange looked-up orders in request order, returning (found, missing ids)"""
+    by_id = {doc["id"]: doc for doc in docs}
+    found, missing = [], []
+    for order_id in dict.fromkeys(ids):
+        doc = by_id.get(order_id)
+        if doc is None:
+            missing.append(order_id)
+        else:
+            found.append(doc)
+    return found, missing
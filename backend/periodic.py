@@ -0,0 +1,17 @@
+"""Background jobs repeated on a fixed interval."""
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+async def run_periodically(interval: float, job, description: str):
+    """Await job() every interval seconds until cancelled, logging failures"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            result = job()
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception:
+            logger.exception("%s failed", description)
@@ -0,0 +1,88 @@
+"""Sampling profiler that dumps stacks for slow requests as folded text.
+
+The output is the "folded stacks" format (``frame;frame;frame count`` per
+line) read by flamegraph.pl, speedscope and inferno.
+"""
+import asyncio
+import logging
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+from typing import Deque, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def write_folded(path: Path, stacks: Counter):
+    with open(path, "w") as out:
+        for stack, count in stacks.most_common():
+            out.write(";".join(stack) + f" {count}\n")
+
+
+class SlowRequestProfiler:
+    """Samples the event loop thread's stack and keeps recent samples
+
+    A request that took longer than ``threshold`` seconds gets the samples
+    taken while it ran written to ``out_dir``. All requests share the loop
+    thread, so a dump also contains whatever ran concurrently with the
+    slow request.
+    """
+
+    def __init__(self, threshold: float, out_dir: Path, interval: float = 0.005,
+                 history: float = 30.0, max_depth: int = 64):
+        self.threshold = threshold
+        self.out_dir = Path(out_dir)
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples: Deque[Tuple[float, Tuple[str, ...]]] = deque(maxlen=max(1, int(history / interval)))
+        self.dumps = 0
+        self._target: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start sampling the calling thread, normally the event loop's"""
+        if self._thread is not None:
+            return
+        self._target = threading.get_ident()
+        self._stop.clear()
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append((time.perf_counter(), tuple(stack)))
+
+    async def finished(self, name: str, start: float, end: float):
+        """Called for every request; dumps the ones slower than the threshold"""
+        if end - start < self.threshold or self._thread is None:
+            return
+        stacks = Counter(stack for at, stack in list(self.samples) if start <= at <= end)
+        if not stacks:
+            return
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_")
+        path = self.out_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{int((end - start) * 1000)}ms-{slug}.folded"
+        # Keep the file write off the event loop being profiled
+        await asyncio.to_thread(write_folded, path, stacks)
+        self.dumps += 1
+        logger.warning("%s took %.0f ms; stack profile written to %s", name, (end - start) * 1000, path)
@@ -0,0 +1,109 @@
+"""LRU cache of pre-serialized JSON responses with strong ETags."""
+import hashlib
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Optional, Tuple, Union
+
+from fastapi import Request, Response
+
+
+class CachedResponse:
+    __slots__ = ("body", "headers", "etag")
+
+    def __init__(self, body: bytes, headers: Optional[Dict[str, str]] = None):
+        self.body = body
+        self.headers = headers
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+class ResponseCache:
+    """Byte-budgeted LRU of response bodies tied to a catalog version
+
+    Entries are only valid for the catalog version they were built from;
+    the first lookup with a newer version drops everything.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self.size = 0
+        self.version: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+    def get(self, key: Hashable, version: int) -> Optional[CachedResponse]:
+        if version != self.version:
+            self.clear()
+            self.version = version
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(
+        self,
+        key: Hashable,
+        version: int,
+        body: bytes,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> CachedResponse:
+        entry = CachedResponse(body, headers)
+        if version != self.version or len(body) > self.max_bytes:
+            return entry
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old.body)
+        self.entries[key] = entry
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted.body)
+        return entry
+
+    def respond(
+        self,
+        request: Request,
+        key: Hashable,
+        version: int,
+        render: Callable[[], Union[bytes, Tuple[bytes, Dict[str, str]]]],
+    ) -> Response:
+        """Serve key from the cache, rendering it on a miss, honouring If-None-Match
+
+        ``render`` returns the body, or a (body, extra headers) pair.
+        """
+        entry = self.get(key, version)
+        if entry is None:
+            rendered = render()
+            if isinstance(rendered, tuple):
+                entry = self.put(key, version, *rendered)
+            else:
+                entry = self.put(key, version, rendered)
+        headers = {"ETag": entry.etag}
+        if entry.headers:
+            headers.update(entry.headers)
+        if etag_matches(request.headers.get("if-none-match"), entry.etag):
+            return Response(status_code=304, headers=headers)
+        return Response(entry.body, media_type="application/json", headers=headers)
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            return True
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
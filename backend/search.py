@@ -0,0 +1,324 @@
+"""Inverted index full-text search over product text fields."""
+import heapq
+import math
+import re
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+TOKEN_RE = re.compile(r"\w+")
+
+# Term frequency weight per indexed field
+FIELD_WEIGHTS = {"name": 2.0, "description": 1.0, "material": 1.0}
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Upper bound on vocabulary terms a single prefix expands to; past it the
+# terms in the most documents are kept
+MAX_EXPANSIONS = 64
+
+
+# A term's doc ids in ascending order and their impacts at the same positions
+Postings = Tuple[np.ndarray, np.ndarray]
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return TOKEN_RE.findall(text.lower())
+
+
+class SearchIndex:
+    """Tokenized inverted index with prefix matching and BM25 ranking
+
+    Documents are identified by integer ids (catalog positions). Every query
+    token is matched as a prefix so partial words work for type-ahead, and
+    a document must match all query tokens.
+    """
+
+    def __init__(self, fields: Dict[str, float] = FIELD_WEIGHTS):
+        self.fields = fields
+        self.postings: Dict[str, Dict[int, float]] = {}
+        self.doc_terms: Dict[int, Dict[str, float]] = {}
+        self.doc_len: Dict[int, float] = {}
+        self.total_len = 0.0
+        self.vocab: List[str] = []
+        # term -> {doc: BM25 contribution}, rebuilt lazily after any change
+        self._impacts: Dict[str, Dict[int, float]] = {}
+        # term -> its docs in impact order, and its postings as arrays, likewise
+        self._ranked: Dict[str, List[int]] = {}
+        self._arrays: Dict[str, Postings] = {}
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    def add(self, doc_id: int, product: dict):
+        """Index a product, replacing any previous version of it"""
+        for term in self._index(doc_id, product):
+            insort(self.vocab, term)
+
+    def add_many(self, docs: Iterable[Tuple[int, dict]]):
+        """Index many products, sorting the vocabulary once at the end"""
+        new_terms = False
+        for doc_id, product in docs:
+            new_terms = bool(self._index(doc_id, product)) or new_terms
+        if new_terms:
+            self.vocab = sorted(self.postings)
+
+    def _index(self, doc_id: int, product: dict) -> List[str]:
+        """Add a product's postings and return terms new to the vocabulary"""
+        if doc_id in self.doc_len:
+            self.remove(doc_id)
+        self._impacts.clear()
+        self._ranked.clear()
+        self._arrays.clear()
+        new_terms = []
+        terms: Dict[str, float] = {}
+        length = 0.0
+        for field, weight in self.fields.items():
+            for token in tokenize(product.get(field)):
+                terms[token] = terms.get(token, 0.0) + weight
+                length += weight
+        for term, tf in terms.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = {}
+                new_terms.append(term)
+            posting[doc_id] = tf
+        self.doc_terms[doc_id] = terms
+        self.doc_len[doc_id] = length
+        self.total_len += length
+        return new_terms
+
+    def remove(self, doc_id: int):
+        """Drop a product from the index"""
+        terms = self.doc_terms.pop(doc_id, None)
+        if terms is None:
+            return
+        self._impacts.clear()
+        self._ranked.clear()
+        self._arrays.clear()
+        for term in terms:
+            posting = self.postings[term]
+            del posting[doc_id]
+            if not posting:
+                del self.postings[term]
+                del self.vocab[bisect_left(self.vocab, term)]
+        self.total_len -= self.doc_len.pop(doc_id)
+
+    def expand(self, prefix: str) -> List[str]:
+        """Vocabulary terms starting with prefix, in vocabulary order
+
+        When more than MAX_EXPANSIONS terms match, the ones found in the
+        most documents are kept rather than the alphabetically first, so a
+        common word is not crowded out by many rare ones.
+        """
+        vocab = self.vocab
+        lo = i = bisect_left(vocab, prefix)
+        while i < len(vocab) and vocab[i].startswith(prefix):
+            i += 1
+        if i - lo > MAX_EXPANSIONS:
+            kept = heapq.nlargest(MAX_EXPANSIONS, range(lo, i), key=lambda j: (self.frequency_at(j), -j))
+            return [vocab[j] for j in sorted(kept)]
+        return [vocab[j] for j in range(lo, i)]
+
+    def frequency_at(self, position: int) -> int:
+        """Number of documents containing the vocabulary term at position"""
+        return len(self.postings[self.vocab[position]])
+
+    def impacts(self, term: str) -> Dict[int, float]:
+        """Per-document BM25 score contribution of a term"""
+        impacts = self._impacts.get(term)
+        if impacts is None:
+            posting = self.postings[term]
+            n = len(self.doc_len)
+            avg_len = self.total_len / n
+            doc_len = self.doc_len
+            idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+            impacts = self._impacts[term] = {
+                doc: idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * doc_len[doc] / avg_len))
+                for doc, tf in posting.items()
+            }
+        return impacts
+
+    def arrays(self, term: str) -> Postings:
+        """Postings of a term as arrays in doc order"""
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            impacts = self.impacts(term)
+            docs = np.fromiter(impacts.keys(), np.int64, len(impacts))
+            values = np.fromiter(impacts.values(), np.float64, len(impacts))
+            order = np.argsort(docs)
+            arrays = self._arrays[term] = (docs[order], values[order])
+        return arrays
+
+    def ranked(self, term: str) -> List[int]:
+        """Documents containing a term, highest impact first and ascending doc id among ties"""
+        ranked = self._ranked.get(term)
+        if ranked is None:
+            ranked = self._ranked[term] = impact_order(*self.arrays(term))
+        return ranked
+
+    def frequency(self, term: str) -> int:
+        """Number of documents containing a vocabulary term"""
+        return len(self.postings[term])
+
+    def search(
+        self,
+        query: str,
+        restrict: Optional[Iterable[int]] = None,
+        limit: Optional[int] = None,
+    ) -> List[int]:
+        """Return doc ids matching every query token, best BM25 score first
+
+        A single-term query with a ``limit`` reads only the head of the
+        term's impact-ordered postings. Anything else accumulates every
+        query term's impacts into per-document arrays, so the work grows
+        with the postings of at most MAX_EXPANSIONS terms per token.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or not len(self):
+            return []
+
+        expansions = []
+        for token in tokens:
+            terms = self.expand(token)
+            if not terms:
+                return []
+            expansions.append(terms)
+
+        if restrict is not None and not isinstance(restrict, (set, frozenset)):
+            restrict = set(restrict)
+        if limit is not None and len(expansions) == 1 and len(expansions[0]) == 1:
+            term = expansions[0][0]
+            # A small restrict set is cheaper to score than to look for in the postings
+            if restrict is None or len(restrict) >= self.frequency(term):
+                return self.top(term, restrict, limit)
+        return self.rank(expansions, restrict, limit)
+
+    def top(self, term: str, restrict: Optional[Set[int]], limit: int) -> List[int]:
+        """The ``limit`` best matches of a single term
+
+        A document's score is then the term's impact alone, so the
+        impact-ordered postings already are the full ranking.
+        """
+        ranked = self.ranked(term)
+        if restrict is None:
+            return ranked[:limit]
+        best = []
+        for doc in ranked:
+            if len(best) >= limit:
+                break
+            if doc in restrict:
+                best.append(doc)
+        return best
+
+    def rank(self, expansions: List[List[str]], restrict: Optional[Set[int]],
+             limit: Optional[int]) -> List[int]:
+        """Every match scored, best first
+
+        Scores are summed in arrays indexed by doc id, up to the largest
+        doc id of any query term. Impacts are added term by term in query
+        order, so equal scores compare exactly and ties go to the lower id.
+        """
+        if limit is not None and limit <= 0:
+            return []
+        postings = [[self.arrays(term) for term in terms] for terms in expansions]
+        size = max(int(docs[-1]) for token in postings for docs, _ in token) + 1
+        scores = np.zeros(size)
+        matched = None
+        for token in postings:
+            hits = np.zeros(size, bool)
+            for docs, impacts in token:
+                scores[docs] += impacts
+                hits[docs] = True
+            matched = hits if matched is None else matched & hits
+        if restrict is not None:
+            allowed = np.zeros(size, bool)
+            allowed[[doc for doc in restrict if 0 <= doc < size]] = True
+            matched &= allowed
+        docs = np.flatnonzero(matched)
+        scores = scores[docs]
+        if limit is not None and limit < len(docs):
+            # Only candidates scoring at least the limit-th best need sorting
+            kth = np.partition(scores, len(scores) - limit)[len(scores) - limit]
+            keep = scores >= kth
+            docs, scores = docs[keep], scores[keep]
+        order = np.lexsort((docs, -scores))
+        return docs[order[:limit]].tolist()
+
+
+def impact_order(docs: np.ndarray, impacts: np.ndarray) -> List[int]:
+    return docs[np.lexsort((docs, -impacts))].tolist()
+
+
+class FrozenSearchIndex(SearchIndex):
+    """Read-only SearchIndex over flat arrays, e.g. views into a catalog snapshot
+
+    ``vocab`` is the sorted vocabulary. The postings of ``vocab[i]`` are
+    ``docs[bounds[i]:bounds[i + 1]]`` with their precomputed BM25 impacts
+    at the same positions of ``impacts``. Only the impact orders of the
+    ``cache_terms`` most recently used terms are held as lists.
+    """
+
+    def __init__(self, vocab: Sequence[str], bounds: Sequence[int], docs: Sequence[int],
+                 impacts: Sequence[float], size: int, cache_terms: int = 256):
+        self.vocab = vocab
+        self.bounds = bounds
+        self.doc_ids = docs
+        self.impact_values = impacts
+        self.size = size
+        self.cache_terms = cache_terms
+        self._impacts: "OrderedDict[str, Dict[int, float]]" = OrderedDict()
+        self._ranked: "OrderedDict[str, List[int]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("A frozen search index is read-only")
+
+    add = add_many = remove = _read_only
+
+    def frequency_at(self, position: int) -> int:
+        return self.bounds[position + 1] - self.bounds[position]
+
+    def frequency(self, term: str) -> int:
+        lo, hi = self._bounds(term)
+        return hi - lo
+
+    def _bounds(self, term: str) -> Tuple[int, int]:
+        i = bisect_left(self.vocab, term)
+        if i == len(self.vocab) or self.vocab[i] != term:
+            raise KeyError(term)
+        return self.bounds[i], self.bounds[i + 1]
+
+    def impacts(self, term: str) -> Dict[int, float]:
+        impacts = self._impacts.get(term)
+        if impacts is not None:
+            self._impacts.move_to_end(term)
+            return impacts
+        lo, hi = self._bounds(term)
+        impacts = self._impacts[term] = dict(zip(self.doc_ids[lo:hi], self.impact_values[lo:hi]))
+        if len(self._impacts) > self.cache_terms:
+            self._impacts.popitem(last=False)
+        return impacts
+
+    def arrays(self, term: str) -> Postings:
+        # Postings are stored in doc order already, so these are views
+        lo, hi = self._bounds(term)
+        return np.asarray(self.doc_ids[lo:hi]), np.asarray(self.impact_values[lo:hi])
+
+    def ranked(self, term: str) -> List[int]:
+        ranked = self._ranked.get(term)
+        if ranked is not None:
+            self._ranked.move_to_end(term)
+            return ranked
+        ranked = self._ranked[term] = impact_order(*self.arrays(term))
+        if len(self._ranked) > self.cache_terms:
+            self._ranked.popitem(last=False)
+        return ranked
@@ -0,0 +1,77 @@
+"""JSON responses encoded straight to bytes from data validated when it was written.
+
+Catalog products are validated when the catalog is loaded, carts are built
+from those products, and orders are models validated on construction. So
+handlers return FastJSONResponse and skip FastAPI's per-request
+validation and jsonable_encoder pass against the response_model.
+``response_model`` stays on the routes for the OpenAPI schema.
+
+Strict mode (STRICT_RESPONSES=1, or ``serialization.strict = True`` in
+tests) re-validates every response against its model and fails if the
+fast encoding differs from what the model would have produced.
+"""
+import os
+from functools import lru_cache
+from typing import Any, Dict, Optional
+
+import orjson
+from pydantic import BaseModel, TypeAdapter
+from pydantic_core import to_json
+from starlette.background import BackgroundTask
+from starlette.responses import Response
+
+strict = os.environ.get('STRICT_RESPONSES', '').lower() in ('1', 'true', 'yes')
+
+
+class ResponseDriftError(AssertionError):
+    """A fast response differs from the model-validated encoding"""
+
+
+def encode(content: Any) -> bytes:
+    """JSON bytes for plain data or a pydantic model, without revalidating"""
+    if isinstance(content, BaseModel):
+        return to_json(content)
+    # UTC as "Z", the way pydantic writes it
+    return orjson.dumps(content, option=orjson.OPT_UTC_Z)
+
+
+@lru_cache(maxsize=None)
+def adapter_for(model: Any) -> TypeAdapter:
+    return TypeAdapter(model)
+
+
+def verify(body: bytes, model: Any, content: Any, **dump_options):
+    """Raise ResponseDriftError unless body is exactly what validating content against model gives"""
+    adapter = adapter_for(model)
+    expected = adapter.dump_json(adapter.validate_python(content), **dump_options)
+    if body != expected:
+        raise ResponseDriftError(f"Response does not match {model}:\n  sent     {body[:300]!r}\n  expected {expected[:300]!r}")
+
+
+def encode_as(content: Any, model: Any) -> bytes:
+    """encode(), checked against model in strict mode"""
+    body = encode(content)
+    if strict:
+        verify(body, model, content)
+    return body
+
+
+class FastJSONResponse(Response):
+    """JSON response encoded with orjson (or pydantic-core for models)
+
+    ``model`` is the shape the content is declared to have; it is only
+    consulted in strict mode.
+    """
+
+    media_type = "application/json"
+
+    def __init__(self, content: Any, model: Any = None, status_code: int = 200,
+                 headers: Optional[Dict[str, str]] = None, media_type: Optional[str] = None,
+                 background: Optional[BackgroundTask] = None):
+        self.model = model
+        super().__init__(content, status_code, headers, media_type, background)
+
+    def render(self, content: Any) -> bytes:
+        if self.model is None:
+            return encode(content)
+        return encode_as(content, self.model)
@@ -0,0 +1,104 @@
+"""Production launcher: uvicorn workers sharing one memory-mapped catalog snapshot.
+
+Run from backend/:
+    python -m serve --workers 4 --port 8001
+
+The launcher loads the catalog (CATALOG_SOURCE, as for a single process),
+writes it to a snapshot file and starts the workers with CATALOG_SNAPSHOT
+pointing at it. Workers map the file instead of each building their own
+catalog. When the source changes the launcher publishes a new snapshot and
+workers switch to it on their next poll.
+
+Carts must live in Mongo once there is more than one worker, since a
+request can land on any of them; CART_STORE defaults to mongo here.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+import uvicorn
+
+logger = logging.getLogger("serve")
+
+
+def publish_catalog(server, writer, ready: threading.Event, stop: threading.Event):
+    """Load the source into snapshots until stop is set
+
+    This runs its own event loop, so it opens its own database client and
+    catalog source rather than using the app's, which belong to the loop
+    of an in-process worker.
+    """
+    from catalog_source import CatalogReloader
+    from mongo import LazyDatabase
+
+    async def run():
+        db = LazyDatabase()
+        reloader = CatalogReloader(writer, server.catalog_source_from_env(db), validate=server.validate_products)
+        try:
+            await server.retry_until_done(reloader.reload, f"Catalog from {reloader}")
+            ready.set()
+            await reloader.start()
+            await asyncio.to_thread(stop.wait)
+        finally:
+            await reloader.close()
+            db.close()
+
+    asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the API from several worker processes")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--snapshot", help="snapshot file to write (default: in a temporary directory)")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    snapshot_dir = None
+    if args.snapshot:
+        snapshot = Path(args.snapshot).resolve()
+    else:
+        snapshot_dir = tempfile.mkdtemp(prefix="catalog-")
+        snapshot = Path(snapshot_dir) / "catalog.snapshot"
+
+    cart_store = os.environ.setdefault("CART_STORE", "mongo")
+    if args.workers > 1 and cart_store != "mongo":
+        logger.warning("CART_STORE=%s keeps carts per worker; use mongo with several workers", cart_store)
+    # Set before importing the app so that a single in-process worker maps the snapshot too
+    os.environ["CATALOG_SNAPSHOT"] = str(snapshot)
+
+    import server
+    from catalog_snapshot import SnapshotWriter
+
+    writer = SnapshotWriter(snapshot)
+    stop = threading.Event()
+    publisher = None
+    if server.catalog_source is None:
+        writer.reload(server.validate_products(server.DUMMY_PRODUCTS), server.CATEGORIES)
+    else:
+        ready = threading.Event()
+        publisher = threading.Thread(
+            target=publish_catalog, args=(server, writer, ready, stop), name="catalog-publisher", daemon=True,
+        )
+        publisher.start()
+        ready.wait()
+    logger.info("Catalog version %d written to %s (%d bytes)", writer.version, snapshot, snapshot.stat().st_size)
+
+    try:
+        uvicorn.run("server:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        stop.set()
+        if publisher is not None:
+            publisher.join(timeout=10)
+        if snapshot_dir is not None:
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,58 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Header, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from typing import AsyncIterator, List, Literal, Optional
 import uuid
-from datetime import datetime, timezone
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timezone
+from functools import lru_cache
+import pandas as pd
+
+from analytics import SalesAnalytics, frame_records
+from cart_store import CartConflictError, create_cart_store
+from catalog import ProductRegistry, SORT_OPTIONS, decode_cursor, encode_cursor
+from catalog_snapshot import SnapshotFollower
+from catalog_source import CatalogReloader, create_catalog_source
+from db_indexes import ensure_indexes, explain_app_queries, migrate_status_timestamps
+from idempotency import (
+    IdempotencyConflict, IdempotencyStore, RequestInProgress, ResponseNotStored, StoredResponse, request_fingerprint,
+)
+from inventory import InsufficientStock, Inventory, ReservationConflict
+from metrics import REGISTRY, MetricsMiddleware, MongoCommandTimer, work_seconds
+from mongo import LazyDatabase
+from order_export import EXPORT_FORMATS, iter_row_chunks, missing_dependency, stream_export
+from order_ingest import OrderIngestQueue
+from order_queries import (
+    ORDER_SORT, decode_order_cursor, encode_order_cursor, order_by_ids, order_filter, order_projection,
+)
+from profiler import SlowRequestProfiler
+from response_cache import ResponseCache
+import serialization
+from serialization import FastJSONResponse, encode, encode_as, verify
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# MongoDB connection, created on first use with pool settings from MONGO_* env vars.
+# Every driver command is timed into mongo_command_duration_seconds
+db = LazyDatabase(event_listeners=[MongoCommandTimer()])
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await start_background_services()
+    try:
+        yield
+    finally:
+        await stop_background_services()
+
+# Handlers returning plain data are encoded with orjson too
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 api_router = APIRouter(prefix="/api")
 
 # ============ MODELS ============
@@ -54,6 +88,24 @@ class Cart(BaseModel):
     items: List[CartItemResponse] = []
     total: float = 0.0
 
+class CartOperation(BaseModel):
+    op: Literal["add", "update", "remove"]
+    product_id: str
+    quantity: int = 1
+
+class CartBatch(BaseModel):
+    operations: List[CartOperation] = Field(max_length=500)
+
+class CartOperationResult(BaseModel):
+    op: str
+    product_id: str
+    ok: bool
+    detail: Optional[str] = None
+
+class CartBatchResult(BaseModel):
+    cart: Cart
+    results: List[CartOperationResult]
+
 class CustomerDetails(BaseModel):
     full_name: str
     email: str
@@ -77,6 +129,10 @@ class Order(BaseModel):
     payment_status: str = "unpaid"
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
+class OrderLookup(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=1000)
+    fields: Optional[List[str]] = None
+
 # ============ DUMMY DATA ============
 
 DUMMY_PRODUCTS = [
@@ -294,172 +350,511 @@ DUMMY_PRODUCTS = [
     }
 ]
 
+CATEGORIES = [
+    {"id": "living-room", "name": "Living Room", "image": "https://images.unsplash.com/photo-1653668984101-29088a7b5476?w=800&q=80"},
+    {"id": "bedroom", "name": "Bedroom", "image": "https://images.unsplash.com/photo-1702865071772-16f67bbf594e?w=800&q=80"},
+    {"id": "office", "name": "Office", "image": "https://images.unsplash.com/photo-1704655295066-681e61ecca6b?w=800&q=80"},
+    {"id": "dining", "name": "Dining", "image": "https://images.unsplash.com/photo-1649747823135-3450d7b8fa41?w=800&q=80"}
+]
+
+# CATALOG_SOURCE selects builtin (the data above, default), mongo (products and
+# categories collections) or file (CATALOG_FILE, JSON or NDJSON). External sources
+# are watched and reloaded into a new snapshot whenever they change
+def catalog_source_from_env(db):
+    return create_catalog_source(
+        os.environ.get('CATALOG_SOURCE', 'builtin'),
+        db,
+        path=os.environ.get('CATALOG_FILE'),
+        poll_interval=float(os.environ.get('CATALOG_POLL_INTERVAL', 30)),
+    )
+
+catalog_source = catalog_source_from_env(db)
+
+def validate_products(products: List[dict]) -> List[dict]:
+    """Fill in defaults and reject products the API could not serve
+
+    Catalog products are validated here once, so responses can encode
+    them as they are.
+    """
+    return [Product.model_validate(p).model_dump() for p in products]
+
+PRODUCT_FIELDS = tuple(Product.model_fields)
+
+def project_products(products: List[dict], include: Optional[set]) -> List[dict]:
+    """Products cut down to the requested fields, in schema order"""
+    if not include:
+        return products
+    keys = [f for f in PRODUCT_FIELDS if f in include]
+    return [{k: p[k] for k in keys} for p in products]
+
+# Indexed (or loaded from the source) in the background at startup, see warm_up.
+# Workers started by serve.py get CATALOG_SNAPSHOT instead: the launcher loads the
+# source once and every worker maps the snapshot file it publishes
+snapshot_path = os.environ.get('CATALOG_SNAPSHOT')
+if snapshot_path:
+    registry = ProductRegistry([], lazy=True)
+    catalog_reloader = SnapshotFollower(
+        registry, Path(snapshot_path), poll_interval=float(os.environ.get('CATALOG_SNAPSHOT_POLL_INTERVAL', 1)),
+    )
+elif catalog_source is None:
+    registry = ProductRegistry(validate_products(DUMMY_PRODUCTS), lazy=True, categories=CATEGORIES)
+    catalog_reloader = None
+else:
+    registry = ProductRegistry([], lazy=True)
+    catalog_reloader = CatalogReloader(registry, catalog_source, validate=validate_products)
+
+# Serialized catalog responses, invalidated whenever the registry reloads
+response_cache = ResponseCache(int(os.environ.get('RESPONSE_CACHE_MAX_BYTES', 32 * 1024 * 1024)))
+
 # ============ PRODUCT ENDPOINTS ============
 
 @api_router.get("/products", response_model=List[Product])
 async def get_products(
+    request: Request,
     category: Optional[str] = None,
     min_price: Optional[float] = None,
     max_price: Optional[float] = None,
     search: Optional[str] = None,
-    featured: Optional[bool] = None
+    featured: Optional[bool] = None,
+    sort: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
 ):
-    """Get all products with optional filtering"""
-    products = DUMMY_PRODUCTS.copy()
-    
-    if category:
-        products = [p for p in products if p["category"] == category]
-    
-    if min_price is not None:
-        products = [p for p in products if p["price"] >= min_price]
-    
-    if max_price is not None:
-        products = [p for p in products if p["price"] <= max_price]
-    
-    if search:
-        search_lower = search.lower()
-        products = [p for p in products if search_lower in p["name"].lower() or search_lower in p["description"].lower()]
-    
-    if featured is not None:
-        products = [p for p in products if p["featured"] == featured]
-    
-    return products
+    """Get products with optional filtering, sorting, projection and cursor pagination
+
+    When more results remain, the cursor for the next page is returned in
+    the X-Next-Cursor header.
+    """
+    index = registry.index
+    search = search.strip().lower() if search else None
+    if sort and sort not in SORT_OPTIONS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(SORT_OPTIONS)}")
+
+    offset = 0
+    if cursor:
+        try:
+            version, cursor_sort, offset = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        if version != index.version:
+            raise HTTPException(status_code=400, detail="Cursor expired, the catalog has changed")
+        if cursor_sort != (sort or ""):
+            raise HTTPException(status_code=400, detail="Cursor does not match sort")
+
+    include = None
+    if fields:
+        include = {f.strip() for f in fields.split(",") if f.strip()}
+        unknown = include - Product.model_fields.keys()
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    key = (
+        "products", category or None, min_price, max_price, search or None, featured,
+        sort, limit, offset, frozenset(include) if include else None,
+    )
+
+    def render():
+        with work_seconds.time("product_filter"):
+            products, next_offset = index.page(
+                category=category,
+                min_price=min_price,
+                max_price=max_price,
+                search=search,
+                featured=featured,
+                sort=sort,
+                offset=offset,
+                limit=limit,
+            )
+        with work_seconds.time("product_serialize"):
+            body = encode(project_products(products, include))
+        if serialization.strict:
+            verify(body, List[Product], products, include={"__all__": include} if include else None)
+        if next_offset is None:
+            return body
+        return body, {"X-Next-Cursor": encode_cursor(index.version, sort, next_offset)}
+
+    return response_cache.respond(request, key, index.version, render)
 
 @api_router.get("/products/{product_id}", response_model=Product)
-async def get_product(product_id: str):
+async def get_product(request: Request, product_id: str):
     """Get a single product by ID"""
-    for product in DUMMY_PRODUCTS:
-        if product["id"] == product_id:
-            return product
-    raise HTTPException(status_code=404, detail="Product not found")
+    index = registry.index
+    product = index.get(product_id)
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return response_cache.respond(
+        request, ("product", product_id), index.version,
+        lambda: encode_as(product, Product),
+    )
 
 @api_router.get("/categories")
-async def get_categories():
+async def get_categories(request: Request):
     """Get all categories"""
-    return [
-        {"id": "living-room", "name": "Living Room", "image": "https://images.unsplash.com/photo-1653668984101-29088a7b5476?w=800&q=80"},
-        {"id": "bedroom", "name": "Bedroom", "image": "https://images.unsplash.com/photo-1702865071772-16f67bbf594e?w=800&q=80"},
-        {"id": "office", "name": "Office", "image": "https://images.unsplash.com/photo-1704655295066-681e61ecca6b?w=800&q=80"},
-        {"id": "dining", "name": "Dining", "image": "https://images.unsplash.com/photo-1649747823135-3450d7b8fa41?w=800&q=80"}
-    ]
+    index = registry.index
+    return response_cache.respond(
+        request, ("categories",), index.version,
+        lambda: encode(index.categories),
+    )
+
+@api_router.post("/catalog/reload")
+async def reload_catalog():
+    """Reload the catalog from its source now rather than on the next change"""
+    if catalog_reloader is None:
+        raise HTTPException(status_code=409, detail="The catalog is built in; set CATALOG_SOURCE to load it from Mongo or a file")
+    try:
+        changed = await catalog_reloader.reload()
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Catalog reload failed: {e}")
+    index = registry.index
+    return {"changed": changed, "version": index.version, "products": len(index), "categories": len(index.categories)}
 
 # ============ CART ENDPOINTS ============
 
-# In-memory cart storage (would use MongoDB in production)
-carts = {}
+# CART_STORE selects memory (default), mongo, or cached (LRU + write-behind to mongo)
+cart_store = create_cart_store(
+    os.environ.get('CART_STORE', 'memory'),
+    db,
+    capacity=int(os.environ.get('CART_CACHE_SIZE', 10000)),
+    max_carts=int(os.environ.get('CART_MAX_COUNT', 100000)),
+    # Idle carts expire after a week by default; 0 disables expiry
+    ttl=float(os.environ.get('CART_TTL_SECONDS', 7 * 24 * 3600)) or None,
+    sweep_interval=float(os.environ.get('CART_SWEEP_INTERVAL', 60)),
+    flush_interval=float(os.environ.get('CART_FLUSH_INTERVAL', 1.0)),
+    batch_size=int(os.environ.get('CART_FLUSH_BATCH', 500)),
+    # Debug mode: verify every incremental total against a full recompute
+    check_consistency=os.environ.get('CART_DEBUG', '').lower() in ('1', 'true', 'yes'),
+)
+
+@api_router.get("/carts/stats")
+async def get_cart_stats():
+    """Cart count and memory use of the cart store"""
+    return await cart_store.stats()
 
 @api_router.post("/cart/create", response_model=Cart)
 async def create_cart():
     """Create a new cart"""
-    cart = Cart()
-    carts[cart.id] = cart.model_dump()
-    return cart
+    return FastJSONResponse(await cart_store.create(), Cart)
 
 @api_router.get("/cart/{cart_id}", response_model=Cart)
 async def get_cart(cart_id: str):
     """Get cart by ID"""
-    if cart_id not in carts:
+    cart = await cart_store.get(cart_id)
+    if cart is None:
         raise HTTPException(status_code=404, detail="Cart not found")
-    return carts[cart_id]
+    return FastJSONResponse(cart, Cart)
+
+# INVENTORY_TRACKING=1 holds stock for cart lines and commits it at checkout
+inventory = Inventory(
+    db.inventory,
+    db.reservations,
+    shards=int(os.environ.get('INVENTORY_SHARDS', 4)),
+    hold_seconds=float(os.environ.get('RESERVATION_TTL_SECONDS', 900)),
+    sweep_interval=float(os.environ.get('RESERVATION_SWEEP_INTERVAL', 30)),
+) if os.environ.get('INVENTORY_TRACKING', '').lower() in ('1', 'true', 'yes') else None
 
-@api_router.post("/cart/{cart_id}/add")
+def line_quantity(cart: dict, product_id: str) -> int:
+    return next((i["quantity"] for i in cart["items"] if i["product_id"] == product_id), 0)
+
+async def hold_stock(cart_id: str, product_id: str, quantity: int):
+    """Make the cart line hold quantity units, as a 409 if they are not available"""
+    try:
+        await inventory.reserve(cart_id, product_id, quantity)
+    except (InsufficientStock, ReservationConflict) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@api_router.post("/cart/{cart_id}/add", response_model=Cart)
 async def add_to_cart(cart_id: str, item: CartItem):
     """Add item to cart"""
-    if cart_id not in carts:
-        raise HTTPException(status_code=404, detail="Cart not found")
-    
-    # Find product
-    product = None
-    for p in DUMMY_PRODUCTS:
-        if p["id"] == item.product_id:
-            product = p
-            break
-    
+    product = registry.get(item.product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    cart = carts[cart_id]
-    
-    # Check if item already in cart
-    for cart_item in cart["items"]:
-        if cart_item["product_id"] == item.product_id:
-            cart_item["quantity"] += item.quantity
-            break
-    else:
-        cart["items"].append({
-            "product_id": product["id"],
-            "name": product["name"],
-            "price": product["price"],
-            "image": product["image"],
-            "quantity": item.quantity
-        })
+    if inventory is not None and item.quantity > 0:
+        cart = await cart_store.get(cart_id)
+        if cart is None:
+            raise HTTPException(status_code=404, detail="Cart not found")
+        await hold_stock(cart_id, item.product_id, line_quantity(cart, item.product_id) + item.quantity)
     
-    # Recalculate total
-    cart["total"] = sum(i["price"] * i["quantity"] for i in cart["items"])
-    
-    return cart
+    try:
+        cart = await cart_store.add_item(cart_id, product, item.quantity)
+    except CartConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if cart is None:
+        raise HTTPException(status_code=404, detail="Cart not found")
+    return FastJSONResponse(cart, Cart)
 
-@api_router.post("/cart/{cart_id}/remove")
+@api_router.post("/cart/{cart_id}/remove", response_model=Cart)
 async def remove_from_cart(cart_id: str, product_id: str):
     """Remove item from cart"""
-    if cart_id not in carts:
+    cart = await cart_store.remove_item(cart_id, product_id)
+    if cart is None:
         raise HTTPException(status_code=404, detail="Cart not found")
-    
-    cart = carts[cart_id]
-    cart["items"] = [i for i in cart["items"] if i["product_id"] != product_id]
-    cart["total"] = sum(i["price"] * i["quantity"] for i in cart["items"])
-    
-    return cart
+    if inventory is not None:
+        await hold_stock(cart_id, product_id, 0)
+    return FastJSONResponse(cart, Cart)
 
-@api_router.post("/cart/{cart_id}/update")
+@api_router.post("/cart/{cart_id}/update", response_model=Cart)
 async def update_cart_quantity(cart_id: str, item: CartItem):
     """Update item quantity in cart"""
-    if cart_id not in carts:
+    if inventory is not None:
+        cart = await cart_store.get(cart_id)
+        if cart is None:
+            raise HTTPException(status_code=404, detail="Cart not found")
+        # Updating a line the cart doesn't have would reserve stock for nothing
+        if not line_quantity(cart, item.product_id):
+            raise HTTPException(status_code=404, detail="Item not in cart")
+        await hold_stock(cart_id, item.product_id, item.quantity)
+    cart = await cart_store.set_quantity(cart_id, item.product_id, item.quantity)
+    if cart is None:
         raise HTTPException(status_code=404, detail="Cart not found")
-    
-    cart = carts[cart_id]
-    
-    for cart_item in cart["items"]:
-        if cart_item["product_id"] == item.product_id:
-            if item.quantity <= 0:
-                cart["items"].remove(cart_item)
-            else:
-                cart_item["quantity"] = item.quantity
-            break
-    
-    cart["total"] = sum(i["price"] * i["quantity"] for i in cart["items"])
-    
+    return FastJSONResponse(cart, Cart)
+
+@api_router.post("/cart/{cart_id}/batch", response_model=CartBatchResult)
+async def batch_update_cart(cart_id: str, batch: CartBatch):
+    """Apply many add/update/remove operations to a cart in one pass"""
+    products = registry.get_many(op.product_id for op in batch.operations)
+    operations = [
+        (op.op, op.product_id, op.quantity, product)
+        for op, product in zip(batch.operations, products)
+    ]
+    try:
+        outcome = await cart_store.apply_batch(cart_id, operations)
+    except CartConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if outcome is None:
+        raise HTTPException(status_code=404, detail="Cart not found")
+    cart, errors = outcome
+    if inventory is not None:
+        cart = await sync_batch_holds(cart_id, cart, batch.operations, errors)
+    return FastJSONResponse({
+        "cart": cart,
+        "results": [
+            {"op": op.op, "product_id": op.product_id, "ok": error is None, "detail": error}
+            for op, error in zip(batch.operations, errors)
+        ],
+    }, CartBatchResult)
+
+async def sync_batch_holds(cart_id: str, cart: dict, operations: List[CartOperation], errors: List[Optional[str]]) -> dict:
+    """Bring holds in line with a batch's result
+
+    Lines whose new quantity cannot be held are cut back to what is held,
+    and the last operation on that product is reported as failed.
+    """
+    touched = {op.product_id: i for i, op in enumerate(operations) if errors[i] is None}
+    for product_id, last in touched.items():
+        quantity = line_quantity(cart, product_id)
+        try:
+            await inventory.reserve(cart_id, product_id, quantity)
+        except (InsufficientStock, ReservationConflict) as e:
+            errors[last] = str(e)
+            held = await inventory.held(cart_id, product_id)
+            cart = await cart_store.set_quantity(cart_id, product_id, held) or cart
     return cart
 
+# ============ INVENTORY ENDPOINTS ============
+
+class Restock(BaseModel):
+    quantity: int = Field(gt=0)
+
+def require_inventory() -> Inventory:
+    if inventory is None:
+        raise HTTPException(status_code=404, detail="Inventory tracking is disabled")
+    return inventory
+
+@api_router.get("/inventory/{product_id}")
+async def get_stock(product_id: str):
+    """Units of a product not held by carts; null when the product is untracked"""
+    if not registry.get(product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+    return {"product_id": product_id, "available": await require_inventory().available(product_id)}
+
+@api_router.post("/inventory/{product_id}/restock")
+async def restock_product(product_id: str, restock: Restock):
+    """Add units of a product, starting to track it if needed"""
+    if not registry.get(product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+    tracked = require_inventory()
+    await tracked.restock(product_id, restock.quantity)
+    return {"product_id": product_id, "available": await tracked.available(product_id)}
+
 # ============ ORDER ENDPOINTS ============
 
+# ORDER_INGEST_BATCHING=1 coalesces concurrent order inserts into insert_many batches
+order_queue = OrderIngestQueue(
+    db.orders,
+    max_batch=int(os.environ.get('ORDER_BATCH_SIZE', 100)),
+    max_delay=float(os.environ.get('ORDER_BATCH_DELAY_MS', 0)) / 1000,
+    max_pending=int(os.environ.get('ORDER_QUEUE_SIZE', 10000)),
+    workers=int(os.environ.get('ORDER_BATCH_WORKERS', 2)),
+) if os.environ.get('ORDER_INGEST_BATCHING', '').lower() in ('1', 'true', 'yes') else None
+
+async def save_order(order_dict: dict):
+    """Insert an order, through the batching queue when enabled"""
+    if order_queue is not None:
+        await order_queue.submit(order_dict)
+    else:
+        await db.orders.insert_one(order_dict)
+
+# Responses to POST /orders with an Idempotency-Key, kept for replay to retries
+idempotency = IdempotencyStore(
+    db.idempotency_keys,
+    ttl=float(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 24 * 3600)),
+    lock_seconds=float(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', 30)),
+)
+
 @api_router.post("/orders", response_model=Order)
-async def create_order(order_data: OrderCreate):
-    """Create a new order"""
-    if order_data.cart_id not in carts:
+async def create_order(
+    order_data: OrderCreate,
+    idempotency_key: Optional[str] = Header(None, min_length=1, max_length=255),
+):
+    """Create a new order
+
+    Requests carrying an Idempotency-Key header place the order once;
+    retries with the same key and body get the original response back,
+    marked with Idempotent-Replayed: true.
+    """
+    if idempotency_key is None:
+        return FastJSONResponse(await place_order(order_data), Order)
+
+    async def render() -> StoredResponse:
+        order = await place_order(order_data)
+        return StoredResponse(200, encode_as(order, Order))
+
+    try:
+        response, replayed = await idempotency.run(
+            "orders", idempotency_key, request_fingerprint(order_data.model_dump()), render,
+        )
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except (RequestInProgress, ResponseNotStored) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return Response(
+        response.body,
+        status_code=response.status,
+        media_type=response.media_type,
+        headers={"Idempotent-Replayed": "true"} if replayed else None,
+    )
+
+async def place_order(order_data: OrderCreate) -> Order:
+    cart = await cart_store.get(order_data.cart_id)
+    if cart is None:
         raise HTTPException(status_code=404, detail="Cart not found")
     
-    cart = carts[order_data.cart_id]
-    
     if not cart["items"]:
         raise HTTPException(status_code=400, detail="Cart is empty")
     
+    # Make sure every line is still in the catalog
+    products = registry.get_many(i["product_id"] for i in cart["items"])
+    missing = [i["product_id"] for i, p in zip(cart["items"], products) if p is None]
+    if missing:
+        raise HTTPException(status_code=409, detail=f"Products no longer available: {', '.join(missing)}")
+    
     order = Order(
         customer=order_data.customer,
         items=cart["items"],
         total=cart["total"]
     )
     
+    # Turn the cart's stock holds into sold units before the order exists
+    committed = []
+    if inventory is not None:
+        lines = [(i["product_id"], i["quantity"]) for i in cart["items"]]
+        try:
+            committed = await inventory.commit(order_data.cart_id, lines, order.id)
+        except (InsufficientStock, ReservationConflict) as e:
+            raise HTTPException(status_code=409, detail=str(e))
+    
     # Save to MongoDB
     order_dict = order.model_dump()
-    await db.orders.insert_one(order_dict)
+    try:
+        await save_order(order_dict)
+    except Exception:
+        if committed:
+            await inventory.restore(committed)
+        raise
     
     # Clear cart
-    carts[order_data.cart_id]["items"] = []
-    carts[order_data.cart_id]["total"] = 0
+    await cart_store.clear(order_data.cart_id)
     
     return order
 
+def parse_order_fields(fields: Optional[List[str]]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    unknown = set(fields) - Order.model_fields.keys()
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    return fields
+
+@api_router.get("/orders")
+async def list_orders(
+    customer_email: Optional[str] = None,
+    status: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """List orders newest first with optional filters, projection and cursor pagination
+
+    When more results remain, the cursor for the next page is returned in
+    the X-Next-Cursor header.
+    """
+    after = None
+    if cursor:
+        try:
+            after = decode_order_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    include = parse_order_fields([f.strip() for f in fields.split(",") if f.strip()] if fields else None)
+
+    query = order_filter(customer_email, status, payment_status, created_from, created_to, after)
+    # One extra document tells us whether another page exists
+    orders = await (
+        db.orders.find(query, order_projection(include))
+        .sort(ORDER_SORT)
+        .limit(limit + 1)
+        .to_list(limit + 1)
+    )
+    headers = {}
+    if len(orders) > limit:
+        del orders[limit:]
+        headers["X-Next-Cursor"] = encode_order_cursor(orders[-1]["created_at"], orders[-1]["id"])
+    return Response(encode(orders), media_type="application/json", headers=headers)
+
+@api_router.get("/orders/export")
+async def export_orders(
+    format: Literal["csv", "xlsx", "parquet"] = "csv",
+    customer_email: Optional[str] = None,
+    status: Optional[str] = None,
+    payment_status: Optional[str] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None
+):
+    """Stream matching orders as a CSV, XLSX or Parquet file, one row per order line"""
+    missing = missing_dependency(format)
+    if missing:
+        raise HTTPException(status_code=501, detail=f"{format} export requires the {missing} package")
+    media_type, extension = EXPORT_FORMATS[format]
+    query = order_filter(customer_email, status, payment_status, created_from, created_to)
+    filename = f"orders-{datetime.now(timezone.utc):%Y%m%d}.{extension}"
+    return StreamingResponse(
+        stream_export(iter_row_chunks(db.orders, query), format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@api_router.post("/orders/lookup")
+async def lookup_orders(lookup: OrderLookup):
+    """Fetch many orders by ID in one query, in request order"""
+    include = parse_order_fields(lookup.fields)
+    docs = await db.orders.find({"id": {"$in": lookup.ids}}, order_projection(include)).to_list(None)
+    orders, missing = order_by_ids(lookup.ids, docs)
+    return Response(encode({"orders": orders, "missing": missing}), media_type="application/json")
+
 @api_router.get("/orders/{order_id}", response_model=Order)
 async def get_order(order_id: str):
     """Get order by ID"""
@@ -468,6 +863,63 @@ async def get_order(order_id: str):
         raise HTTPException(status_code=404, detail="Order not found")
     return order
 
+# ============ ANALYTICS ENDPOINTS ============
+
+# Dashboards read daily summaries; ANALYTICS_REFRESH_INTERVAL=0 turns off background refresh
+sales_analytics = SalesAnalytics(
+    db.orders,
+    db.order_daily_summary,
+    refresh_interval=float(os.environ.get('ANALYTICS_REFRESH_INTERVAL', 300)),
+)
+
+@lru_cache(maxsize=1)
+def product_categories(version: int) -> pd.Series:
+    """Product id -> category for the given catalog version"""
+    products = registry.index.products
+    return pd.Series([p["category"] for p in products], index=[p["id"] for p in products])
+
+def day_bounds(start: Optional[date], end: Optional[date]):
+    if start and end and start > end:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    return (start.isoformat() if start else None, end.isoformat() if end else None)
+
+@api_router.get("/analytics/revenue-by-day")
+async def revenue_by_day(start: Optional[date] = None, end: Optional[date] = None):
+    """Orders, revenue and average order value per day"""
+    frame = await sales_analytics.daily(*day_bounds(start, end))
+    return frame_records(frame)
+
+@api_router.get("/analytics/revenue-by-category")
+async def revenue_by_category(start: Optional[date] = None, end: Optional[date] = None):
+    """Units sold and revenue per category"""
+    frame = await sales_analytics.by_category(product_categories(registry.version), *day_bounds(start, end))
+    return frame_records(frame)
+
+@api_router.get("/analytics/top-products")
+async def top_products(
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    limit: int = Query(10, ge=1, le=100)
+):
+    """Best-selling products by revenue"""
+    frame = await sales_analytics.products(*day_bounds(start, end), limit=limit)
+    records = frame_records(frame)
+    for record, product in zip(records, registry.get_many(r["product_id"] for r in records)):
+        record["name"] = product["name"] if product else None
+        record["category"] = product["category"] if product else None
+    return records
+
+@api_router.get("/analytics/average-order-value")
+async def average_order_value(start: Optional[date] = None, end: Optional[date] = None):
+    """Order count, revenue and average order value over the range"""
+    return await sales_analytics.overview(*day_bounds(start, end))
+
+@api_router.post("/analytics/refresh")
+async def refresh_analytics():
+    """Bring the daily summaries up to date now"""
+    since = await sales_analytics.refresh()
+    return {"refreshed_from": since}
+
 # ============ RAZORPAY READY ENDPOINTS (DISABLED) ============
 
 # Uncomment and configure when ready to accept payments
@@ -543,18 +995,99 @@ async def root():
 async def create_status_check(input: StatusCheckCreate):
     status_dict = input.model_dump()
     status_obj = StatusCheck(**status_dict)
-    doc = status_obj.model_dump()
-    doc['timestamp'] = doc['timestamp'].isoformat()
-    await db.status_checks.insert_one(doc)
+    # timestamp stays a native datetime so it is stored as a BSON date
+    await db.status_checks.insert_one(status_obj.model_dump())
     return status_obj
 
+# Flush streamed responses in chunks of roughly this many bytes
+STREAM_CHUNK_BYTES = 64 * 1024
+
+def encode_status_check(doc: dict) -> bytes:
+    timestamp = doc.get("timestamp")
+    # Motor returns naive UTC datetimes
+    if isinstance(timestamp, datetime) and timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return encode_as({"id": doc.get("id"), "client_name": doc.get("client_name"), "timestamp": timestamp}, StatusCheck)
+
+async def stream_json(cursor, encode, ndjson: bool) -> AsyncIterator[bytes]:
+    """Encode documents from a Motor cursor as a JSON array or NDJSON, chunk by chunk"""
+    buffer = bytearray() if ndjson else bytearray(b"[")
+    first = True
+    async for doc in cursor:
+        if ndjson:
+            buffer += encode(doc)
+            buffer += b"\n"
+        else:
+            if not first:
+                buffer += b","
+            buffer += encode(doc)
+        first = False
+        if len(buffer) >= STREAM_CHUNK_BYTES:
+            yield bytes(buffer)
+            buffer.clear()
+    if not ndjson:
+        buffer += b"]"
+    if buffer:
+        yield bytes(buffer)
+
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find({}, {"_id": 0}).to_list(1000)
-    for check in status_checks:
-        if isinstance(check['timestamp'], str):
-            check['timestamp'] = datetime.fromisoformat(check['timestamp'])
-    return status_checks
+async def get_status_checks(
+    after: Optional[datetime] = None,
+    after_id: Optional[str] = None,
+    before: Optional[datetime] = None,
+    limit: int = Query(1000, ge=1, le=1_000_000),
+    format: Literal["json", "ndjson"] = "json"
+):
+    """Stream status checks in (timestamp, id) order
+
+    To fetch the next page, pass the last record's timestamp as ``after``
+    and its id as ``after_id``. ``format=ndjson`` returns one object per line.
+    """
+    if after_id is not None and after is None:
+        raise HTTPException(status_code=422, detail="after_id requires after")
+    query = {}
+    if after is not None and after_id is not None:
+        query["$or"] = [{"timestamp": {"$gt": after}}, {"timestamp": after, "id": {"$gt": after_id}}]
+    elif after is not None:
+        query["timestamp"] = {"$gt": after}
+    if before is not None:
+        query = {"$and": [query, {"timestamp": {"$lt": before}}]} if query else {"timestamp": {"$lt": before}}
+
+    cursor = (
+        db.status_checks.find(query, {"_id": 0})
+        .sort([("timestamp", 1), ("id", 1)])
+        .limit(limit)
+        .batch_size(500)
+    )
+    ndjson = format == "ndjson"
+    return StreamingResponse(
+        stream_json(cursor, encode_status_check, ndjson),
+        media_type="application/x-ndjson" if ndjson else "application/json",
+    )
+
+# ============ DIAGNOSTICS ============
+
+@api_router.get("/metrics")
+async def get_metrics():
+    """Request, Mongo and in-process timings in Prometheus text format"""
+    return Response(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@api_router.get("/diagnostics/query-plans")
+async def get_query_plans():
+    """Explain the app's queries and flag any that scan a whole collection"""
+    report = await explain_app_queries(db)
+    return {"collscans": [r["query"] for r in report if r["collscan"]], "queries": report}
+
+@api_router.get("/health/live")
+async def liveness():
+    """The process is up and serving requests"""
+    return {"status": "alive"}
+
+@api_router.get("/health/ready")
+async def readiness_check():
+    """503 until warmup has finished, so load balancers hold traffic until then"""
+    ready = all(readiness.values())
+    return JSONResponse({"status": "ready" if ready else "warming", **readiness}, status_code=200 if ready else 503)
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -565,14 +1098,98 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "Idempotent-Replayed"],
 )
 
+# PROFILE_SLOW_REQUESTS_MS=<n> samples the event loop and dumps stacks of slower requests
+profile_threshold_ms = float(os.environ.get('PROFILE_SLOW_REQUESTS_MS', 0))
+profiler = SlowRequestProfiler(
+    threshold=profile_threshold_ms / 1000,
+    out_dir=Path(os.environ.get('PROFILE_DIR', ROOT_DIR / 'profiles')),
+    interval=float(os.environ.get('PROFILE_INTERVAL_MS', 5)) / 1000,
+) if profile_threshold_ms > 0 else None
+
+# Outermost, so it times everything including CORS handling
+app.add_middleware(MetricsMiddleware, profiler=profiler)
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
+# ============ LIFECYCLE ============
+
+# Catalog responses rendered during warmup, before the pod reports ready,
+# along with one listing per category
+WARM_PRODUCT_QUERIES = [{}, {"featured": True}]
+
+readiness = {"catalog": False, "response_cache": False, "mongo": False}
+warmup_task: Optional[asyncio.Task] = None
+
+async def retry_until_done(job, description: str):
+    """Await job() until it succeeds, backing off between attempts"""
+    delay = 0.5
+    while True:
+        try:
+            return await job()
+        except Exception as e:
+            logger.warning("%s not available yet (%s); retrying in %.1fs", description, e, delay)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+async def warm_up():
+    """Build the catalog index, prime the response cache and connect to Mongo"""
+    if catalog_reloader is None:
+        await asyncio.to_thread(registry.warm)
+    else:
+        await retry_until_done(catalog_reloader.reload, f"Catalog from {catalog_reloader}")
+        await catalog_reloader.start()
+    readiness["catalog"] = True
+
+    request = Request({"type": "http", "method": "GET", "headers": [], "query_string": b""})
+    await get_categories(request)
+    for query in WARM_PRODUCT_QUERIES + [{"category": c["id"]} for c in registry.categories]:
+        params = {"category": None, "min_price": None, "max_price": None, "search": None,
+                  "featured": None, "sort": None, "limit": None, "cursor": None, "fields": None}
+        params.update(query)
+        await get_products(request, **params)
+    readiness["response_cache"] = True
+
+    await retry_until_done(db.connect, "MongoDB")
+    await retry_until_done(cart_store.ensure_indexes, "Cart store indexes")
+    if os.environ.get('ENSURE_INDEXES', 'true').lower() in ('1', 'true', 'yes'):
+        try:
+            await ensure_indexes(db)
+            await migrate_status_timestamps(db)
+        except Exception:
+            logger.exception("Could not create MongoDB indexes")
+    readiness["mongo"] = True
+    logger.info("Warmup complete, ready for traffic")
+
+async def start_background_services():
+    global warmup_task
+    if profiler is not None:
+        profiler.start()
+    warmup_task = asyncio.create_task(warm_up())
+    await cart_store.start()
+    if inventory is not None:
+        await inventory.start()
+    if order_queue is not None:
+        await order_queue.start()
+    await sales_analytics.start()
+
+async def stop_background_services():
+    if warmup_task is not None:
+        warmup_task.cancel()
+    if catalog_reloader is not None:
+        await catalog_reloader.close()
+    await sales_analytics.close()
+    await cart_store.close()
+    if inventory is not None:
+        await inventory.close()
+    if order_queue is not None:
+        await order_queue.close()
+    db.close()
+    if profiler is not None:
+        profiler.stop()
@@ -14,6 +14,8 @@ const Payment = () => {
   const navigate = useNavigate();
   const { clearCart, cart } = useCart();
   const [processing, setProcessing] = useState(false);
+  // One key per checkout, so retries and double submits place a single order
+  const [idempotencyKey] = useState(() => crypto.randomUUID());
 
   // If accessed directly without state, redirect to cart
   if (!state || !state.formData) {
@@ -35,6 +37,8 @@ const Payment = () => {
       const orderResponse = await axios.post(`${API}/orders`, {
         customer: formData,
         cart_id: cartId
+      }, {
+        headers: { 'Idempotency-Key': idempotencyKey }
       });
 
       const orderId = orderResponse.data.id;
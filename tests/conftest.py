@@ -0,0 +1,119 @@
+import os
+import random
+import sys
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import List
+
+import httpx
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+CATEGORIES = ["living-room", "bedroom", "office", "dining"]
+NAMES = ["Velvet Sofa", "Oak Table", "Royal Bed", "Desk Lamp", "Noir Chair", "Brass Mirror"]
+MATERIALS = ["Italian Velvet", "Solid Oak", "Brass", "Walnut Wood", None]
+
+
+def make_catalog(n: int, seed: int = 7) -> List[dict]:
+    """Products shaped like validated catalog entries, with plenty of price and name ties"""
+    rng = random.Random(seed)
+    products = []
+    for i in range(n):
+        image = f"https://images.example.com/{i}.jpg"
+        products.append({
+            "id": f"prod-{i}",
+            "name": f"{rng.choice(NAMES)} {i % 7}",
+            "description": f"Handcrafted {rng.choice(['modern', 'classic', 'rustic'])} piece.",
+            "price": float(rng.randrange(1000, 20000, 1000)),
+            "category": rng.choice(CATEGORIES),
+            "image": image,
+            "images": [image],
+            "dimensions": f"{rng.randint(40, 250)}cm" if rng.random() < 0.8 else None,
+            "material": rng.choice(MATERIALS),
+            "in_stock": rng.random() < 0.9,
+            "featured": rng.random() < 0.2,
+        })
+    return products
+
+
+def make_orders(n: int, products: List[dict], seed: int = 7) -> List[dict]:
+    """Stored order documents spread over a few days and customers, newest last"""
+    rng = random.Random(seed)
+    start = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    orders = []
+    for i in range(n):
+        lines = rng.sample(products, rng.randint(1, 3))
+        items = [
+            {"product_id": p["id"], "name": p["name"], "price": p["price"], "image": p["image"],
+             "quantity": rng.randint(1, 3)}
+            for p in lines
+        ]
+        email = f"customer{i % 5}@example.com"
+        orders.append({
+            "id": f"order-{i:04d}",
+            "customer": {
+                "full_name": f"Customer {i % 5}", "email": email, "phone": "9999999999",
+                "address": "1 Main Road", "city": "Pune", "state": "MH", "pincode": "411001",
+            },
+            "items": items,
+            "total": round(sum(item["price"] * item["quantity"] for item in items), 2),
+            "status": rng.choice(["pending", "shipped"]),
+            "payment_status": rng.choice(["unpaid", "paid"]),
+            # Every third order shares its timestamp with the one before
+            "created_at": (start + timedelta(hours=7 * (i - (i % 3 == 2)))).isoformat(),
+        })
+    return orders
+
+
+def brute_force(products, category=None, min_price=None, max_price=None, featured=None, sort=None):
+    """Reference filter: scan everything, then a stable sort"""
+    matches = [
+        p for p in products
+        if (not category or p["category"] == category)
+        and (min_price is None or p["price"] >= min_price)
+        and (max_price is None or p["price"] <= max_price)
+        and (featured is None or p["featured"] == featured)
+    ]
+    if sort:
+        field = sort.lstrip("-")
+        key = (lambda p: p["price"]) if field == "price" else (lambda p: p["name"].lower())
+        matches = sorted(matches, key=key)
+        if sort.startswith("-"):
+            matches.reverse()
+    return matches
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def catalog() -> List[dict]:
+    return make_catalog(300)
+
+
+@pytest.fixture(scope="session")
+def server():
+    """The app module, imported once with in-process settings"""
+    for name, value in {
+        "MONGO_URL": "mongodb://localhost:27017",
+        "DB_NAME": "api_test",
+        "CART_STORE": "memory",
+        "ENSURE_INDEXES": "0",
+        "ANALYTICS_REFRESH_INTERVAL": "0",
+    }.items():
+        os.environ.setdefault(name, value)
+    import server
+    return server
+
+
+@pytest.fixture
+async def api(server):
+    """HTTP client for the app, started against a fresh mongomock database"""
+    server.db.bind(AsyncMongoMockClient()["api_test"])
+    async with server.app.router.lifespan_context(server.app):
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+            yield client
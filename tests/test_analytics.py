@@ -0,0 +1,128 @@
+from collections import defaultdict
+
+import pandas as pd
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from analytics import SalesAnalytics, day_range, frame_records
+from tests.conftest import make_orders
+
+
+def summarize(orders):
+    """Reference daily summaries, as the refresh pipelines would write them"""
+    days = {}
+    for order in orders:
+        day = days.setdefault(order["created_at"][:10], {"orders": 0, "revenue": 0.0, "items": 0, "products": {}})
+        day["orders"] += 1
+        day["revenue"] += order["total"]
+        for item in order["items"]:
+            day["items"] += item["quantity"]
+            line = day["products"].setdefault(item["product_id"], {"quantity": 0, "revenue": 0.0})
+            line["quantity"] += item["quantity"]
+            line["revenue"] += item["price"] * item["quantity"]
+    return [
+        {"_id": d, "orders": s["orders"], "revenue": s["revenue"], "items": s["items"],
+         "products": [{"product_id": p, **line} for p, line in s["products"].items()]}
+        for d, s in sorted(days.items())
+    ]
+
+
+@pytest.fixture
+def orders(catalog):
+    return make_orders(60, catalog)
+
+
+@pytest.fixture
+async def analytics(orders):
+    db = AsyncMongoMockClient()["analytics_test"]
+    await db.order_daily_summary.insert_many(summarize(orders))
+    return SalesAnalytics(db.orders, db.order_daily_summary)
+
+
+def test_day_range():
+    assert day_range() == {}
+    assert day_range("2024-03-02", "2024-03-04") == {"_id": {"$gte": "2024-03-02", "$lte": "2024-03-04"}}
+
+
+@pytest.mark.anyio
+async def test_daily_figures(analytics, orders):
+    frame = await analytics.daily("2024-03-02", "2024-03-04")
+    days = [d for d in summarize(orders) if "2024-03-02" <= d["_id"] <= "2024-03-04"]
+    assert list(frame["day"]) == [d["_id"] for d in days]
+    assert list(frame["orders"]) == [d["orders"] for d in days]
+    assert frame["average_order_value"].round(6).tolist() == [round(d["revenue"] / d["orders"], 6) for d in days]
+    # No summaries in range is an empty frame, not a division by zero
+    assert (await analytics.daily("2030-01-01")).empty
+
+
+@pytest.mark.anyio
+async def test_products_and_categories(analytics, orders, catalog):
+    revenue = defaultdict(float)
+    for order in orders:
+        for item in order["items"]:
+            revenue[item["product_id"]] += item["price"] * item["quantity"]
+    top = await analytics.products(limit=5)
+    best = sorted(revenue.items(), key=lambda kv: (-kv[1], kv[0]))[:5]
+    assert list(top["product_id"]) == [p for p, _ in best]
+
+    categories = pd.Series({p["id"]: p["category"] for p in catalog})
+    by_category = defaultdict(float)
+    for product_id, amount in revenue.items():
+        by_category[categories[product_id]] += amount
+    frame = await analytics.by_category(categories)
+    assert dict(zip(frame["category"], frame["revenue"].round(2))) == {c: round(v, 2) for c, v in by_category.items()}
+    assert list(frame["revenue"]) == sorted(frame["revenue"], reverse=True)
+    # Products missing from the catalog fall under "unknown"
+    assert list((await analytics.by_category(pd.Series(dtype=object)))["category"]) == ["unknown"]
+
+
+@pytest.mark.anyio
+async def test_overview(analytics, orders):
+    overview = await analytics.overview()
+    revenue = sum(o["total"] for o in orders)
+    assert overview["orders"] == len(orders)
+    assert overview["revenue"] == round(revenue, 2)
+    assert overview["average_order_value"] == round(revenue / len(orders), 2)
+    assert (await analytics.overview("2030-01-01"))["average_order_value"] == 0.0
+
+
+def test_frame_records_round_money_and_counts():
+    frame = pd.DataFrame({"day": ["2024-03-01"], "orders": [2.0], "revenue": [10.005], "average_order_value": [5.0025]})
+    assert frame_records(frame) == [{"day": "2024-03-01", "orders": 2, "revenue": 10.01, "average_order_value": 5.0}]
+
+
+class RecordingOrders:
+    """Orders collection that records aggregation pipelines instead of running them"""
+
+    def __init__(self):
+        self.pipelines = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        return self
+
+    async def to_list(self, length):
+        return []
+
+
+@pytest.mark.anyio
+async def test_refresh_starts_from_the_latest_summarized_day(analytics):
+    recording = RecordingOrders()
+    analytics.orders = recording
+    assert await analytics.refresh() == "2024-03-17"
+    assert [p[0] for p in recording.pipelines] == [{"$match": {"created_at": {"$gte": "2024-03-17"}}}] * 2
+    assert all(p[-1]["$merge"]["into"] == "order_daily_summary" for p in recording.pipelines)
+
+    await analytics.summaries.delete_many({})
+    recording.pipelines.clear()
+    assert await analytics.refresh() is None
+    assert recording.pipelines[0][0] == {"$match": {}}
+
+
+@pytest.mark.anyio
+async def test_analytics_endpoints(api, server, orders):
+    await server.db.order_daily_summary.insert_many(summarize(orders))
+    days = (await api.get("/api/analytics/revenue-by-day", params={"start": "2024-03-02", "end": "2024-03-03"})).json()
+    assert [d["day"] for d in days] == ["2024-03-02", "2024-03-03"]
+    assert (await api.get("/api/analytics/average-order-value")).json()["orders"] == len(orders)
+    assert (await api.get("/api/analytics/revenue-by-day", params={"start": "2024-03-05", "end": "2024-03-01"})).status_code == 400
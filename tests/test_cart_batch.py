@@ -0,0 +1,96 @@
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from cart_store import CachedCartStore, CartConflictError, CartState, InMemoryCartStore, MongoCartStore, apply_operations
+
+SOFA = {"id": "prod-1", "name": "Sofa", "price": 1899.99, "image": "sofa.jpg"}
+LAMP = {"id": "prod-2", "name": "Lamp", "price": 0.1, "image": "lamp.jpg"}
+
+OPERATIONS = [
+    ("add", SOFA["id"], 2, SOFA),
+    ("add", "missing", 1, None),
+    ("update", SOFA["id"], 1, SOFA),
+    ("remove", LAMP["id"], 0, LAMP),
+    ("add", LAMP["id"], 0, LAMP),
+    ("add", LAMP["id"], 4, LAMP),
+    ("swap", LAMP["id"], 1, LAMP),
+]
+ERRORS = [None, "Product not found", None, "Item not in cart", "Quantity must be positive", None,
+          "Unknown operation: swap"]
+
+
+def test_apply_operations_reports_errors_per_operation():
+    cart = CartState()
+    assert apply_operations(cart, OPERATIONS) == ERRORS
+    cart.verify()
+    assert {p: line.quantity for p, line in cart.lines.items()} == {SOFA["id"]: 1, LAMP["id"]: 4}
+    assert cart.total_paise == 190039
+
+
+@pytest.fixture
+def db():
+    return AsyncMongoMockClient()["carts_test"]
+
+
+@pytest.fixture(params=["memory", "mongo", "cached"])
+async def store(request, db):
+    if request.param == "memory":
+        store = InMemoryCartStore(check_consistency=True)
+    elif request.param == "mongo":
+        store = MongoCartStore(db.carts, check_consistency=True)
+    else:
+        store = CachedCartStore(MongoCartStore(db.carts), flush_interval=3600, check_consistency=True)
+    await store.start()
+    yield store
+    await store.close()
+
+
+@pytest.mark.anyio
+async def test_apply_batch(store):
+    cart_id = (await store.create())["id"]
+    cart, errors = await store.apply_batch(cart_id, OPERATIONS)
+    assert errors == ERRORS
+    assert cart["total"] == 1900.39
+    assert await store.get(cart_id) == cart
+    assert await store.apply_batch("missing", OPERATIONS) is None
+
+
+class RacingCollection:
+    """Wraps a collection so every guarded replace loses to another writer"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+    async def replace_one(self, query, doc):
+        await self.collection.update_one({"id": query["id"]}, {"$inc": {"rev": 1}})
+        return await self.collection.replace_one(query, doc)
+
+
+@pytest.mark.anyio
+async def test_mongo_batch_gives_up_under_constant_contention(db):
+    store = MongoCartStore(RacingCollection(db.carts))
+    cart_id = (await store.create())["id"]
+    with pytest.raises(CartConflictError):
+        await store.apply_batch(cart_id, OPERATIONS)
+
+
+@pytest.mark.anyio
+async def test_batch_endpoint(api, server, monkeypatch):
+    cart_id = (await api.post("/api/cart/create")).json()["id"]
+    product_id = (await api.get("/api/products", params={"limit": 1})).json()[0]["id"]
+    response = await api.post(f"/api/cart/{cart_id}/batch", json={"operations": [
+        {"op": "add", "product_id": product_id, "quantity": 3},
+        {"op": "remove", "product_id": "missing"},
+    ]})
+    body = response.json()
+    assert [r["ok"] for r in body["results"]] == [True, False]
+    assert body["cart"]["items"][0]["quantity"] == 3
+    assert (await api.post("/api/cart/missing/batch", json={"operations": []})).status_code == 404
+
+    async def conflict(*args):
+        raise CartConflictError("kept changing")
+    monkeypatch.setattr(server.cart_store, "apply_batch", conflict)
+    assert (await api.post(f"/api/cart/{cart_id}/batch", json={"operations": []})).status_code == 409
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+
+import pytest
+
+import cart_store
+from cart_store import CartLru, CartState, InMemoryCartStore
+from periodic import run_periodically
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cart_store.time, "monotonic", clock)
+    return clock
+
+
+def test_idle_carts_expire(clock):
+    carts = CartLru(capacity=10, ttl=60)
+    for cart_id in ("a", "b", "c"):
+        carts.put(CartState(cart_id))
+        clock.now += 20
+    # "a" is 60s idle, "b" 40s; touching "b" keeps it
+    carts.get("b")
+    clock.now += 1
+    assert carts.get("a") is None
+    assert carts.get("b") is not None
+    clock.now += 50
+    assert carts.sweep() == 1
+    assert list(carts.carts) == ["b"]
+    assert carts.stats()["expired_total"] == 2
+
+
+def test_least_recently_used_cart_is_evicted(clock):
+    carts = CartLru(capacity=2)
+    carts.put(CartState("a"))
+    carts.put(CartState("b"))
+    carts.get("a")
+    carts.put(CartState("c"))
+    assert list(carts.carts) == ["a", "c"]
+    assert carts.evicted == 1
+    # Without a ttl nothing ever expires
+    clock.now += 10 ** 9
+    assert carts.sweep() == 0 and carts.get("a") is not None
+
+
+def test_stats_count_lines_and_bytes():
+    carts = CartLru(capacity=10)
+    cart = CartState()
+    cart.add({"id": "p", "name": "Lamp", "price": 1.0, "image": "i"}, 2)
+    carts.put(cart)
+    stats = carts.stats()
+    assert (stats["carts"], stats["lines"]) == (1, 1)
+    assert stats["approx_bytes"] > 0
+
+
+@pytest.mark.anyio
+async def test_memory_store_sweeps_in_the_background():
+    store = InMemoryCartStore(ttl=0.01, sweep_interval=0.01)
+    await store.start()
+    try:
+        await store.create()
+        for _ in range(100):
+            if not len(store.carts):
+                break
+            await asyncio.sleep(0.01)
+        assert len(store.carts) == 0 and store.carts.expired == 1
+    finally:
+        await store.close()
+
+
+@pytest.mark.anyio
+async def test_run_periodically_logs_failures_and_keeps_going(caplog):
+    calls = []
+
+    async def job():
+        calls.append(None)
+        if len(calls) == 1:
+            raise ValueError("boom")
+
+    with caplog.at_level(logging.ERROR, logger="periodic"):
+        task = asyncio.create_task(run_periodically(0.001, job, "Test job"))
+        while len(calls) < 3:
+            await asyncio.sleep(0.001)
+        task.cancel()
+    assert "Test job failed" in caplog.text
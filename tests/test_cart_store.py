@@ -0,0 +1,118 @@
+import asyncio
+import logging
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from cart_store import CachedCartStore, CartConflictError, InMemoryCartStore, MongoCartStore, create_cart_store
+
+SOFA = {"id": "prod-1", "name": "Sofa", "price": 1899.99, "image": "sofa.jpg"}
+LAMP = {"id": "prod-2", "name": "Lamp", "price": 0.1, "image": "lamp.jpg"}
+
+
+@pytest.fixture
+def db():
+    return AsyncMongoMockClient()["carts_test"]
+
+
+@pytest.fixture(params=["memory", "cached"])
+async def store(request, db):
+    if request.param == "memory":
+        store = InMemoryCartStore(check_consistency=True)
+    else:
+        store = CachedCartStore(MongoCartStore(db.carts), flush_interval=3600, check_consistency=True)
+    await store.start()
+    yield store
+    await store.close()
+
+
+@pytest.mark.anyio
+async def test_cart_lifecycle(store):
+    cart_id = (await store.create())["id"]
+    assert await store.get(cart_id) == {"id": cart_id, "items": [], "total": 0}
+    await store.add_item(cart_id, SOFA, 1)
+    cart = await store.add_item(cart_id, LAMP, 2)
+    assert [(i["product_id"], i["quantity"]) for i in cart["items"]] == [("prod-1", 1), ("prod-2", 2)]
+    cart = await store.remove_item(cart_id, SOFA["id"])
+    assert [i["product_id"] for i in cart["items"]] == ["prod-2"]
+    assert (await store.clear(cart_id))["items"] == []
+
+
+@pytest.mark.anyio
+async def test_missing_cart(store):
+    assert await store.get("missing") is None
+    assert await store.add_item("missing", SOFA, 1) is None
+    assert await store.remove_item("missing", SOFA["id"]) is None
+    assert await store.clear("missing") is None
+
+
+@pytest.mark.anyio
+async def test_cached_store_writes_carts_back(db):
+    store = CachedCartStore(MongoCartStore(db.carts), flush_interval=3600)
+    cart_id = (await store.create())["id"]
+    await store.add_item(cart_id, SOFA, 2)
+    assert await db.carts.find_one({"id": cart_id}) is None
+    await store.flush()
+    assert (await db.carts.find_one({"id": cart_id}))["items"][0]["quantity"] == 2
+    # A fresh process loads the cart from Mongo
+    assert (await CachedCartStore(MongoCartStore(db.carts)).get(cart_id))["items"][0]["quantity"] == 2
+
+
+class FailingCollection:
+    async def bulk_write(self, requests, ordered=True):
+        raise ConnectionError("mongo unavailable")
+
+
+@pytest.mark.anyio
+async def test_failed_batch_flush_is_logged_and_retried(caplog):
+    store = CachedCartStore(MongoCartStore(FailingCollection()), batch_size=1)
+    with caplog.at_level(logging.ERROR, logger="cart_store"):
+        cart_id = (await store.create())["id"]
+        await asyncio.gather(*store._flushes, return_exceptions=True)
+    assert "Cart write-back failed" in caplog.text
+    assert not store._flushes
+    # The cart stays pending for the next flush
+    assert cart_id in store.pending
+
+
+class ConflictingStore(MongoCartStore):
+    """Every guarded update loses the race to another writer"""
+
+    async def _update(self, query, update):
+        return None
+
+
+@pytest.mark.anyio
+async def test_mongo_add_item_raises_when_it_keeps_conflicting(db):
+    store = ConflictingStore(db.carts)
+    cart_id = (await store.create())["id"]
+    with pytest.raises(CartConflictError):
+        await store.add_item(cart_id, SOFA, 1)
+
+
+def test_unknown_store_kind(db):
+    with pytest.raises(ValueError):
+        create_cart_store("redis", db)
+
+
+@pytest.mark.anyio
+async def test_cart_endpoints(api):
+    cart_id = (await api.post("/api/cart/create")).json()["id"]
+    product_id = (await api.get("/api/products", params={"limit": 1})).json()[0]["id"]
+    cart = (await api.post(f"/api/cart/{cart_id}/add", json={"product_id": product_id, "quantity": 2})).json()
+    assert cart["items"][0]["quantity"] == 2
+    assert (await api.get(f"/api/cart/{cart_id}")).json() == cart
+    assert (await api.post("/api/cart/missing/add", json={"product_id": product_id, "quantity": 1})).status_code == 404
+    assert (await api.post(f"/api/cart/{cart_id}/add", json={"product_id": "missing", "quantity": 1})).status_code == 404
+
+
+@pytest.mark.anyio
+async def test_add_conflict_is_a_409(api, server, monkeypatch):
+    cart_id = (await api.post("/api/cart/create")).json()["id"]
+    product_id = (await api.get("/api/products", params={"limit": 1})).json()[0]["id"]
+
+    async def conflict(*args):
+        raise CartConflictError("kept changing")
+    monkeypatch.setattr(server.cart_store, "add_item", conflict)
+    response = await api.post(f"/api/cart/{cart_id}/add", json={"product_id": product_id, "quantity": 1})
+    assert response.status_code == 409
@@ -0,0 +1,106 @@
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from cart_store import CachedCartStore, CartConsistencyError, CartState, InMemoryCartStore, MongoCartStore
+
+SOFA = {"id": "prod-1", "name": "Sofa", "price": 1899.99, "image": "sofa.jpg"}
+LAMP = {"id": "prod-2", "name": "Lamp", "price": 0.1, "image": "lamp.jpg"}
+# The same product after a catalog reload changed its price
+SOFA_REPRICED = {**SOFA, "price": 10.0}
+
+
+def expected_total(cart: dict) -> float:
+    return round(sum(round(i["price"] * 100) * i["quantity"] for i in cart["items"]) / 100, 2)
+
+
+def test_total_is_kept_in_paise():
+    cart = CartState()
+    for _ in range(3):
+        cart.add(LAMP, 1)
+    assert cart.total_paise == 30
+    assert cart.to_dict()["total"] == 0.3
+
+
+def test_mutations_adjust_the_running_total():
+    cart = CartState()
+    cart.add(SOFA, 2)
+    cart.add(LAMP, 5)
+    cart.set_quantity(SOFA["id"], 1)
+    cart.set_quantity(LAMP["id"], 0)
+    assert list(cart.lines) == [SOFA["id"]]
+    cart.verify()
+    assert cart.total_paise == 189999
+    cart.remove(SOFA["id"])
+    cart.remove(SOFA["id"])
+    assert cart.total_paise == 0
+
+
+def test_existing_line_keeps_its_price_after_a_reload():
+    cart = CartState()
+    cart.add(SOFA, 1)
+    cart.add(SOFA_REPRICED, 1)
+    cart.verify()
+    line = cart.to_dict()["items"][0]
+    assert (line["price"], line["quantity"]) == (SOFA["price"], 2)
+    assert cart.total_paise == 379998
+
+
+def test_verify_catches_a_drifted_total():
+    cart = CartState()
+    cart.add(SOFA, 1)
+    cart.total_paise += 1
+    with pytest.raises(CartConsistencyError):
+        cart.verify()
+
+
+@pytest.fixture
+def db():
+    return AsyncMongoMockClient()["carts_test"]
+
+
+@pytest.fixture(params=["memory", "cached"])
+async def store(request, db):
+    if request.param == "memory":
+        store = InMemoryCartStore(check_consistency=True)
+    else:
+        store = CachedCartStore(MongoCartStore(db.carts), flush_interval=3600, check_consistency=True)
+    await store.start()
+    yield store
+    await store.close()
+
+
+@pytest.mark.anyio
+async def test_store_totals_survive_price_reload(store):
+    cart_id = (await store.create())["id"]
+    await store.add_item(cart_id, SOFA, 1)
+    await store.add_item(cart_id, LAMP, 3)
+    cart = await store.add_item(cart_id, SOFA_REPRICED, 1)
+    assert cart["total"] == expected_total(cart) == 3800.28
+    cart = await store.set_quantity(cart_id, SOFA["id"], 1)
+    assert cart["total"] == expected_total(cart)
+    cart = await store.remove_item(cart_id, LAMP["id"])
+    assert cart["total"] == SOFA["price"]
+
+
+@pytest.mark.anyio
+async def test_mongo_store_increments_at_the_stored_line_price(db):
+    store = MongoCartStore(db.carts, check_consistency=True)
+    cart = CartState("cart-1")
+    cart.add(SOFA, 1)
+    await db.carts.insert_one({**cart.to_doc(), "rev": 0})
+
+    result = await store.add_item("cart-1", SOFA_REPRICED, 1)
+    assert [(i["price"], i["quantity"]) for i in result["items"]] == [(SOFA["price"], 2)]
+    assert result["total"] == 3799.98
+    result = await store.add_item("cart-1", SOFA, 1)
+    assert result["total"] == expected_total(result) == 5699.97
+
+
+@pytest.mark.anyio
+async def test_consistency_check_catches_a_drifted_stored_total(db):
+    store = MongoCartStore(db.carts, check_consistency=True)
+    cart = CartState("cart-1")
+    cart.add(SOFA, 1)
+    await db.carts.insert_one({**cart.to_doc(), "total_paise": 1, "rev": 0})
+    with pytest.raises(CartConsistencyError):
+        await store.add_item("cart-1", SOFA, 1)
@@ -0,0 +1,39 @@
+import pytest
+
+from catalog import CatalogIndex
+from tests.conftest import brute_force
+
+FILTERS = [
+    {},
+    {"category": "office"},
+    {"category": "missing"},
+    {"min_price": 5000},
+    {"max_price": 8000},
+    {"min_price": 20000},
+    {"min_price": 9000, "max_price": 3000},
+    {"min_price": 4000, "max_price": 12000, "category": "bedroom"},
+    {"featured": True},
+    {"featured": False, "min_price": 15000},
+]
+
+
+@pytest.fixture
+def index(catalog):
+    return CatalogIndex(catalog)
+
+
+@pytest.mark.parametrize("query", FILTERS)
+def test_filter_matches_brute_force(index, catalog, query):
+    assert [p["id"] for p in index.filter(**query)] == [p["id"] for p in brute_force(catalog, **query)]
+
+
+@pytest.mark.parametrize("query", FILTERS)
+def test_filter_positions_are_in_catalog_order(index, query):
+    positions = index.filter_positions(**query)
+    assert positions == sorted(positions)
+
+
+def test_price_bounds_are_inclusive(index, catalog):
+    lo, hi = index.price_bounds(5000, 5000)
+    assert sorted(index.price_order[lo:hi]) == [i for i, p in enumerate(catalog) if p["price"] == 5000]
+
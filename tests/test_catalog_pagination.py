@@ -0,0 +1,104 @@
+import pytest
+
+from catalog import CatalogIndex
+from tests.conftest import brute_force
+
+FILTERS = [
+    {},
+    {"category": "office"},
+    {"category": "missing"},
+    {"min_price": 5000},
+    {"max_price": 8000},
+    {"min_price": 4000, "max_price": 12000, "category": "bedroom"},
+    {"featured": True},
+    {"featured": False, "min_price": 15000},
+]
+SORTS = [None, "price", "-price", "name", "-name"]
+LIMITS = [1, 7, 50]
+
+
+def all_pages(index, limit, **query):
+    """Follow next offsets from the first page to the last"""
+    products, offset, pages = [], 0, 0
+    while True:
+        page, offset = index.page(offset=offset, limit=limit, **query)
+        assert len(page) <= limit
+        products.extend(page)
+        pages += 1
+        if offset is None:
+            return products, pages
+        assert page, "a page before the last one was empty"
+
+
+@pytest.fixture
+def index(catalog):
+    return CatalogIndex(catalog)
+
+
+@pytest.mark.parametrize("query", FILTERS)
+@pytest.mark.parametrize("sort", SORTS)
+@pytest.mark.parametrize("limit", LIMITS)
+def test_pages_match_brute_force(index, catalog, query, sort, limit):
+    expected = brute_force(catalog, sort=sort, **query)
+    products, pages = all_pages(index, limit, sort=sort, **query)
+    assert [p["id"] for p in products] == [p["id"] for p in expected]
+    assert pages >= max(1, -(-len(expected) // limit))
+
+
+@pytest.mark.parametrize("query", FILTERS)
+def test_unpaged_filter_matches_brute_force(index, catalog, query):
+    products, next_offset = index.page(**query)
+    assert next_offset is None
+    assert [p["id"] for p in products] == [p["id"] for p in brute_force(catalog, **query)]
+
+
+@pytest.mark.parametrize("limit", LIMITS)
+def test_search_pages_follow_relevance_order(index, limit):
+    ranked = index.filter(search="oak", category="office")
+    assert ranked and all(p["category"] == "office" for p in ranked)
+    products, _ = all_pages(index, limit, search="oak", category="office")
+    assert [p["id"] for p in products] == [p["id"] for p in ranked]
+
+
+def test_sorted_search_pages(index, catalog):
+    matching = {p["id"] for p in index.filter(search="velvet")}
+    expected = [p for p in brute_force(catalog, sort="-price") if p["id"] in matching]
+    products, _ = all_pages(index, 5, search="velvet", sort="-price")
+    assert [p["id"] for p in products] == [p["id"] for p in expected]
+
+
+@pytest.mark.anyio
+async def test_cursor_walks_every_page(api, server):
+    expected = [p["id"] for p in server.registry.index.page(sort="price")[0]]
+    seen, params = [], {"sort": "price", "limit": 3, "fields": "id,price"}
+    while True:
+        response = await api.get("/api/products", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        assert all(set(p) == {"id", "price"} for p in page)
+        seen.extend(p["id"] for p in page)
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+        params = {**params, "cursor": cursor}
+    assert seen == expected
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("params", [
+    {"cursor": "not-a-cursor"},
+    {"fields": "id,secret"},
+    {"sort": "colour"},
+])
+async def test_bad_paging_parameters_are_rejected(api, params):
+    assert (await api.get("/api/products", params=params)).status_code == 400
+
+
+@pytest.mark.anyio
+async def test_cursor_must_match_sort_and_catalog(api, server):
+    first = await api.get("/api/products", params={"sort": "price", "limit": 2})
+    cursor = first.headers["x-next-cursor"]
+    assert (await api.get("/api/products", params={"sort": "name", "limit": 2, "cursor": cursor})).status_code == 400
+    server.registry.reload(server.registry.index.products, server.registry.categories)
+    expired = await api.get("/api/products", params={"sort": "price", "limit": 2, "cursor": cursor})
+    assert expired.status_code == 400 and "changed" in expired.json()["detail"]
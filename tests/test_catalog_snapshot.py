@@ -0,0 +1,123 @@
+import json
+import threading
+import time
+
+import pytest
+
+from catalog import CatalogIndex, ProductRegistry
+from catalog_snapshot import (
+    CatalogSnapshot, SnapshotCatalogIndex, SnapshotError, SnapshotFollower, SnapshotWriter, write_snapshot,
+)
+from serve import publish_catalog
+from tests.conftest import brute_force
+from tests.test_catalog_pagination import FILTERS, SORTS, all_pages
+
+
+@pytest.fixture
+def built(catalog):
+    categories = [{"id": "office", "name": "Office", "image": "office.jpg"}]
+    return CatalogIndex(catalog, version=3, categories=categories)
+
+
+@pytest.fixture
+def mapped(built, tmp_path):
+    return SnapshotCatalogIndex(CatalogSnapshot(write_snapshot(tmp_path / "catalog.snapshot", built)))
+
+
+def test_products_round_trip(built, mapped, catalog):
+    assert len(mapped) == len(catalog)
+    assert list(mapped.products) == catalog
+    assert mapped.products[-1] == catalog[-1]
+    assert mapped.products[10:13] == catalog[10:13]
+    assert mapped.version == 3
+    assert mapped.categories == built.categories
+
+
+def test_optional_fields_round_trip(tmp_path):
+    product = {
+        "id": "p", "name": "Ünïcode Sofa ✓", "description": "", "price": 0.5, "category": "c", "image": "",
+        "images": [], "dimensions": None, "material": "", "in_stock": False, "featured": True,
+    }
+    index = SnapshotCatalogIndex(CatalogSnapshot(write_snapshot(tmp_path / "s", CatalogIndex([product]))))
+    assert index.products[0] == product
+
+
+def test_lookups_and_indexes_match(built, mapped, catalog):
+    for product in catalog[::17]:
+        assert mapped.get(product["id"]) == product
+    assert mapped.get("prod-missing") is None
+    assert mapped.get_many(["prod-3", "nope", "prod-1"]) == built.get_many(["prod-3", "nope", "prod-1"])
+    assert {name: list(positions) for name, positions in mapped.by_category.items()} == built.by_category
+    assert list(mapped.price_order) == built.price_order
+    assert list(mapped.name_order) == built.name_order
+    assert list(mapped.featured_positions) == built.featured_positions
+
+
+@pytest.mark.parametrize("query", ["velvet", "oak desk", "cha", "modern chair", "nothing"])
+def test_search_scores_survive_the_round_trip(built, mapped, query):
+    assert mapped.search_index.search(query) == built.search_index.search(query)
+    assert mapped.search_index.expand(query.split()[0]) == built.search_index.expand(query.split()[0])
+
+
+def test_empty_catalog(tmp_path):
+    index = SnapshotCatalogIndex(CatalogSnapshot(write_snapshot(tmp_path / "s", CatalogIndex([]))))
+    assert len(index) == 0
+    assert index.page(limit=10) == ([], None)
+    assert index.get("a") is None
+
+
+def test_rejects_other_files(tmp_path):
+    path = tmp_path / "not-a-snapshot"
+    path.write_bytes(b"{}" * 16)
+    with pytest.raises(SnapshotError):
+        CatalogSnapshot(path)
+
+
+@pytest.mark.anyio
+async def test_follower_maps_each_published_snapshot(catalog, tmp_path):
+    path = tmp_path / "catalog.snapshot"
+    writer = SnapshotWriter(path)
+    writer.reload(catalog)
+    registry = ProductRegistry([], lazy=True)
+    follower = SnapshotFollower(registry, path)
+    assert await follower.reload() is True
+    assert await follower.reload() is False
+    assert len(registry.index) == len(catalog)
+
+    writer.reload(catalog[:5])
+    assert await follower.reload() is True
+    assert registry.version == 2
+    assert [p["id"] for p in registry.index.products] == [p["id"] for p in catalog[:5]]
+
+
+@pytest.mark.parametrize("query", FILTERS)
+@pytest.mark.parametrize("sort", SORTS)
+def test_pages_match_brute_force(mapped, catalog, query, sort):
+    expected = brute_force(catalog, sort=sort, **query)
+    products, _ = all_pages(mapped, 7, sort=sort, **query)
+    assert [p["id"] for p in products] == [p["id"] for p in expected]
+
+
+def test_publisher_follows_the_source_until_stopped(server, catalog, tmp_path, monkeypatch):
+    source = tmp_path / "catalog.json"
+    source.write_text(json.dumps(catalog))
+    monkeypatch.setenv("CATALOG_SOURCE", "file")
+    monkeypatch.setenv("CATALOG_FILE", str(source))
+    monkeypatch.setenv("CATALOG_POLL_INTERVAL", "0.05")
+    writer = SnapshotWriter(tmp_path / "catalog.snapshot")
+    ready, stop = threading.Event(), threading.Event()
+    publisher = threading.Thread(target=publish_catalog, args=(server, writer, ready, stop), daemon=True)
+    publisher.start()
+    try:
+        assert ready.wait(5)
+        assert writer.version == 1 and CatalogSnapshot(writer.path).count == len(catalog)
+
+        source.write_text(json.dumps(catalog[:5]))
+        deadline = time.monotonic() + 5
+        while writer.version == 1 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert writer.version == 2
+    finally:
+        stop.set()
+        publisher.join(5)
+    assert not publisher.is_alive()
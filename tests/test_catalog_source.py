@@ -0,0 +1,86 @@
+import functools
+import io
+import json
+
+import pytest
+
+import catalog_source
+from catalog import ProductRegistry
+from catalog_source import CatalogFileError, CatalogReloader, FileCatalogSource, read_catalog_file, read_ndjson
+
+CHUNK_SIZES = [1, 2, 3, 7, 64, 1 << 20]
+
+PRODUCTS = [
+    {"id": "p1", "name": "Canapé ✓", "price": 1999.5, "category": "living-room", "image": "a.jpg"},
+    {"id": "p2", "name": "Desk", "price": 12345678901234, "category": "office", "image": "b.jpg",
+     "images": ["b.jpg", "c.jpg"], "material": None},
+    {"id": "p3", "name": "Lamp \"Noir\"", "price": 0.25, "category": "office", "image": "d.jpg", "featured": True},
+]
+CATEGORIES = [{"id": "office", "name": "Office", "image": "o.jpg"}]
+
+
+@pytest.fixture(params=CHUNK_SIZES)
+def chunked(request, monkeypatch):
+    """read_json reading through windows of every size, so values straddle chunk boundaries"""
+    monkeypatch.setattr(catalog_source, "JSONStream",
+                        functools.partial(catalog_source.JSONStream, chunk_size=request.param))
+
+
+@pytest.mark.parametrize("document, expected", [
+    (PRODUCTS, (PRODUCTS, None)),
+    ({"products": PRODUCTS, "categories": CATEGORIES}, (PRODUCTS, CATEGORIES)),
+    ({"meta": {"source": [1, {"x": "]}"}]}, "products": PRODUCTS}, (PRODUCTS, None)),
+    ([], ([], None)),
+    ({}, ([], None)),
+])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_read_json_across_chunk_boundaries(chunked, document, expected, indent):
+    raw = json.dumps(document, indent=indent, ensure_ascii=False).encode()
+    assert catalog_source.read_json(raw) == expected
+
+
+@pytest.mark.parametrize("raw", [b"[1, 2", b"[1 2]", b'{"products": [}', b'"just a string"'])
+def test_read_json_rejects_malformed_files(chunked, raw):
+    with pytest.raises(CatalogFileError):
+        catalog_source.read_json(raw)
+
+
+def test_read_ndjson_splits_categories_and_skips_blank_lines():
+    lines = [json.dumps(p, ensure_ascii=False) for p in PRODUCTS]
+    lines.insert(1, json.dumps({"type": "category", **CATEGORIES[0]}))
+    lines.insert(2, "   ")
+    raw = ("\n".join(lines) + "\n").encode()
+    assert read_ndjson(io.BytesIO(raw)) == (PRODUCTS, CATEGORIES)
+    # No trailing newline, and no categories
+    assert read_ndjson(io.BytesIO(json.dumps(PRODUCTS[0]).encode())) == ([PRODUCTS[0]], None)
+
+
+def test_read_ndjson_reports_the_bad_line():
+    with pytest.raises(CatalogFileError, match="Line 2"):
+        read_ndjson(io.BytesIO(b'{"id": "p1"}\n{"id": \n'))
+
+
+def test_catalog_file_format_follows_the_suffix(tmp_path):
+    (tmp_path / "catalog.json").write_text(json.dumps(PRODUCTS))
+    (tmp_path / "catalog.ndjson").write_text("\n".join(json.dumps(p) for p in PRODUCTS))
+    (tmp_path / "empty.json").write_text("")
+    assert read_catalog_file(tmp_path / "catalog.json") == (PRODUCTS, None)
+    assert read_catalog_file(tmp_path / "catalog.ndjson") == (PRODUCTS, None)
+    with pytest.raises(CatalogFileError):
+        read_catalog_file(tmp_path / "empty.json")
+
+
+@pytest.mark.anyio
+async def test_reloader_swaps_in_changed_files_only(tmp_path):
+    path = tmp_path / "catalog.json"
+    path.write_text(json.dumps({"products": PRODUCTS, "categories": CATEGORIES}))
+    registry = ProductRegistry([], lazy=True)
+    reloader = CatalogReloader(registry, FileCatalogSource(path))
+    assert await reloader.reload() is True
+    assert await reloader.reload() is False
+    assert registry.categories == CATEGORIES
+
+    path.write_text(json.dumps(PRODUCTS + PRODUCTS[:1]))
+    with pytest.raises(ValueError, match="Duplicate product id p1"):
+        await reloader.reload()
+    assert len(registry.index) == len(PRODUCTS)
@@ -0,0 +1,166 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from idempotency import (
+    IdempotencyConflict, IdempotencyStore, RequestInProgress, ResponseNotStored, StoredResponse, request_fingerprint,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+class Handler:
+    """Counts runs and returns a response naming the run"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self) -> StoredResponse:
+        self.calls += 1
+        run = self.calls
+        await asyncio.sleep(self.delay)
+        return StoredResponse(200, b'{"run":%d}' % run)
+
+
+@pytest.fixture
+def keys():
+    return AsyncMongoMockClient()["idempotency_test"].idempotency_keys
+
+
+def store(keys, **options) -> IdempotencyStore:
+    options = {"lock_seconds": 0.3, "wait_seconds": 3, "poll_interval": 0.02, **options}
+    return IdempotencyStore(keys, **options)
+
+
+def test_fingerprint_ignores_key_order():
+    assert request_fingerprint({"a": 1, "b": [1, 2]}) == request_fingerprint({"b": [1, 2], "a": 1})
+    assert request_fingerprint({"a": 1}) != request_fingerprint({"a": 2})
+
+
+async def test_retry_replays_the_stored_response(keys):
+    handler = Handler()
+    worker = store(keys)
+    first = await worker.run("orders", "k", "f", handler)
+    again = await worker.run("orders", "k", "f", handler)
+    assert first == (StoredResponse(200, b'{"run":1}'), False)
+    assert again == (StoredResponse(200, b'{"run":1}'), True)
+    assert handler.calls == 1
+
+
+async def test_same_key_with_a_different_body_conflicts(keys):
+    worker = store(keys)
+    await worker.run("orders", "k", "f", Handler())
+    with pytest.raises(IdempotencyConflict):
+        await worker.run("orders", "k", "other", Handler())
+
+
+async def test_scopes_do_not_share_keys(keys):
+    handler = Handler()
+    worker = store(keys)
+    await worker.run("orders", "k", "f", handler)
+    await worker.run("refunds", "k", "f", handler)
+    assert handler.calls == 2
+
+
+async def test_duplicates_in_one_process_share_the_run(keys):
+    handler = Handler(delay=0.1)
+    worker = store(keys)
+    results = await asyncio.gather(*(worker.run("orders", "k", "f", handler) for _ in range(5)))
+    assert handler.calls == 1
+    assert {response for response, _ in results} == {StoredResponse(200, b'{"run":1}')}
+    assert sorted(replayed for _, replayed in results) == [False, True, True, True, True]
+
+
+async def test_concurrent_claims_from_two_workers_run_once(keys):
+    # Longer than lock_seconds: the running worker must keep renewing its claim
+    handler = Handler(delay=1.0)
+    results = await asyncio.gather(
+        store(keys).run("orders", "k", "f", handler),
+        store(keys).run("orders", "k", "f", handler),
+    )
+    assert handler.calls == 1
+    assert sorted(replayed for _, replayed in results) == [False, True]
+
+
+async def test_waiting_worker_gives_up_after_wait_seconds(keys):
+    running = asyncio.ensure_future(store(keys).run("orders", "k", "f", Handler(delay=0.5)))
+    await asyncio.sleep(0.05)
+    with pytest.raises(RequestInProgress):
+        await store(keys, wait_seconds=0.1).run("orders", "k", "f", Handler())
+    await running
+
+
+async def test_failed_handler_releases_the_key(keys):
+    async def failing():
+        raise RuntimeError("boom")
+
+    worker = store(keys)
+    with pytest.raises(RuntimeError):
+        await worker.run("orders", "k", "f", failing)
+    handler = Handler()
+    assert (await worker.run("orders", "k", "f", handler))[1] is False
+    assert handler.calls == 1
+
+
+async def test_stale_claim_is_taken_over(keys):
+    await keys.insert_one({
+        "_id": "orders:k", "fingerprint": "f", "state": "pending", "token": "dead-worker",
+        "locked_until": datetime(2000, 1, 1, tzinfo=timezone.utc),
+        "expires_at": datetime(2100, 1, 1, tzinfo=timezone.utc),
+    })
+    handler = Handler()
+    assert (await store(keys).run("orders", "k", "f", handler))[1] is False
+    assert handler.calls == 1
+
+
+class FailingCompletion:
+    """Collection whose writes of completed responses fail"""
+
+    def __init__(self, keys):
+        self.keys = keys
+
+    def __getattr__(self, name):
+        return getattr(self.keys, name)
+
+    async def update_one(self, query, update, **kwargs):
+        if update.get("$set", {}).get("state") == "completed":
+            raise RuntimeError("write failed")
+        return await self.keys.update_one(query, update, **kwargs)
+
+
+async def test_unstored_response_is_never_run_again(keys):
+    handler = Handler()
+    worker = store(FailingCompletion(keys), store_attempts=2, poll_interval=0.01)
+    response, replayed = await worker.run("orders", "k", "f", handler)
+    assert (response.body, replayed) == (b'{"run":1}', False)
+    # Well past the lock: the key must still not be claimable
+    await asyncio.sleep(0.4)
+    with pytest.raises(ResponseNotStored):
+        await store(keys).run("orders", "k", "f", handler)
+    assert handler.calls == 1
+
+
+CUSTOMER = {
+    "full_name": "Test Customer", "email": "test@example.com", "phone": "9999999999",
+    "address": "1 Example Road", "city": "Mumbai", "state": "MH", "pincode": "400001",
+}
+
+
+async def test_order_retries_replay_the_first_response(api, server):
+    cart_id = (await api.post("/api/cart/create")).json()["id"]
+    product_id = (await api.get("/api/products", params={"limit": 1})).json()[0]["id"]
+    await api.post(f"/api/cart/{cart_id}/add", json={"product_id": product_id, "quantity": 2})
+    body = {"customer": CUSTOMER, "cart_id": cart_id}
+
+    first = await api.post("/api/orders", json=body, headers={"Idempotency-Key": "k1"})
+    assert first.status_code == 200 and "idempotent-replayed" not in first.headers
+    retry = await api.post("/api/orders", json=body, headers={"Idempotency-Key": "k1"})
+    assert retry.status_code == 200 and retry.headers["idempotent-replayed"] == "true"
+    assert retry.content == first.content
+    assert await server.db.orders.count_documents({}) == 1
+
+    changed = {**body, "customer": {**CUSTOMER, "city": "Pune"}}
+    assert (await api.post("/api/orders", json=changed, headers={"Idempotency-Key": "k1"})).status_code == 422
@@ -0,0 +1,132 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from inventory import InsufficientStock, Inventory, ReservationConflict
+
+
+@pytest.fixture
+async def inventory():
+    db = AsyncMongoMockClient()["inventory_test"]
+    inventory = Inventory(db.inventory, db.reservations, shards=4, sweep_interval=0)
+    await inventory.restock("sofa", 10)
+    return inventory
+
+
+@pytest.mark.anyio
+async def test_restock_spreads_units_over_shards(inventory):
+    assert await inventory.available("sofa") == 10
+    shards = await inventory.stock.find({"product_id": "sofa"}).to_list(None)
+    assert sorted(s["available"] for s in shards) == [2, 2, 3, 3]
+    assert await inventory.available("lamp") is None
+
+
+@pytest.mark.anyio
+async def test_reserve_holds_exactly_the_line_quantity(inventory):
+    assert await inventory.reserve("cart-1", "sofa", 4)
+    assert await inventory.available("sofa") == 6
+    await inventory.reserve("cart-1", "sofa", 7)
+    assert (await inventory.held("cart-1", "sofa"), await inventory.available("sofa")) == (7, 3)
+    await inventory.reserve("cart-1", "sofa", 2)
+    assert await inventory.available("sofa") == 8
+    await inventory.reserve("cart-1", "sofa", 0)
+    assert (await inventory.held("cart-1", "sofa"), await inventory.available("sofa")) == (0, 10)
+
+
+@pytest.mark.anyio
+async def test_untracked_products_are_never_held(inventory):
+    assert not await inventory.reserve("cart-1", "lamp", 100)
+    assert await inventory.held("cart-1", "lamp") == 0
+
+
+@pytest.mark.anyio
+async def test_short_stock_keeps_the_existing_hold(inventory):
+    await inventory.reserve("cart-1", "sofa", 3)
+    await inventory.reserve("cart-2", "sofa", 5)
+    with pytest.raises(InsufficientStock) as excinfo:
+        await inventory.reserve("cart-1", "sofa", 6)
+    assert excinfo.value.available == 2
+    assert await inventory.held("cart-1", "sofa") == 3
+    assert await inventory.available("sofa") == 2
+
+
+@pytest.mark.anyio
+async def test_concurrent_carts_never_oversell(inventory):
+    results = await asyncio.gather(
+        *(inventory.reserve(f"cart-{i}", "sofa", 3) for i in range(8)), return_exceptions=True,
+    )
+    held = sum([await inventory.held(f"cart-{i}", "sofa") for i in range(8)])
+    assert held == 3 * sum(r is True for r in results) == 9
+    assert all(r is True or isinstance(r, (InsufficientStock, ReservationConflict)) for r in results)
+    assert await inventory.available("sofa") == 1
+
+
+@pytest.mark.anyio
+async def test_commit_turns_holds_into_sold_stock(inventory):
+    await inventory.reserve("cart-1", "sofa", 2)
+    committed = await inventory.commit("cart-1", [("sofa", 3), ("lamp", 1)], "order-1")
+    assert committed == [("sofa", 3)]
+    assert await inventory.available("sofa") == 7
+    assert await inventory.reservations.count_documents({}) == 0
+    # An order that could not be saved puts the stock back
+    await inventory.restore(committed)
+    assert await inventory.available("sofa") == 10
+
+
+@pytest.mark.anyio
+async def test_a_cart_being_checked_out_cannot_change_its_holds(inventory):
+    await inventory.reserve("cart-1", "sofa", 2)
+    await inventory.reservations.update_one({"_id": "cart-1:sofa"}, {"$set": {"order_id": "order-1"}})
+    with pytest.raises(ReservationConflict):
+        await inventory.reserve("cart-1", "sofa", 3)
+    with pytest.raises(ReservationConflict):
+        await inventory.commit("cart-1", [("sofa", 2)], "order-2")
+
+
+@pytest.mark.anyio
+async def test_sweep_returns_expired_holds(inventory):
+    await inventory.reserve("cart-1", "sofa", 4)
+    await inventory.reserve("cart-2", "sofa", 1)
+    past = datetime.now(timezone.utc) - timedelta(seconds=1)
+    await inventory.reservations.update_one({"_id": "cart-1:sofa"}, {"$set": {"expires_at": past}})
+    assert await inventory.sweep() == 1
+    assert await inventory.available("sofa") == 9
+    assert inventory.expired_total == 1
+
+
+@pytest.fixture
+async def tracked(api, server, monkeypatch):
+    inventory = Inventory(server.db.inventory, server.db.reservations, sweep_interval=0)
+    monkeypatch.setattr(server, "inventory", inventory)
+    return inventory
+
+
+CUSTOMER = {
+    "full_name": "Asha Rao", "email": "asha@example.com", "phone": "9999999999",
+    "address": "1 Main Road", "city": "Pune", "state": "MH", "pincode": "411001",
+}
+
+
+@pytest.mark.anyio
+async def test_checkout_holds_and_commits_stock(api, tracked):
+    product_id = (await api.get("/api/products", params={"limit": 1})).json()[0]["id"]
+    assert (await api.post(f"/api/inventory/{product_id}/restock", json={"quantity": 3})).json()["available"] == 3
+
+    first = (await api.post("/api/cart/create")).json()["id"]
+    second = (await api.post("/api/cart/create")).json()["id"]
+    assert (await api.post(f"/api/cart/{first}/add", json={"product_id": product_id, "quantity": 2})).status_code == 200
+    response = await api.post(f"/api/cart/{second}/add", json={"product_id": product_id, "quantity": 2})
+    assert response.status_code == 409
+    assert (await api.get(f"/api/cart/{second}")).json()["items"] == []
+
+    assert (await api.post("/api/orders", json={"customer": CUSTOMER, "cart_id": first})).status_code == 200
+    assert (await api.get(f"/api/inventory/{product_id}")).json()["available"] == 1
+    assert await tracked.reservations.count_documents({}) == 0
+
+
+@pytest.mark.anyio
+async def test_inventory_endpoints_need_tracking(api):
+    product_id = (await api.get("/api/products", params={"limit": 1})).json()[0]["id"]
+    assert (await api.get(f"/api/inventory/{product_id}")).status_code == 404
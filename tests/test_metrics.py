@@ -0,0 +1,101 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from metrics import Counter, Gauge, Histogram, MongoCommandTimer
+from profiler import SlowRequestProfiler
+
+
+def test_counter_and_gauge_render():
+    counter = Counter("orders_total", "Orders placed", ("status",))
+    counter.inc("paid")
+    counter.inc("paid", amount=2)
+    counter.inc('with "quotes"')
+    gauge = Gauge("in_flight", "In flight")
+    gauge.inc()
+    gauge.dec(amount=3)
+    assert counter.render().splitlines() == [
+        "# HELP orders_total Orders placed",
+        "# TYPE orders_total counter",
+        'orders_total{status="paid"} 3',
+        'orders_total{status="with \\"quotes\\""} 1',
+    ]
+    assert gauge.render().splitlines()[-1] == "in_flight -2"
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, "/a")
+    assert list(histogram.samples()) == [
+        'latency_seconds_bucket{route="/a",le="0.1"} 2',
+        'latency_seconds_bucket{route="/a",le="1.0"} 3',
+        'latency_seconds_bucket{route="/a",le="+Inf"} 4',
+        'latency_seconds_sum{route="/a"} 3.65',
+        'latency_seconds_count{route="/a"} 4',
+    ]
+
+
+def test_counter_samples_under_its_lock():
+    counter = Counter("events_total", "Events", ("worker",))
+    counter.inc("a")
+    rendered = []
+    with counter._lock:
+        thread = threading.Thread(target=lambda: rendered.append(counter.render()))
+        thread.start()
+        thread.join(0.05)
+        # Rendering waits for writers instead of iterating a dict they are changing
+        assert thread.is_alive() and not rendered
+    thread.join()
+    assert rendered[0].endswith('events_total{worker="a"} 1')
+
+
+def test_mongo_timer_labels_commands_by_collection():
+    histogram = Histogram("mongo_seconds", "Mongo", ("command", "collection", "outcome"))
+    timer = MongoCommandTimer(histogram)
+    for command_name, command, outcome in [
+        ("find", {"find": "orders"}, "ok"),
+        ("getMore", {"getMore": 1, "collection": "orders"}, "ok"),
+        ("insert", {"insert": "carts"}, "error"),
+    ]:
+        event = SimpleNamespace(command_name=command_name, command=command, connection_id=("h", 1),
+                                request_id=7, duration_micros=2500)
+        timer.started(event)
+        (timer.succeeded if outcome == "ok" else timer.failed)(event)
+    assert set(histogram.series) == {("find", "orders", "ok"), ("getMore", "orders", "ok"), ("insert", "carts", "error")}
+    assert not timer._collections
+
+
+@pytest.mark.anyio
+async def test_profiler_dumps_only_slow_requests(tmp_path):
+    profiler = SlowRequestProfiler(threshold=0.05, out_dir=tmp_path, interval=0.001)
+    profiler.start()
+    try:
+        start = time.perf_counter()
+        while time.perf_counter() - start < 0.1:
+            sum(range(1000))
+        end = time.perf_counter()
+        await profiler.finished("GET /api/slow", start, end)
+        await profiler.finished("GET /api/fast", start, start + 0.01)
+    finally:
+        profiler.stop()
+    dumps = list(tmp_path.iterdir())
+    assert profiler.dumps == 1 and len(dumps) == 1
+    assert dumps[0].name.endswith("GET_api_slow.folded")
+    lines = dumps[0].read_text().splitlines()
+    assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+    assert any("test_profiler_dumps_only_slow_requests" in line for line in lines)
+
+
+@pytest.mark.anyio
+async def test_metrics_endpoint_reports_route_templates(api):
+    product_id = (await api.get("/api/products", params={"limit": 1})).json()[0]["id"]
+    await api.get(f"/api/products/{product_id}")
+    await api.get("/no/such/path")
+    body = (await api.get("/api/metrics")).text
+    assert 'route="/api/products/{product_id}"' in body
+    assert product_id not in body
+    assert 'route="unmatched"' in body
+    assert "# TYPE http_request_duration_seconds histogram" in body
@@ -0,0 +1,96 @@
+import csv
+import io
+
+import pyarrow.parquet as pq
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from openpyxl import load_workbook
+
+from order_export import EXPORT_COLUMNS, iter_row_chunks, order_rows, stream_export, write_export
+from tests.conftest import make_orders
+
+
+def test_order_rows_flatten_one_row_per_line(catalog):
+    order = make_orders(1, catalog)[0]
+    rows = order_rows(order)
+    assert [r["product_id"] for r in rows] == [i["product_id"] for i in order["items"]]
+    assert all(list(r) == list(EXPORT_COLUMNS) for r in rows)
+    assert rows[0]["line_total"] == order["items"][0]["price"] * order["items"][0]["quantity"]
+    # An order without items still shows up
+    assert [r["product_id"] for r in order_rows({**order, "items": []})] == [None]
+
+
+@pytest.fixture
+async def orders(catalog):
+    collection = AsyncMongoMockClient()["export_test"].orders
+    orders = make_orders(25, catalog)
+    await collection.insert_many([dict(o) for o in orders])
+    return collection, orders
+
+
+def expected_rows(orders):
+    ordered = sorted(orders, key=lambda o: (o["created_at"], o["id"]))
+    return [(r["order_id"], r["product_id"], r["quantity"]) for o in ordered for r in order_rows(o)]
+
+
+async def collect(body):
+    return [block async for block in body]
+
+
+@pytest.mark.anyio
+async def test_chunks_hold_about_chunk_size_orders(orders):
+    collection, docs = orders
+    chunks = [rows async for rows in iter_row_chunks(collection, {}, chunk_size=10)]
+    assert len(chunks) == 3
+    assert [(r["order_id"], r["product_id"], r["quantity"]) for rows in chunks for r in rows] == expected_rows(docs)
+
+
+@pytest.mark.anyio
+async def test_csv_export(orders):
+    collection, docs = orders
+    body = b"".join(await collect(stream_export(iter_row_chunks(collection, {}, 10), "csv")))
+    rows = list(csv.DictReader(io.StringIO(body.decode())))
+    assert [(r["order_id"], r["product_id"], int(r["quantity"])) for r in rows] == expected_rows(docs)
+
+
+@pytest.mark.anyio
+async def test_parquet_export_streams_a_row_group_per_chunk(orders):
+    collection, docs = orders
+    blocks = await collect(stream_export(iter_row_chunks(collection, {}, 10), "parquet"))
+    # Header and first row group, two more row groups, then the footer
+    assert len(blocks) == 4
+    parquet = pq.ParquetFile(io.BytesIO(b"".join(blocks)))
+    assert parquet.num_row_groups == 3
+    table = parquet.read().to_pylist()
+    assert [(r["order_id"], r["product_id"], r["quantity"]) for r in table] == expected_rows(docs)
+
+
+@pytest.mark.anyio
+async def test_xlsx_export(orders):
+    collection, docs = orders
+    body = b"".join(await collect(stream_export(iter_row_chunks(collection, {}, 10), "xlsx")))
+    sheet = load_workbook(io.BytesIO(body), read_only=True)["orders"]
+    header, *rows = sheet.iter_rows(values_only=True)
+    assert list(header) == list(EXPORT_COLUMNS)
+    columns = list(EXPORT_COLUMNS)
+    at = columns.index
+    assert [(r[at("order_id")], r[at("product_id")], r[at("quantity")]) for r in rows] == expected_rows(docs)
+
+
+@pytest.mark.anyio
+async def test_write_export_counts_rows(orders, tmp_path):
+    collection, docs = orders
+    with open(tmp_path / "orders.parquet", "wb") as out:
+        count = await write_export(iter_row_chunks(collection, {}), "parquet", out)
+    assert count == len(expected_rows(docs)) == pq.read_table(tmp_path / "orders.parquet").num_rows
+
+
+@pytest.mark.anyio
+async def test_export_endpoint_filters_orders(api, server, catalog):
+    docs = make_orders(12, catalog)
+    await server.db.orders.insert_many([dict(o) for o in docs])
+    response = await api.get("/api/orders/export", params={"format": "csv", "status": "shipped"})
+    assert response.headers["content-type"].startswith("text/csv")
+    assert "attachment" in response.headers["content-disposition"]
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert {r["order_id"] for r in rows} == {o["id"] for o in docs if o["status"] == "shipped"}
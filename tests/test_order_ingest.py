@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from pymongo.errors import BulkWriteError
+
+from order_ingest import OrderIngestQueue
+
+
+@pytest.fixture
+def collection():
+    return AsyncMongoMockClient()["ingest_test"].orders
+
+
+class RecordingCollection:
+    """Records batch sizes and lets the test hold writes in flight"""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.sizes = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def insert_many(self, docs, ordered=True):
+        self.sizes.append(len(docs))
+        await self.gate.wait()
+        return await self.collection.insert_many(docs, ordered=ordered)
+
+
+@pytest.mark.anyio
+async def test_concurrent_orders_share_batches(collection):
+    recording = RecordingCollection(collection)
+    queue = OrderIngestQueue(recording, max_batch=10, workers=1)
+    await queue.start()
+    recording.gate.clear()
+    first = asyncio.create_task(queue.submit({"id": "order-0"}))
+    await asyncio.sleep(0)
+    rest = [asyncio.create_task(queue.submit({"id": f"order-{i}"})) for i in range(1, 25)]
+    await asyncio.sleep(0)
+    recording.gate.set()
+    await asyncio.gather(first, *rest)
+    await queue.close()
+    # The first order goes out alone; the rest queue up behind it
+    assert recording.sizes == [1, 10, 10, 4]
+    assert queue.inserted == 25 and queue.batches == 4
+    assert await collection.count_documents({}) == 25
+
+
+@pytest.mark.anyio
+async def test_max_delay_fills_a_batch(collection):
+    recording = RecordingCollection(collection)
+    queue = OrderIngestQueue(recording, max_batch=5, max_delay=0.05, workers=1)
+    await queue.start()
+    submits = []
+    for i in range(5):
+        submits.append(asyncio.create_task(queue.submit({"id": f"order-{i}"})))
+        await asyncio.sleep(0.001)
+    await asyncio.gather(*submits)
+    await queue.close()
+    assert recording.sizes == [5]
+
+
+@pytest.mark.anyio
+async def test_a_rejected_order_fails_only_its_own_submit(collection):
+    await collection.create_index("id", unique=True)
+    await collection.insert_one({"id": "order-1"})
+    queue = OrderIngestQueue(collection, workers=1)
+    await queue.start()
+    results = await asyncio.gather(
+        *(queue.submit({"id": f"order-{i}"}) for i in range(3)), return_exceptions=True,
+    )
+    await queue.close()
+    assert results[0] is None and results[2] is None
+    assert isinstance(results[1], BulkWriteError)
+
+
+class BrokenCollection:
+    async def insert_many(self, docs, ordered=True):
+        raise ConnectionError("mongo unavailable")
+
+
+@pytest.mark.anyio
+async def test_a_failed_batch_fails_every_submit():
+    queue = OrderIngestQueue(BrokenCollection(), workers=1)
+    await queue.start()
+    results = await asyncio.gather(*(queue.submit({"id": i}) for i in range(3)), return_exceptions=True)
+    await queue.close()
+    assert all(isinstance(r, ConnectionError) for r in results)
+    assert queue.inserted == 0
+
+
+@pytest.mark.anyio
+async def test_submit_requires_a_started_queue(collection):
+    queue = OrderIngestQueue(collection)
+    with pytest.raises(RuntimeError):
+        await queue.submit({"id": "order-1"})
@@ -0,0 +1,80 @@
+import pytest
+
+from order_queries import decode_order_cursor, encode_order_cursor, order_by_ids, order_projection
+from tests.conftest import make_orders
+
+
+def test_cursor_round_trip():
+    cursor = encode_order_cursor("2024-03-01T00:00:00+00:00", "order-1")
+    assert decode_order_cursor(cursor) == ("2024-03-01T00:00:00+00:00", "order-1")
+
+
+@pytest.mark.parametrize("cursor", ["", "!!!", "bm90IGpzb24", "WzEsMl0"])
+def test_malformed_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_order_cursor(cursor)
+
+
+def test_projection_keeps_cursor_fields():
+    assert order_projection() == {"_id": 0}
+    assert order_projection(["total"]) == {"total": 1, "id": 1, "created_at": 1, "_id": 0}
+
+
+def test_order_by_ids_keeps_request_order():
+    docs = [{"id": "b"}, {"id": "a"}]
+    assert order_by_ids(["a", "x", "b", "a"], docs) == ([{"id": "a"}, {"id": "b"}], ["x"])
+
+
+@pytest.fixture
+async def orders(api, server, catalog):
+    orders = make_orders(40, catalog)
+    await server.db.orders.insert_many([dict(o) for o in orders])
+    return orders
+
+
+def newest_first(orders):
+    return sorted(orders, key=lambda o: (o["created_at"], o["id"]), reverse=True)
+
+
+async def all_pages(api, **params):
+    ids, params = [], {**params, "limit": 7}
+    while True:
+        response = await api.get("/api/orders", params=params)
+        assert response.status_code == 200
+        ids.extend(o["id"] for o in response.json())
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            return ids
+        params["cursor"] = cursor
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("params, keep", [
+    ({}, lambda o: True),
+    ({"customer_email": "customer2@example.com"}, lambda o: o["customer"]["email"] == "customer2@example.com"),
+    ({"status": "shipped", "payment_status": "paid"}, lambda o: o["status"] == "shipped" and o["payment_status"] == "paid"),
+    ({"created_from": "2024-03-03T00:00:00Z", "created_to": "2024-03-06T00:00:00Z"},
+     lambda o: "2024-03-03" <= o["created_at"] < "2024-03-06"),
+])
+async def test_pages_list_every_matching_order_newest_first(api, orders, params, keep):
+    assert await all_pages(api, **params) == [o["id"] for o in newest_first(orders) if keep(o)]
+
+
+@pytest.mark.anyio
+async def test_fields_projection(api, orders):
+    page = (await api.get("/api/orders", params={"fields": "total", "limit": 3})).json()
+    assert all(set(o) == {"id", "created_at", "total"} for o in page)
+    assert (await api.get("/api/orders", params={"fields": "secret"})).status_code == 400
+    assert (await api.get("/api/orders", params={"cursor": "!!!"})).status_code == 400
+
+
+@pytest.mark.anyio
+async def test_lookup_and_get(api, orders):
+    response = await api.post("/api/orders/lookup", json={"ids": ["order-0003", "missing", "order-0001"], "fields": ["total"]})
+    body = response.json()
+    assert [o["id"] for o in body["orders"]] == ["order-0003", "order-0001"]
+    assert body["missing"] == ["missing"]
+    assert body["orders"][0]["total"] == orders[3]["total"]
+
+    assert (await api.get("/api/orders/order-0005")).json()["customer"] == orders[5]["customer"]
+    assert (await api.get("/api/orders/missing")).status_code == 404
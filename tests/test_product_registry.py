@@ -0,0 +1,27 @@
+from catalog import ProductRegistry
+
+
+def test_lookups_by_id(catalog):
+    registry = ProductRegistry(catalog)
+    assert registry.get("prod-42") is catalog[42]
+    assert registry.get("missing") is None
+    assert registry.get_many(["prod-3", "missing", "prod-1"]) == [catalog[3], None, catalog[1]]
+
+
+def test_lazy_registry_builds_on_first_use(catalog):
+    registry = ProductRegistry(catalog, lazy=True)
+    assert not registry.warmed
+    assert registry.get("prod-0") is catalog[0]
+    assert registry.warmed
+    assert registry.warm() is registry.index
+
+
+def test_reload_swaps_in_a_new_snapshot(catalog):
+    registry = ProductRegistry(catalog)
+    first = registry.index
+    registry.reload(catalog[:10])
+    assert registry.version == first.version + 1
+    assert len(registry.index) == 10
+    assert registry.get("prod-20") is None
+    # A request holding the old snapshot still sees the old catalog
+    assert first.get("prod-20") is catalog[20]
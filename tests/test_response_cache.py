@@ -0,0 +1,73 @@
+import pytest
+
+from response_cache import ResponseCache, etag_matches
+
+
+def test_entries_are_dropped_when_the_catalog_version_changes():
+    cache = ResponseCache(1024)
+    cache.get("a", 1)
+    cache.put("a", 1, b"[1]")
+    assert cache.get("a", 1).body == b"[1]"
+    assert cache.get("a", 2) is None
+    assert len(cache) == 0
+    # A response rendered from an older version is not stored
+    cache.put("b", 1, b"[2]")
+    assert cache.get("b", 2) is None
+
+
+def test_byte_budget_evicts_least_recently_used():
+    cache = ResponseCache(10)
+    cache.get("warm", 1)
+    cache.put("a", 1, b"aaaa")
+    cache.put("b", 1, b"bbbb")
+    cache.get("a", 1)
+    cache.put("c", 1, b"cccc")
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) is not None and cache.get("c", 1) is not None
+    assert cache.size == 8
+    # Bodies over the whole budget are served but never stored
+    assert cache.put("big", 1, b"x" * 11).body == b"x" * 11
+    assert cache.get("big", 1) is None
+
+
+def test_etag_is_a_strong_digest_of_the_body():
+    cache = ResponseCache(1024)
+    assert cache.put("a", None, b"[1]").etag == cache.put("b", None, b"[1]").etag
+    assert cache.put("a", None, b"[1]").etag != cache.put("a", None, b"[2]").etag
+
+
+@pytest.mark.parametrize("header, matches", [
+    (None, False),
+    ('"abc"', True),
+    ('W/"abc"', True),
+    ('"x", "abc"', True),
+    ("*", True),
+    ('"abcd"', False),
+])
+def test_if_none_match(header, matches):
+    assert etag_matches(header, '"abc"') is matches
+
+
+@pytest.mark.anyio
+async def test_catalog_responses_revalidate_with_etags(api, server):
+    first = await api.get("/api/products", params={"category": "bedroom"})
+    etag = first.headers["etag"]
+    again = await api.get("/api/products", params={"category": "bedroom"})
+    assert again.content == first.content and again.headers["etag"] == etag
+
+    unchanged = await api.get("/api/products", params={"category": "bedroom"}, headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304 and unchanged.content == b""
+    assert unchanged.headers["etag"] == etag
+
+    product = first.json()[0]
+    detail = await api.get(f"/api/products/{product['id']}")
+    assert detail.json() == product
+    assert (await api.get(f"/api/products/{product['id']}", headers={"If-None-Match": detail.headers["etag"]})).status_code == 304
+
+    # A catalog reload changes what the cached response was built from
+    server.registry.reload([{**p, "price": p["price"] + 1} for p in server.registry.index.products],
+                           server.registry.categories)
+    changed = await api.get("/api/products", params={"category": "bedroom"}, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert changed.json()[0]["price"] == product["price"] + 1
@@ -0,0 +1,90 @@
+import pytest
+
+from search import MAX_EXPANSIONS, SearchIndex, tokenize
+
+
+def product(name: str, description: str = "") -> dict:
+    return {"name": name, "description": description}
+
+
+def test_all_tokens_must_match_as_prefixes():
+    index = SearchIndex()
+    index.add_many(enumerate([product("Velvet Sofa"), product("Velvet Chair"), product("Oak Chair")]))
+    assert sorted(index.search("velv")) == [0, 1]
+    assert index.search("velvet cha") == [1]
+    assert index.search("walnut") == []
+
+
+def test_name_matches_outrank_description_matches():
+    index = SearchIndex()
+    index.add_many(enumerate([product("Desk", "pairs with an oak chair"), product("Oak Desk", "sturdy")]))
+    assert index.search("oak") == [1, 0]
+
+
+def test_prefix_expansion_keeps_common_terms_past_the_cap():
+    products = [product(f"cha{i:03d}") for i in range(MAX_EXPANSIONS + 36)]
+    products += [product("Chair") for _ in range(3)]
+    index = SearchIndex()
+    index.add_many(enumerate(products))
+    terms = index.expand("cha")
+    assert len(terms) == MAX_EXPANSIONS
+    assert "chair" in terms
+    assert terms == sorted(terms)
+    assert set(range(len(products) - 3, len(products))) <= set(index.search("cha"))
+
+
+def test_remove_drops_terms_from_the_vocabulary():
+    index = SearchIndex()
+    index.add(0, product("Velvet Sofa"))
+    index.add(1, product("Oak Table"))
+    index.remove(0)
+    assert index.expand("v") == []
+    assert index.search("oak") == [1]
+
+
+def full_ranking(index, query, restrict=None):
+    """Score every document term by term, as the index is meant to"""
+    expansions = [index.expand(token) for token in dict.fromkeys(tokenize(query))]
+    if not expansions or not all(expansions):
+        return []
+    scores = {}
+    for doc in range(len(index)):
+        if restrict is not None and doc not in restrict:
+            continue
+        score = 0.0
+        for terms in expansions:
+            impacts = [index.impacts(term).get(doc) for term in terms]
+            if not any(impacts):
+                break
+            for impact in impacts:
+                if impact:
+                    score += impact
+        else:
+            scores[doc] = score
+    return sorted(scores, key=lambda doc: (-scores[doc], doc))
+
+
+@pytest.mark.parametrize("query", ["velvet", "oak", "o", "b", "oak table", "desk lamp 3", "classic ch", "r", "zzz"])
+@pytest.mark.parametrize("limit", [None, 1, 2, 5, 20, 500])
+def test_ranking_matches_scoring_every_document(catalog, query, limit):
+    index = SearchIndex()
+    index.add_many(enumerate(catalog))
+    office = {i for i, p in enumerate(catalog) if p["category"] == "office"}
+    for restrict in (None, office, set(range(0, len(catalog), 3))):
+        assert index.search(query, restrict, limit=limit) == full_ranking(index, query, restrict)[:limit]
+
+
+def test_single_term_top_k_skips_scoring(monkeypatch):
+    products = [product(f"Velvet Sofa {i}", "soft " * (i % 5)) for i in range(500)]
+    index = SearchIndex()
+    index.add_many(enumerate(products))
+    expected = full_ranking(index, "soft")
+    most = set(range(500)) - set(range(0, 500, 7))
+    expected_restricted = full_ranking(index, "soft", most)
+
+    def rank(*args):
+        raise AssertionError("scored every match")
+
+    monkeypatch.setattr(index, "rank", rank)
+    assert index.search("soft", limit=10) == expected[:10]
+    assert index.search("soft", most, limit=3) == expected_restricted[:3]
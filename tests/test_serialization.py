@@ -0,0 +1,79 @@
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import orjson
+import pytest
+from pydantic import BaseModel
+
+import serialization
+from serialization import FastJSONResponse, ResponseDriftError, encode, encode_as, verify
+from tests.test_idempotency import CUSTOMER
+
+
+class Item(BaseModel):
+    id: str
+    price: float
+    note: Optional[str] = None
+
+
+@pytest.fixture
+def strict(monkeypatch):
+    monkeypatch.setattr(serialization, "strict", True)
+
+
+def test_encode_matches_pydantic_for_plain_data_and_models():
+    at = datetime(2024, 3, 17, 12, 30, 0, 250000, tzinfo=timezone.utc)
+    assert encode({"at": at, "n": [1, 2.5, None]}) == b'{"at":"2024-03-17T12:30:00.250000Z","n":[1,2.5,null]}'
+    item = Item(id="a", price=1.5)
+    assert encode(item) == item.model_dump_json().encode()
+    verify(encode({"id": "a", "price": 1.5, "note": None}), Item, {"id": "a", "price": 1.5})
+
+
+@pytest.mark.parametrize("content", [
+    {"id": "a", "price": 1.5},                          # note missing, the model adds it
+    {"id": "a", "price": 1.5, "note": None, "x": 1},    # extra key, the model drops it
+    {"id": "a", "price": "1.5", "note": None},          # the model would coerce the price
+])
+def test_strict_mode_catches_drift(strict, content):
+    with pytest.raises(ResponseDriftError):
+        encode_as(content, Item)
+
+
+def test_non_strict_mode_encodes_as_given():
+    content = {"id": "a", "price": "1.5"}
+    assert encode_as(content, Item) == orjson.dumps(content)
+
+
+def test_fast_response_checks_its_model_only_in_strict_mode(monkeypatch):
+    content = [{"id": "a", "price": 1.5, "note": None}]
+    response = FastJSONResponse(content, List[Item], headers={"x-test": "1"})
+    assert response.body == orjson.dumps(content)
+    assert response.media_type == "application/json" and response.headers["x-test"] == "1"
+
+    monkeypatch.setattr(serialization, "strict", True)
+    FastJSONResponse(content, List[Item])
+    FastJSONResponse([{"id": "a"}])
+    with pytest.raises(ResponseDriftError):
+        FastJSONResponse([{"id": "a", "price": 1.5}], List[Item])
+
+
+@pytest.mark.anyio
+async def test_endpoints_send_what_their_models_would(strict, api):
+    products = await api.get("/api/products", params={"limit": 5})
+    assert products.status_code == 200
+    product_id = products.json()[0]["id"]
+    assert (await api.get(f"/api/products/{product_id}")).status_code == 200
+    assert (await api.get("/api/products", params={"search": "sofa", "sort": "-price"})).status_code == 200
+
+    cart_id = (await api.post("/api/cart/create")).json()["id"]
+    cart = await api.post(f"/api/cart/{cart_id}/add", json={"product_id": product_id, "quantity": 2})
+    assert cart.status_code == 200 and cart.json()["total"] > 0
+    assert (await api.get(f"/api/cart/{cart_id}")).json() == cart.json()
+
+    order = await api.post("/api/orders", json={"customer": CUSTOMER, "cart_id": cart_id})
+    assert order.status_code == 200
+    assert (await api.get(f"/api/orders/{order.json()['id']}")).json() == order.json()
+
+    status = await api.post("/api/status", json={"client_name": "tests"})
+    assert status.status_code == 200 and status.json()["timestamp"].endswith("Z")
+    assert (await api.get("/api/status")).status_code == 200
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+
+async def create_checks(api, names):
+    return [(await api.post("/api/status", json={"client_name": name})).json() for name in names]
+
+
+@pytest.mark.anyio
+async def test_streamed_checks_match_created_ones(api, server, monkeypatch):
+    monkeypatch.setattr(server.serialization, "strict", True)
+    created = await create_checks(api, ["a", "b", "c"])
+    assert all(c["timestamp"].endswith("Z") for c in created)
+    listed = (await api.get("/api/status")).json()
+    assert all(c["timestamp"].endswith("Z") for c in listed)
+    # Mongo keeps timestamps to the millisecond
+    created = {c["id"]: (c["client_name"], c["timestamp"][:23]) for c in created}
+    assert {c["id"]: (c["client_name"], c["timestamp"][:23]) for c in listed} == created
+
+
+@pytest.mark.anyio
+async def test_keyset_pages_cover_every_check(api):
+    await create_checks(api, [f"client-{i}" for i in range(7)])
+    everything = (await api.get("/api/status")).json()
+    seen, params = [], {"limit": 3}
+    while True:
+        page = (await api.get("/api/status", params=params)).json()
+        if not page:
+            break
+        seen.extend(page)
+        params = {"limit": 3, "after": page[-1]["timestamp"], "after_id": page[-1]["id"]}
+    assert seen == everything
+
+
+@pytest.mark.anyio
+async def test_ndjson_format(api):
+    created = await create_checks(api, ["a", "b"])
+    response = await api.get("/api/status", params={"format": "ndjson"})
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert {c["id"] for c in lines} == {c["id"] for c in created}
+
+
+@pytest.mark.anyio
+async def test_after_id_requires_after(api):
+    assert (await api.get("/api/status", params={"after_id": "x"})).status_code == 422